@@ -0,0 +1,27 @@
+"""add precomputed replay frames
+
+Revision ID: 3f7a9c2d41b8
+Revises: bbc23b294226
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7a9c2d41b8'
+down_revision: Union[str, None] = 'bbc23b294226'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('replays', sa.Column('frames', sa.LargeBinary(), nullable=True))
+    op.add_column('replays', sa.Column('frames_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('replays', 'frames_version')
+    op.drop_column('replays', 'frames')
@@ -0,0 +1,61 @@
+"""pack replay actions into a bytea action log
+
+Revision ID: 8b2e5d7c9a14
+Revises: 3f7a9c2d41b8
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from bomberman import Codec
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e5d7c9a14'
+down_revision: Union[str, None] = '3f7a9c2d41b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Миграция только добавляет колонку: JSONB-массивы упаковывает
+# `python -m app.services.replay_store pack`, и только те, что распаковываются
+# обратно в те же строки. Откат возвращает упакованные действия в JSONB.
+BATCH_SIZE = 500
+
+replays = sa.table(
+    'replays',
+    sa.column('id', sa.Integer),
+    sa.column('actions', postgresql.JSONB),
+    sa.column('actions_packed', sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    op.add_column('replays', sa.Column('actions_packed', sa.LargeBinary(), nullable=True))
+    op.alter_column('replays', 'actions', existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(replays.c.id, replays.c.actions_packed)
+              .where(replays.c.actions.is_(None), replays.c.actions_packed.isnot(None), replays.c.id > last_id)
+              .order_by(replays.c.id)
+              .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for replay_id, packed in rows:
+            bind.execute(
+                replays.update()
+                  .where(replays.c.id == replay_id)
+                  .values(actions=Codec.decode_action_log(bytes(packed)), actions_packed=None)
+            )
+        last_id = rows[-1][0]
+
+    op.alter_column('replays', 'actions', existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=False)
+    op.drop_column('replays', 'actions_packed')
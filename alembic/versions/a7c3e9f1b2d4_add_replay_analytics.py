@@ -0,0 +1,73 @@
+"""add replay analytics tables
+
+Revision ID: a7c3e9f1b2d4
+Revises: d9f3b6a2c7e1
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f1b2d4'
+down_revision: Union[str, None] = 'd9f3b6a2c7e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Таблицы заполняет `python -m app.services.analytics` и задача app.tasks.compute_replay_analytics
+def upgrade() -> None:
+    op.create_table('match_analytics',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('match_id', sa.Integer(), nullable=False),
+    sa.Column('replay_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=False),
+    sa.Column('height', sa.Integer(), nullable=False),
+    sa.Column('ticks', sa.Integer(), nullable=False),
+    sa.Column('bombs_placed', sa.Integer(), nullable=False),
+    sa.Column('crates_destroyed', sa.Integer(), nullable=False),
+    sa.Column('kills', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['match_id'], ['match_results.id'], ),
+    sa.ForeignKeyConstraint(['replay_id'], ['replays.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('match_id')
+    )
+    op.create_index(op.f('ix_match_analytics_id'), 'match_analytics', ['id'], unique=False)
+    op.create_index(op.f('ix_match_analytics_version'), 'match_analytics', ['version'], unique=False)
+
+    op.create_table('player_match_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('analytics_id', sa.Integer(), nullable=False),
+    sa.Column('player_index', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('bombs_placed', sa.Integer(), nullable=False),
+    sa.Column('crates_destroyed', sa.Integer(), nullable=False),
+    sa.Column('kills', sa.Integer(), nullable=False),
+    sa.Column('self_kills', sa.Integer(), nullable=False),
+    sa.Column('killed_by', sa.Integer(), nullable=True),
+    sa.Column('death_tick', sa.Integer(), nullable=True),
+    sa.Column('survival_ticks', sa.Integer(), nullable=False),
+    sa.Column('moves', sa.Integer(), nullable=False),
+    sa.Column('heatmap', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.ForeignKeyConstraint(['analytics_id'], ['match_analytics.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_player_match_stats_id'), 'player_match_stats', ['id'], unique=False)
+    op.create_index(op.f('ix_player_match_stats_analytics_id'), 'player_match_stats', ['analytics_id'], unique=False)
+    op.create_index(op.f('ix_player_match_stats_user_id'), 'player_match_stats', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_player_match_stats_user_id'), table_name='player_match_stats')
+    op.drop_index(op.f('ix_player_match_stats_analytics_id'), table_name='player_match_stats')
+    op.drop_index(op.f('ix_player_match_stats_id'), table_name='player_match_stats')
+    op.drop_table('player_match_stats')
+    op.drop_index(op.f('ix_match_analytics_version'), table_name='match_analytics')
+    op.drop_index(op.f('ix_match_analytics_id'), table_name='match_analytics')
+    op.drop_table('match_analytics')
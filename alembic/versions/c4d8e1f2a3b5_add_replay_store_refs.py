@@ -0,0 +1,32 @@
+"""add replay segment store references
+
+Revision ID: c4d8e1f2a3b5
+Revises: 8b2e5d7c9a14
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e1f2a3b5'
+down_revision: Union[str, None] = '8b2e5d7c9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Данные переносит `python -m app.services.replay_store migrate`; перед откатом
+# их нужно вернуть в Postgres: `python -m app.services.replay_store migrate --back`
+def upgrade() -> None:
+    op.add_column('replays', sa.Column('payload_ref', sa.String(), nullable=True))
+    op.add_column('replays', sa.Column('frames_ref', sa.String(), nullable=True))
+    op.alter_column('replays', 'initial_map', existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+
+
+def downgrade() -> None:
+    op.alter_column('replays', 'initial_map', existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=False)
+    op.drop_column('replays', 'frames_ref')
+    op.drop_column('replays', 'payload_ref')
@@ -0,0 +1,33 @@
+"""add indexes for the replay listing
+
+Revision ID: d9f3b6a2c7e1
+Revises: c4d8e1f2a3b5
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9f3b6a2c7e1'
+down_revision: Union[str, None] = 'c4d8e1f2a3b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# replays.match_id уже проиндексирован уникальным ограничением
+def upgrade() -> None:
+    op.create_index(op.f('ix_match_results_winner_id'), 'match_results', ['winner_id'], unique=False)
+    op.create_index(op.f('ix_match_results_loser_id'),  'match_results', ['loser_id'],  unique=False)
+    op.create_index(op.f('ix_match_results_result'),    'match_results', ['result'],    unique=False)
+    op.create_index(op.f('ix_match_results_ticks'),     'match_results', ['ticks'],     unique=False)
+    op.create_index(op.f('ix_replays_created_at'),      'replays',       ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_replays_created_at'),      table_name='replays')
+    op.drop_index(op.f('ix_match_results_ticks'),     table_name='match_results')
+    op.drop_index(op.f('ix_match_results_result'),    table_name='match_results')
+    op.drop_index(op.f('ix_match_results_loser_id'),  table_name='match_results')
+    op.drop_index(op.f('ix_match_results_winner_id'), table_name='match_results')
@@ -3,6 +3,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app import crud, schemas, models
 from app.core import database, auth
+from app.services import bot
 
 router = APIRouter()
 
@@ -13,6 +14,9 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
+    if bot.is_bot_email(user.email):
+        raise HTTPException(status_code=400, detail="This email domain is reserved")
+
     db_username = crud.get_user_by_username(db, username=user.username)
     if db_username:
         raise HTTPException(status_code=400, detail="Username already taken")
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from uuid import uuid4
 from app import crud, schemas, models
 from app.core import database, auth
+from app.services import bot
 
 
 router = APIRouter()
@@ -79,6 +80,47 @@ def quickgame(
     )
 
 
+@router.post(
+    "/add_bot/{game_id}",
+    response_model=schemas.LobbyOut,
+    summary="Занять свободное место в лобби серверным ботом"
+)
+def add_bot(
+    game_id: str,
+    difficulty: str = bot.DEFAULT_DIFFICULTY,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    """
+    Добавляет в лобби бота (easy / normal / hard). Доступно только хосту,
+    только пока лобби ждёт игроков и пока в нём меньше MAX_LOBBY_PLAYERS мест.
+    """
+    lobby = crud.get_lobby(db, game_id)
+    if not lobby:
+        raise HTTPException(status_code=404, detail="Lobby not found")
+    if lobby.host_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the host can add bots")
+    if lobby.status != models.LobbyStatus.waiting:
+        raise HTTPException(status_code=400, detail="Lobby is not waiting for players")
+    if difficulty not in bot.DIFFICULTIES:
+        raise HTTPException(status_code=400, detail=f"Unknown difficulty, expected one of {list(bot.DIFFICULTIES)}")
+    if crud.count_lobby_players(db, lobby.id) >= crud.MAX_LOBBY_PLAYERS:
+        raise HTTPException(status_code=400, detail="Lobby is full")
+
+    bot_user = crud.get_or_create_bot_user(db, difficulty, lobby.id)
+    crud.join_lobby(db, bot_user.id, lobby.id)
+    db.refresh(lobby)
+    return schemas.LobbyOut(
+        id=lobby.id,
+        game_id=lobby.game_id,
+        host_id=lobby.host_id,
+        status=lobby.status,
+        players=[p.user_id for p in lobby.players],
+        created_at=lobby.created_at,
+        is_private=lobby.is_private
+    )
+
+
 @router.post("/join_lobby/{game_id}", response_model=schemas.LobbyOut)
 def join_lobby(game_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
     lobby = crud.get_lobby(db, game_id)
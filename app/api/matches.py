@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app import crud, schemas, models
@@ -24,3 +24,29 @@ def read_my_match_history(
     - limit: максимальное число матчей в ответе
     """
     return crud.get_matches_by_user(db, current_user.id, skip=skip, limit=limit)
+
+
+@router.get(
+    "/matches/{match_id}/analytics",
+    response_model=schemas.MatchAnalyticsOut,
+    summary="Аналитика матча по реплею"
+)
+def read_match_analytics(match_id: int, db: Session = Depends(database.get_db)):
+    """
+    Бомбы, ящики, убийства, время жизни и тепловые карты игроков.
+    Считается фоновой задачей после матча; до этого — 404.
+    """
+    analytics = crud.get_match_analytics(db, match_id)
+    if analytics is None:
+        raise HTTPException(404, "Match analytics not found")
+    return analytics
+
+
+@router.get(
+    "/users/{user_id}/analytics",
+    response_model=schemas.UserAnalyticsOut,
+    summary="Сводная аналитика игрока"
+)
+def read_user_analytics(user_id: int, db: Session = Depends(database.get_db)):
+    row = crud.get_user_analytics(db, user_id)
+    return schemas.UserAnalyticsOut(user_id=user_id, **row._mapping)
@@ -1,14 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException
+import gzip
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from app import crud, schemas
 from app.core import database, auth
-from app.services import simulation
+from app.core.database import SessionLocal
+from app.services import simulation, replay_cache, replay_store, replay_export
 
 
 router = APIRouter()
 
 
+def _replay_out(replay) -> schemas.ReplayOut:
+    """
+    Реплеи с seed хранят пустой initial_map, отдаём клиенту восстановленную карту;
+    упакованный лог действий отдаётся обычным списком
+    """
+    initial_map, actions = replay_store.load(replay)
+    return schemas.ReplayOut.model_validate({
+        "id": replay.id,
+        "match_id": replay.match_id,
+        "created_at": replay.created_at,
+        "game_params": replay.game_params,
+        "initial_map": simulation.initial_state(replay.game_params, initial_map),
+        "actions": actions,
+    })
+
+
+def _iter_frames(replay, start: Optional[int], stop: Optional[int]) -> Iterator[Dict[str, Any]]:
+    """ Все кадры или кадры start..stop-1 — от ближайшего ключевого кадра """
+    if start is None and stop is None:
+        return simulation.iter_replay(replay.game_params, *replay_store.load(replay))
+    keyframes = simulation.get_keyframes(replay)
+    return simulation.iter_range(
+        replay.game_params,
+        replay_store.load(replay)[1],
+        keyframes,
+        start or 0,
+        keyframes["frame_count"] if stop is None else stop
+    )
+
+
+def _frames_response(replay, start: Optional[int], stop: Optional[int], stream: bool, accept_encoding: str):
+    """
+    Без stream — JSON-массив кадров (все кадры берутся из replay_cache). Со stream — NDJSON через
+    StreamingResponse: кадры симулируются по одному, память не зависит от длины
+    матча; gzip, если клиент его принимает.
+    """
+    compress = "gzip" in accept_encoding.lower()
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    if not stream:
+        if start is None and stop is None:
+            # Все кадры — посчитанные заранее или из кэша; оба хранят готовый gzip-сжатый JSON
+            blob = replay_cache.precomputed_blob(replay) or replay_cache.get_frames_blob(
+                replay.id,
+                lambda: simulation.simulate_replay(replay.game_params, *replay_store.load(replay))
+            )
+            return Response(blob if compress else gzip.decompress(blob), media_type="application/json", headers=headers)
+        body = json.dumps(list(_iter_frames(replay, start, stop)), separators=(",", ":")).encode()
+        if compress:
+            body = gzip.compress(body, replay_cache.COMPRESS_LEVEL)
+        return Response(body, media_type="application/json", headers=headers)
+
+    return StreamingResponse(
+        replay_export.ndjson(_iter_frames(replay, start, stop), compress),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
+
+
+def _frame(replay, tick: int) -> Dict[str, Any]:
+    keyframes = simulation.get_keyframes(replay)
+    if not 0 <= tick < keyframes["frame_count"]:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    return next(simulation.iter_range(replay.game_params, replay_store.load(replay)[1], keyframes, tick, tick + 1))
+
+
+@router.get(
+    "/replays/cache/stats",
+    summary="Счётчики кэша кадров реплеев"
+)
+def replay_cache_stats(current_user = Depends(auth.get_current_user)) -> Dict[str, Any]:
+    return replay_cache.stats()
+
+
+@router.get(
+    "/replays",
+    response_model=List[schemas.ReplayListItem],
+    summary="Список реплеев (только метаданные)"
+)
+def list_replays(
+    player_id: Optional[int] = Query(None, description="Участник матча"),
+    result   : Optional[str] = Query(None, pattern="^(win|draw)$"),
+    min_ticks: Optional[int] = Query(None, ge=0),
+    max_ticks: Optional[int] = Query(None, ge=0),
+    since    : Optional[datetime] = Query(None, description="Реплеи не раньше"),
+    until    : Optional[datetime] = Query(None, description="Реплеи раньше"),
+    skip     : int = Query(0, ge=0),
+    limit    : int = Query(20, ge=1, le=100),
+    db       : Session = Depends(database.get_db)
+):
+    """
+    - skip: сколько записей пропустить (для пагинации)
+    - limit: максимальное число реплеев в ответе
+    """
+    rows = crud.list_replays(
+        db, player_id=player_id, result=result, min_ticks=min_ticks, max_ticks=max_ticks,
+        since=since, until=until, skip=skip, limit=limit
+    )
+    return [schemas.ReplayListItem.model_validate(row._mapping) for row in rows]
+
+
+@router.get(
+    "/replays/export",
+    summary="Выгрузка реплеев для обучения (gzip NDJSON, по строке на реплей)"
+)
+def export_replays(
+    since     : Optional[datetime] = Query(None, description="Реплеи не раньше"),
+    until     : Optional[datetime] = Query(None, description="Реплеи раньше"),
+    player_id : Optional[int] = Query(None, description="Участник матча"),
+    min_rating: Optional[int] = Query(None, description="Нижняя граница текущего рейтинга обоих игроков"),
+    max_rating: Optional[int] = Query(None, description="Верхняя граница текущего рейтинга обоих игроков"),
+    fmt       : str = Query("json", alias="format", pattern="^(json|packed)$", description="json — список действий, packed — base64 упакованного лога"),
+    frames    : bool = Query(False, description="Добавить кадры"),
+    limit     : Optional[int] = Query(None, ge=1),
+    current_user = Depends(auth.get_current_user)
+):
+    filters = dict(
+        since=since, until=until, player_id=player_id,
+        min_rating=min_rating, max_rating=max_rating, limit=limit,
+    )
+
+    def records():
+        # своя сессия: зависимость get_db закрывается до того, как начнётся отдача потока
+        db = SessionLocal()
+        try:
+            yield from replay_export.iter_export(db, fmt, frames, **filters)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        replay_export.ndjson(records(), compress=True),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="replays.ndjson.gz"'}
+    )
+
+
 @router.get(
     "/replays/{replay_id}",
     response_model=schemas.ReplayOut,
@@ -21,27 +164,25 @@ def read_replay(
     replay = crud.get_replay(db, replay_id)
     if not replay:
         raise HTTPException(404, "Replay not found")
-    return replay
+    return _replay_out(replay)
 
 
 @router.get(
     "/replays/{replay_id}/frames",
-    summary="Воссоздать и вернуть кадры игры по реплею"
+    summary="Воссоздать и вернуть кадры игры по реплею (все или диапазон from..to-1)"
 )
 def replay_frames(
     replay_id: int,
+    start: Optional[int] = Query(None, alias="from", ge=0, description="Первый кадр"),
+    stop : Optional[int] = Query(None, alias="to", ge=0, description="Кадр после последнего"),
+    stream: bool = Query(False, description="NDJSON-поток по кадру на строку"),
+    accept_encoding: str = Header(""),
     db: Session = Depends(database.get_db)
-) -> List[Dict[str, Any]]:
+):
     replay = crud.get_replay(db, replay_id)
     if not replay:
         raise HTTPException(status_code=404, detail="Replay not found")
-
-    frames = simulation.simulate_replay(
-        replay.game_params,
-        replay.initial_map,
-        replay.actions
-    )
-    return frames
+    return _frames_response(replay, start, stop, stream, accept_encoding)
 
 
 @router.get(
@@ -56,24 +197,52 @@ def read_replay(
     replay = crud.get_replay_by_match_id(db, match_id)
     if not replay:
         raise HTTPException(404, "Replay not found")
-    return replay
+    return _replay_out(replay)
 
 
 @router.get(
     "/replays/match/{match_id}/frames",
-    summary="Воссоздать и вернуть кадры игры по match_id"
+    summary="Воссоздать и вернуть кадры игры по match_id (все или диапазон from..to-1)"
 )
 def replay_frames_by_match(
     match_id: int,
+    start: Optional[int] = Query(None, alias="from", ge=0, description="Первый кадр"),
+    stop : Optional[int] = Query(None, alias="to", ge=0, description="Кадр после последнего"),
+    stream: bool = Query(False, description="NDJSON-поток по кадру на строку"),
+    accept_encoding: str = Header(""),
     db: Session = Depends(database.get_db)
-) -> List[Dict[str, Any]]:
+):
     replay = crud.get_replay_by_match_id(db, match_id)
     if not replay:
         raise HTTPException(status_code=404, detail="Replay not found")
+    return _frames_response(replay, start, stop, stream, accept_encoding)
 
-    frames = simulation.simulate_replay(
-        replay.game_params,
-        replay.initial_map,
-        replay.actions
-    )
-    return frames
+
+@router.get(
+    "/replays/{replay_id}/frames/{tick}",
+    summary="Один кадр реплея: симуляция от ближайшего ключевого кадра"
+)
+def replay_frame(
+    replay_id: int,
+    tick: int,
+    db: Session = Depends(database.get_db)
+) -> Dict[str, Any]:
+    replay = crud.get_replay(db, replay_id)
+    if not replay:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return _frame(replay, tick)
+
+
+@router.get(
+    "/replays/match/{match_id}/frames/{tick}",
+    summary="Один кадр реплея по match_id"
+)
+def replay_frame_by_match(
+    match_id: int,
+    tick: int,
+    db: Session = Depends(database.get_db)
+) -> Dict[str, Any]:
+    replay = crud.get_replay_by_match_id(db, match_id)
+    if not replay:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return _frame(replay, tick)
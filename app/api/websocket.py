@@ -27,4 +27,6 @@ async def websocket_endpoint(websocket: WebSocket, lobby_id: str, db: Session =
         await websocket.close(code=1008)
         return
 
-    await ws_handler.handle_ws(websocket, user.id, lobby_id, db)
+    # Формат состояний: bomberman.json (по умолчанию), bomberman.compact.v1 или bomberman.binary.v1
+    subprotocol = ws_handler.select_subprotocol(websocket.scope.get("subprotocols", []))
+    await ws_handler.handle_ws(websocket, user.id, lobby_id, db, subprotocol)
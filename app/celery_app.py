@@ -18,6 +18,22 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.expire_old_lobbies",
         "schedule": crontab(minute="*"),
     },
+    "refill-map-pool-every-minute": {
+        "task": "app.tasks.refill_map_pool",
+        "schedule": crontab(minute="*"),
+    },
+    "fill-lobbies-with-bots-every-minute": {
+        "task": "app.tasks.fill_lobbies_with_bots",
+        "schedule": crontab(minute="*"),
+    },
+    "verify-replays-every-10-minutes": {
+        "task": "app.tasks.verify_replays",
+        "schedule": crontab(minute="*/10"),
+    },
+    "compute-replay-analytics-every-5-minutes": {
+        "task": "app.tasks.compute_replay_analytics",
+        "schedule": crontab(minute="*/5"),
+    },
 }
 celery_app.conf.timezone = "UTC"
 
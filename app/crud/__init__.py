@@ -2,3 +2,4 @@ from .users import *
 from .lobbies import *
 from .matches import *
 from .replays import *
+from .analytics import *
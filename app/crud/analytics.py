@@ -0,0 +1,87 @@
+from typing import Any, Dict
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session, selectinload, undefer
+from app import models
+
+
+PLAYER_FIELDS = (
+    "bombs_placed", "crates_destroyed", "kills", "self_kills",
+    "killed_by", "death_tick", "survival_ticks", "moves", "heatmap",
+)
+
+
+def get_replay_ids_without_analytics(db: Session, version: int, after_id: int, limit: int) -> list[int]:
+    """ id реплеев после after_id, у матчей которых нет аналитики версии version """
+    rows = (
+        db.query(models.Replay.id)
+          .outerjoin(models.MatchAnalytics, models.MatchAnalytics.match_id == models.Replay.match_id)
+          .filter(
+              models.Replay.id > after_id,
+              or_(models.MatchAnalytics.id.is_(None), models.MatchAnalytics.version != version),
+          )
+          .order_by(models.Replay.id)
+          .limit(limit)
+          .all()
+    )
+    return [row.id for row in rows]
+
+
+def store_match_analytics(db: Session, match_id: int, replay_id: int, summary: Dict[str, Any], version: int):
+    """
+    Сохраняет итоги app.services.analytics.analyze, заменяя прежнюю аналитику матча.
+    """
+    db.query(models.MatchAnalytics).filter(models.MatchAnalytics.match_id == match_id).delete(synchronize_session=False)
+    analytics = models.MatchAnalytics(
+        match_id         = match_id,
+        replay_id        = replay_id,
+        version          = version,
+        width            = summary["width"],
+        height           = summary["height"],
+        ticks            = summary["ticks"],
+        bombs_placed     = summary["bombs_placed"],
+        crates_destroyed = summary["crates_destroyed"],
+        kills            = summary["kills"],
+        players=[
+            models.PlayerMatchStats(
+                player_index=player["player_index"],
+                user_id=player.get("user_id"),
+                **{field: player[field] for field in PLAYER_FIELDS},
+            )
+            for player in summary["players"]
+        ],
+    )
+    db.add(analytics)
+    db.commit()
+    return analytics
+
+
+def get_match_analytics(db: Session, match_id: int) -> models.MatchAnalytics | None:
+    return (
+        db.query(models.MatchAnalytics)
+          .options(selectinload(models.MatchAnalytics.players).undefer(models.PlayerMatchStats.heatmap))
+          .filter(models.MatchAnalytics.match_id == match_id)
+          .first()
+    )
+
+
+def get_user_analytics(db: Session, user_id: int):
+    """
+    Суммы по всем матчам пользователя, для которых посчитана аналитика;
+    тепловые карты не агрегируются — размеры полей у матчей разные.
+    """
+    stats = models.PlayerMatchStats
+    return (
+        db.query(
+            func.count(stats.id).label("matches"),
+            func.coalesce(func.sum(stats.bombs_placed), 0).label("bombs_placed"),
+            func.coalesce(func.sum(stats.crates_destroyed), 0).label("crates_destroyed"),
+            func.coalesce(func.sum(stats.kills), 0).label("kills"),
+            func.coalesce(func.sum(stats.self_kills), 0).label("self_kills"),
+            func.count(stats.death_tick).label("deaths"),
+            func.coalesce(func.sum(stats.survival_ticks), 0).label("survival_ticks"),
+            func.coalesce(func.avg(stats.survival_ticks), 0).label("avg_survival_ticks"),
+            func.coalesce(func.sum(stats.moves), 0).label("moves"),
+        )
+          .filter(stats.user_id == user_id)
+          .one()
+    )
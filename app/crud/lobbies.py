@@ -1,3 +1,5 @@
+import os
+
 from sqlalchemy.orm import Session
 from app import models, schemas
 from fastapi import HTTPException
@@ -5,6 +7,10 @@ from sqlalchemy import or_, func
 from typing import Optional
 
 
+# Больше игроков в лобби не сажается (совпадает с заранее проверяемыми картами map_pool)
+MAX_LOBBY_PLAYERS = int(os.getenv("MAX_LOBBY_PLAYERS", 16))
+
+
 def create_lobby(
     db: Session,
     game_id: str,
@@ -96,5 +102,40 @@ def join_lobby(db, user_id, lobby_id):
     return player
 
 
+def count_lobby_players(db: Session, lobby_id: int) -> int:
+    return db.query(models.LobbyPlayer).filter_by(lobby_id=lobby_id).count()
+
+
 def get_lobby(db, game_id):
     return db.query(models.Lobby).filter_by(game_id=game_id).first()
+
+
+def get_lobby_bots(db: Session, lobby_id: int) -> list[models.User]:
+    """ Боты, занявшие места в лобби """
+    from app.services.bot import BOT_EMAIL_DOMAIN
+    return (
+        db.query(models.User)
+          .join(models.LobbyPlayer, models.LobbyPlayer.user_id == models.User.id)
+          .filter(
+              models.LobbyPlayer.lobby_id == lobby_id,
+              models.User.email.like(f"%@{BOT_EMAIL_DOMAIN}")
+          )
+          .order_by(models.LobbyPlayer.slot)
+          .all()
+    )
+
+
+def get_lobbies_to_fill_with_bots(db: Session, waiting_since) -> list[models.Lobby]:
+    """ Открытые лобби с одним игроком, ждущие соперника дольше, чем с waiting_since """
+    return (
+        db.query(models.Lobby)
+          .filter(
+              models.Lobby.status == models.LobbyStatus.waiting,
+              models.Lobby.is_private == False,
+              models.Lobby.created_at < waiting_since
+          )
+          .outerjoin(models.LobbyPlayer, models.Lobby.id == models.LobbyPlayer.lobby_id)
+          .group_by(models.Lobby.id)
+          .having(func.count(models.LobbyPlayer.id) == 1)
+          .all()
+    )
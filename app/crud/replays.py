@@ -1,6 +1,8 @@
+from datetime import datetime
 from sqlalchemy import or_, func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased, undefer, undefer_group
 from app import models, schemas
+from app.services import replay_store
 from app.core import database, auth
 
 
@@ -12,12 +14,29 @@ def store_replay(
     actions: list[dict],
 ) -> models.Replay:
 
-    replay = models.Replay(
-        match_id    = match_id,
-        game_params = game_params,
-        initial_map = initial_map,
-        actions     = actions,
-    )
+    # действия, которые не упаковываются без потерь, остаются JSONB-массивом в строке
+    packed = replay_store.pack_actions(actions)
+    store = replay_store.get_store()
+    if packed is None:
+        replay = models.Replay(
+            match_id    = match_id,
+            game_params = game_params,
+            initial_map = initial_map,
+            actions     = actions,
+        )
+    elif store is not None:
+        replay = models.Replay(
+            match_id    = match_id,
+            game_params = game_params,
+            payload_ref = store.put(replay_store.encode_payload(initial_map, packed)),
+        )
+    else:
+        replay = models.Replay(
+            match_id    = match_id,
+            game_params = game_params,
+            initial_map = initial_map,
+            actions_packed = packed,
+        )
     db.add(replay)
     db.commit()
     db.refresh(replay)
@@ -35,3 +54,134 @@ def get_replay_by_match_id(db: Session, match_id: int) -> models.Replay | None:
           .filter(models.Replay.match_id == match_id)
           .first()
     )
+
+
+def set_replay_frames(db: Session, replay_id: int, frames: bytes, version: int) -> None:
+    store = replay_store.get_store()
+    if store is not None:
+        values = {models.Replay.frames_ref: store.put(frames), models.Replay.frames_version: version}
+    else:
+        values = {models.Replay.frames: frames, models.Replay.frames_version: version}
+    db.query(models.Replay).filter(models.Replay.id == replay_id).update(values, synchronize_session=False)
+    db.commit()
+
+
+def get_replay_ids_after(db: Session, after_id: int, limit: int) -> list[int]:
+    rows = (
+        db.query(models.Replay.id)
+          .filter(models.Replay.id > after_id)
+          .order_by(models.Replay.id)
+          .limit(limit)
+          .all()
+    )
+    return [row.id for row in rows]
+
+
+def iter_replays_for_export(
+    db: Session,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    player_id: int | None = None,
+    min_rating: int | None = None,
+    max_rating: int | None = None,
+    with_frames: bool = False,
+    after_id: int | None = None,
+    ids: list[int] | None = None,
+    limit: int | None = None,
+    batch: int = 100,
+):
+    """
+    Пары (Replay, MatchResult) по фильтрам в порядке id. yield_per читает строки
+    серверным курсором порциями по batch, поэтому память не зависит от объёма
+    выгрузки. Рейтинговый диапазон — по текущему рейтингу обоих игроков.
+    """
+    winner = aliased(models.User)
+    loser = aliased(models.User)
+    query = (
+        db.query(models.Replay, models.MatchResult)
+          .join(models.MatchResult, models.Replay.match_id == models.MatchResult.id)
+    )
+    if since is not None:
+        query = query.filter(models.Replay.created_at >= since)
+    if until is not None:
+        query = query.filter(models.Replay.created_at < until)
+    if after_id is not None:
+        query = query.filter(models.Replay.id > after_id)
+    if ids is not None:
+        query = query.filter(models.Replay.id.in_(ids))
+    if player_id is not None:
+        query = query.filter(or_(
+            models.MatchResult.winner_id == player_id,
+            models.MatchResult.loser_id  == player_id
+        ))
+    if min_rating is not None or max_rating is not None:
+        query = (
+            query.join(winner, models.MatchResult.winner_id == winner.id)
+                 .join(loser,  models.MatchResult.loser_id  == loser.id)
+        )
+        if min_rating is not None:
+            query = query.filter(winner.rating >= min_rating, loser.rating >= min_rating)
+        if max_rating is not None:
+            query = query.filter(winner.rating <= max_rating, loser.rating <= max_rating)
+    # содержимое нужно каждой строке — грузим сразу, а не отдельным запросом на строку
+    query = query.options(undefer_group("payload"))
+    if with_frames:
+        query = query.options(undefer(models.Replay.frames))
+
+    query = query.order_by(models.Replay.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.yield_per(batch)
+
+
+def list_replays(
+    db: Session,
+    player_id: int | None = None,
+    result: str | None = None,
+    min_ticks: int | None = None,
+    max_ticks: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    skip: int = 0,
+    limit: int = 20,
+):
+    """
+    Метаданные реплеев с результатами матчей, новые первыми. Выбираются только
+    нужные колонки: JSONB-содержимое реплея в запрос не попадает.
+    """
+    query = (
+        db.query(
+            models.Replay.id,
+            models.Replay.match_id,
+            models.Replay.created_at,
+            models.MatchResult.result,
+            models.MatchResult.winner_id,
+            models.MatchResult.loser_id,
+            models.MatchResult.ticks,
+            models.MatchResult.winner_elo_change,
+            models.MatchResult.loser_elo_change,
+        )
+        .join(models.MatchResult, models.Replay.match_id == models.MatchResult.id)
+    )
+    if player_id is not None:
+        query = query.filter(or_(
+            models.MatchResult.winner_id == player_id,
+            models.MatchResult.loser_id  == player_id
+        ))
+    if result is not None:
+        query = query.filter(models.MatchResult.result == result)
+    if min_ticks is not None:
+        query = query.filter(models.MatchResult.ticks >= min_ticks)
+    if max_ticks is not None:
+        query = query.filter(models.MatchResult.ticks <= max_ticks)
+    if since is not None:
+        query = query.filter(models.Replay.created_at >= since)
+    if until is not None:
+        query = query.filter(models.Replay.created_at < until)
+
+    return (
+        query.order_by(models.Replay.id.desc())
+             .offset(skip)
+             .limit(limit)
+             .all()
+    )
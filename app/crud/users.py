@@ -3,6 +3,9 @@ from app import models, schemas
 from app.core import database, auth
 
 from passlib.context import CryptContext
+import secrets
+
+from app.services import bot
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -40,6 +43,34 @@ def create_user(db: Session, user: schemas.UserCreate):
     return db_user
 
 
+def get_or_create_bot_user(db: Session, difficulty: str, lobby_id: int | None = None) -> models.User:
+    """
+    Пользователь-бот данной сложности, ещё не занявший место в лобби lobby_id:
+    у каждого бота в лобби свой пользователь. Пароль случайный, войти под ботом нельзя.
+    """
+    seated = set()
+    if lobby_id is not None:
+        seated = {uid for (uid,) in db.query(models.LobbyPlayer.user_id).filter_by(lobby_id=lobby_id)}
+    number = 1
+    while True:
+        email = bot.bot_email(difficulty, number)
+        user = get_user_by_email(db, email)
+        if user is None:
+            break
+        if user.id not in seated:
+            return user
+        number += 1
+    user = models.User(
+        email=email,
+        username=f"bot-{bot.bot_name(difficulty, number)}",
+        hashed_password=pwd_context.hash(secrets.token_urlsafe(32)),
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
 def get_top_users(db: Session, limit: int = 10):
     """Return users with the highest rating."""
     return (
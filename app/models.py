@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Boolean, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Boolean, Float, LargeBinary
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import enum
 
@@ -45,10 +45,10 @@ class MatchResult(Base):
 
     id = Column(Integer, primary_key=True)
     lobby_id = Column(Integer, ForeignKey("lobbies.id"))
-    winner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    loser_id  = Column(Integer, ForeignKey("users.id"), nullable=True)
-    result = Column(String)  # win, draw
-    ticks = Column(Integer)
+    winner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    loser_id  = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    result = Column(String, index=True)  # win, draw
+    ticks = Column(Integer, index=True)
 
     winner_elo_change = Column(Integer, nullable=False, default=0)
     loser_elo_change  = Column(Integer, nullable=False, default=0)
@@ -65,14 +65,75 @@ class Replay(Base):
 
     id            = Column(Integer, primary_key=True, index=True)
     match_id      = Column(Integer, ForeignKey("match_results.id"), unique=True, nullable=False)
-    created_at    = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at    = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     game_params   = Column(JSONB, nullable=False)
-    initial_map   = Column(JSONB, nullable=False)
-    actions       = Column(JSONB, nullable=False)
+    # Содержимое реплея грузится одним запросом при первом обращении (группа "payload"),
+    # чтобы списки и кэшированные кадры не тянули JSONB и TOAST
+    initial_map   = deferred(Column(JSONB, nullable=True), group="payload")
+    # Упакованный лог действий (bomberman.Codec.encode_action_log) или, для реплеев до упаковки
+    # и логов, которые не распаковываются в те же строки, JSONB-массив
+    actions       = deferred(Column(JSONB, nullable=True), group="payload")
+    actions_packed = deferred(Column(LargeBinary, nullable=True), group="payload")
+    # Кадры, посчитанные заранее задачей Celery (gzip-сжатый JSON-массив, как в replay_cache);
+    # грузятся только при обращении. frames_version — replay_cache.FRAMES_VERSION на момент расчёта
+    frames        = deferred(Column(LargeBinary, nullable=True))
+    frames_version = Column(Integer, nullable=True)
+    # При REPLAY_STORE=segments карта и действия (payload_ref) и кадры (frames_ref) лежат
+    # в сегментных файлах (app.services.replay_store), а колонки выше пусты
+    payload_ref   = Column(String, nullable=True)
+    frames_ref    = Column(String, nullable=True)
 
     match         = relationship("MatchResult", back_populates="replay")
 
 
+class MatchAnalytics(Base):
+    """ Итоги матча, посчитанные по реплею (app.services.analytics) """
+    __tablename__ = "match_analytics"
+
+    id            = Column(Integer, primary_key=True, index=True)
+    match_id      = Column(Integer, ForeignKey("match_results.id"), unique=True, nullable=False)
+    replay_id     = Column(Integer, ForeignKey("replays.id"), nullable=False)
+    # analytics.ANALYTICS_VERSION на момент расчёта; устаревшие строки пересчитываются
+    version       = Column(Integer, nullable=False, index=True)
+    computed_at   = Column(DateTime, default=datetime.utcnow, nullable=False)
+    width         = Column(Integer, nullable=False)
+    height        = Column(Integer, nullable=False)
+    ticks         = Column(Integer, nullable=False)
+    bombs_placed  = Column(Integer, nullable=False)
+    crates_destroyed = Column(Integer, nullable=False)
+    kills         = Column(Integer, nullable=False)
+
+    players       = relationship(
+        "PlayerMatchStats",
+        back_populates="analytics",
+        cascade="all, delete-orphan",
+        order_by="PlayerMatchStats.player_index",
+    )
+
+
+class PlayerMatchStats(Base):
+    """ Итоги одного игрока в матче """
+    __tablename__ = "player_match_stats"
+
+    id            = Column(Integer, primary_key=True, index=True)
+    analytics_id  = Column(Integer, ForeignKey("match_analytics.id", ondelete="CASCADE"), nullable=False, index=True)
+    player_index  = Column(Integer, nullable=False)   # player_int_id в реплее
+    # None, если по реплею нельзя установить, кто играл этим игроком
+    user_id       = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    bombs_placed  = Column(Integer, nullable=False)
+    crates_destroyed = Column(Integer, nullable=False)
+    kills         = Column(Integer, nullable=False)   # без самоподрывов
+    self_kills    = Column(Integer, nullable=False)
+    killed_by     = Column(Integer, nullable=True)    # player_index владельца бомбы
+    death_tick    = Column(Integer, nullable=True)
+    survival_ticks = Column(Integer, nullable=False)
+    moves         = Column(Integer, nullable=False)
+    # число кадров, проведённых живым игроком на клетке: height строк по width
+    heatmap       = deferred(Column(JSONB, nullable=False))
+
+    analytics     = relationship("MatchAnalytics", back_populates="players")
+
+
 class User(Base):
     __tablename__ = "users"
 
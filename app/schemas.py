@@ -84,6 +84,19 @@ class ReplayAction(BaseModel):
         allow_population_by_field_name = True
 
 
+class ReplayListItem(BaseModel):
+    """ Строка списка реплеев: только метаданные, без карты и действий """
+    id           : int
+    match_id     : int
+    created_at   : datetime
+    result       : str
+    winner_id    : Optional[int]
+    loser_id     : Optional[int]
+    ticks        : int
+    winner_elo_change: int
+    loser_elo_change : int
+
+
 class ReplayOut(BaseModel):
     id           : int
     match_id     : int
@@ -94,3 +107,50 @@ class ReplayOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class PlayerMatchStatsOut(BaseModel):
+    player_index    : int
+    user_id         : Optional[int]
+    bombs_placed    : int
+    crates_destroyed: int
+    kills           : int
+    self_kills      : int
+    killed_by       : Optional[int]
+    death_tick      : Optional[int]
+    survival_ticks  : int
+    moves           : int
+    heatmap         : List[List[int]]
+
+    class Config:
+        from_attributes = True
+
+
+class MatchAnalyticsOut(BaseModel):
+    match_id        : int
+    replay_id       : int
+    computed_at     : datetime
+    width           : int
+    height          : int
+    ticks           : int
+    bombs_placed    : int
+    crates_destroyed: int
+    kills           : int
+    players         : List[PlayerMatchStatsOut]
+
+    class Config:
+        from_attributes = True
+
+
+class UserAnalyticsOut(BaseModel):
+    """ Суммы по матчам пользователя с посчитанной аналитикой """
+    user_id         : int
+    matches         : int
+    bombs_placed    : int
+    crates_destroyed: int
+    kills           : int
+    self_kills      : int
+    deaths          : int
+    survival_ticks  : int
+    avg_survival_ticks: float
+    moves           : int
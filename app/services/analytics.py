@@ -0,0 +1,265 @@
+"""
+Аналитика матчей по реплеям: тепловые карты позиций, поставленные бомбы,
+уничтоженные ящики, убийства (по Bomb.owner_id) и время жизни игроков.
+
+Реплей симулируется один раз; за тик в массивы NumPy записываются только
+позиции и флаги жизни, события движка — в плоские списки, а всё остальное
+считается векторно по этим массивам. Итоги лежат в таблицах match_analytics и
+player_match_stats; ANALYTICS_VERSION повышается при изменении расчёта, и
+устаревшие строки пересчитываются. Реплеи, которые не удалось симулировать,
+отмечаются в хэше FAILED_KEY и фоновой задачей повторно не берутся.
+
+    python -m app.services.analytics --workers 8               # матчи без актуальной аналитики
+    python -m app.services.analytics --recompute --workers 8   # пересчитать всё
+"""
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from redis import Redis
+from sqlalchemy.exc import IntegrityError
+
+from bomberman.GameTools import Game, Tile
+from app import crud
+from app.services import simulation, replay_store
+
+
+ANALYTICS_VERSION = 1
+BATCH_SIZE = 500
+
+# Фоновая задача идёт по таблице курсором (последний обработанный id); у каждой
+# версии свой курсор, поэтому после повышения ANALYTICS_VERSION проход начинается заново
+CURSOR_KEY = f"replays:analytics:v{ANALYTICS_VERSION}:last_id"
+PENDING_KEY = "replays:analytics:pending"     # есть разосланные, но не завершённые порции
+FAILED_KEY = "replays:analytics:failed"       # replay_id -> ошибка расчёта
+
+
+def get_redis() -> Redis:
+    return Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=0,
+        decode_responses=True,
+    )
+
+
+class _TrackedGame(Game):
+    """
+    Game, который записывает события для аналитики, не меняя правил:
+    владельцев поставленных бомб, владельцев бомб, сломавших ящик, и убийства
+    (тик, жертва, владелец взорвавшейся бомбы)
+    """
+    _blast_owner = None   # владелец бомбы, чей взрыв сейчас расходится
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.placed: List[int] = []
+        self.crates: List[int] = []
+        self.kills: List[Tuple[int, int, int]] = []
+
+    def _move_players(self):
+        count = len(self.bombs)
+        super()._move_players()
+        self.placed.extend(bomb.owner_id for bomb in self.bombs[count:])
+
+    def _set_tile(self, x, y, tile):
+        if self._blast_owner is not None and self.grid[y][x] == Tile.DESTRUCTIBLE:
+            self.crates.append(self._blast_owner)
+        super()._set_tile(x, y, tile)
+
+    def _blast(self, bomb):
+        self._blast_owner = bomb.owner_id
+        try:
+            return super()._blast(bomb)
+        finally:
+            self._blast_owner = None
+
+    def _explode_bomb(self, bomb):
+        # игроки гибнут только здесь; стоявшего в старом огне убивает этот же взрыв
+        alive = [pid for pid, player in self.players.items() if player.alive]
+        burned = super()._explode_bomb(bomb)
+        self.kills.extend(
+            (self.tick_count, pid, bomb.owner_id) for pid in alive if not self.players[pid].alive
+        )
+        return burned
+
+
+def analyze(game_params: Dict[str, Any], initial_map: Dict[str, Any], actions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """ Аналитика матча и каждого игрока по реплею """
+    game = simulation.new_game(game_params, simulation.initial_state(game_params, initial_map), _TrackedGame)
+    ticks = simulation.action_ticks(actions)
+    pids = sorted(game.players)
+    index = {pid: i for i, pid in enumerate(pids)}
+    players = [game.players[pid] for pid in pids]
+
+    # кадр t — состояние после t тиков
+    positions = np.empty((len(ticks) + 1, len(pids), 2), dtype=np.int32)
+    alive = np.empty((len(ticks) + 1, len(pids)), dtype=bool)
+    positions[0] = [(p.x, p.y) for p in players]
+    alive[0] = [p.alive for p in players]
+    for t, tick_actions in enumerate(ticks, 1):
+        simulation.step(game, tick_actions)
+        positions[t] = [(p.x, p.y) for p in players]
+        alive[t] = [p.alive for p in players]
+
+    n, width, height = len(pids), game.width, game.height
+    total = len(ticks)
+
+    # тепловая карта: сколько кадров живой игрок провёл на каждой клетке
+    x, y = positions[..., 0], positions[..., 1]
+    cells = (np.arange(n) * height + y) * width + x
+    heatmaps = np.bincount(cells[alive], minlength=n * height * width).reshape(n, height, width)
+
+    # флаг жизни не возвращается, поэтому число живых кадров — тик гибели
+    frames_alive = alive.sum(axis=0)
+    survival = np.minimum(frames_alive, total)
+    moves = np.abs(np.diff(positions, axis=0)).sum(axis=(0, 2))
+
+    placed = np.bincount(np.array([index[pid] for pid in game.placed], dtype=np.int64), minlength=n)
+    crates = np.bincount(np.array([index[pid] for pid in game.crates], dtype=np.int64), minlength=n)
+    kills = np.array([(tick, index[victim], index[killer]) for tick, victim, killer in game.kills], dtype=np.int64).reshape(-1, 3)
+    own = kills[:, 1] == kills[:, 2]
+    kill_counts = np.bincount(kills[~own, 2], minlength=n)
+    self_kills = np.bincount(kills[own, 1], minlength=n)
+    killed_by = np.full(n, -1)
+    death_tick = np.full(n, -1)
+    killed_by[kills[:, 1]] = kills[:, 2]
+    death_tick[kills[:, 1]] = kills[:, 0]
+
+    return {
+        "width": width,
+        "height": height,
+        "ticks": total,
+        "winner": game.get_winner(),
+        "bombs_placed": len(game.placed),
+        "crates_destroyed": len(game.crates),
+        "kills": len(game.kills),
+        "players": [
+            {
+                "player_index": pid,
+                "bombs_placed": int(placed[i]),
+                "crates_destroyed": int(crates[i]),
+                "kills": int(kill_counts[i]),
+                "self_kills": int(self_kills[i]),
+                "killed_by": pids[killed_by[i]] if killed_by[i] >= 0 else None,
+                "death_tick": int(death_tick[i]) if death_tick[i] >= 0 else None,
+                "survival_ticks": int(survival[i]),
+                "moves": int(moves[i]),
+                "heatmap": heatmaps[i].tolist(),
+            }
+            for i, pid in enumerate(pids)
+        ],
+    }
+
+
+def player_users(summary: Dict[str, Any], game_params: Dict[str, Any], winner_id: int | None, loser_id: int | None) -> Dict[int, int | None]:
+    """
+    Пользователь каждого игрока. Реплеи без game_params["player_ids"] дают это
+    соответствие только для победы в матче на двоих: победитель известен по симуляции.
+    """
+    player_ids = game_params.get("player_ids")
+    indexes = [p["player_index"] for p in summary["players"]]
+    if player_ids:
+        return {pid: player_ids[pid] for pid in indexes}
+    winner = summary["winner"]
+    if len(indexes) == 2 and winner not in (None, -1):
+        return {pid: winner_id if pid == winner else loser_id for pid in indexes}
+    return {pid: None for pid in indexes}
+
+
+def compute(job: Tuple) -> Tuple[int, int, Dict[str, Any] | None, str | None]:
+    """
+    Выполняется в процессе пула: (replay_id, match_id, game_params, initial_map,
+    действия, winner_id, loser_id) -> (replay_id, match_id, итоги, ошибка)
+    """
+    replay_id, match_id, game_params, initial_map, actions, winner_id, loser_id = job
+    try:
+        summary = analyze(game_params, initial_map, actions)
+    except Exception as e:
+        return replay_id, match_id, None, f"simulation failed: {e!r}"
+    users = player_users(summary, game_params, winner_id, loser_id)
+    for player in summary["players"]:
+        player["user_id"] = users[player["player_index"]]
+    return replay_id, match_id, summary, None
+
+
+def _job(replay, match) -> Tuple:
+    initial_map, actions = replay_store.load(replay)
+    return replay.id, match.id, replay.game_params, initial_map, actions, match.winner_id, match.loser_id
+
+
+def load_jobs(db, ids: List[int]) -> List[Tuple]:
+    return [_job(replay, match) for replay, match in crud.iter_replays_for_export(db, ids=ids, limit=len(ids))]
+
+
+def run(jobs: List[Tuple], pool: ProcessPoolExecutor | None = None, workers: int = 1) -> List[Tuple]:
+    """ Считает jobs в пуле из workers процессов или, без пула, в текущем процессе """
+    if pool is None:
+        return [compute(job) for job in jobs]
+    return list(pool.map(compute, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def save(db, results: List[Tuple], redis: Redis | None = None) -> int:
+    """
+    Записывает итоги в таблицы аналитики, а ошибки — в FAILED_KEY (если передан
+    redis); возвращает число сохранённых матчей
+    """
+    saved = 0
+    for replay_id, match_id, summary, error in results:
+        if error is not None:
+            print(f"[ANALYTICS] Replay {replay_id}: {error}")
+            if redis is not None:
+                redis.hset(FAILED_KEY, replay_id, error)
+            continue
+        try:
+            crud.store_match_analytics(db, match_id, replay_id, summary, ANALYTICS_VERSION)
+        except IntegrityError:
+            # тот же матч одновременно сохранил другой воркер
+            db.rollback()
+            continue
+        if redis is not None:
+            redis.hdel(FAILED_KEY, replay_id)
+        saved += 1
+    return saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--limit", type=int, help="обработать не больше стольких реплеев")
+    parser.add_argument("--recompute", action="store_true", help="пересчитать и актуальную аналитику")
+    args = parser.parse_args(argv)
+
+    from app.core.database import SessionLocal
+    db = SessionLocal()
+    redis = get_redis()
+    done = saved = last_id = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            while args.limit is None or done < args.limit:
+                batch = args.batch if args.limit is None else min(args.batch, args.limit - done)
+                if args.recompute:
+                    ids = crud.get_replay_ids_after(db, last_id, batch)
+                else:
+                    ids = crud.get_replay_ids_without_analytics(db, ANALYTICS_VERSION, last_id, batch)
+                if not ids:
+                    break
+                jobs = load_jobs(db, ids)
+                db.expunge_all()
+                saved += save(db, run(jobs, pool, args.workers), redis)
+                done += len(ids)
+                last_id = ids[-1]
+                print(f"[ANALYTICS] {done} replays processed (up to id {last_id}), {saved} saved")
+    finally:
+        db.close()
+        redis.close()
+    print(f"[ANALYTICS] Done: {done} replays, {saved} matches saved")
+    return 0 if saved == done else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from bomberman.GameTools import Game, Action
+from bomberman import TreeSearch
+
+
+# Боты — обычные пользователи с почтой в этом домене: "<сложность>@bots.local",
+# для второго и следующих мест в одном лобби — "<сложность>-<номер>@bots.local"
+BOT_EMAIL_DOMAIN = "bots.local"
+
+# Сложность задаётся бюджетом поиска: время на ход (с) и глубина розыгрыша (тики)
+DIFFICULTIES = {
+    "easy": {"time_budget": 0.02, "depth": 4},
+    "normal": {"time_budget": 0.1, "depth": 8},
+    "hard": {"time_budget": 0.4, "depth": 12},
+}
+DEFAULT_DIFFICULTY = "normal"
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+BOT_STATS_LOG_EVERY = int(os.getenv("BOT_STATS_LOG_EVERY", 100))  # поисков между строками в логе
+
+bot_stats = TreeSearch.SearchStats()       # сумма по всем поискам процесса
+
+_executor = None
+_worker_games = {}                         # кэш Game в процессе-воркере: (w, h, n, chain) -> Game
+
+
+def bot_name(difficulty: str, number: int = 1) -> str:
+    return difficulty if number == 1 else f"{difficulty}-{number}"
+
+
+def bot_email(difficulty: str, number: int = 1) -> str:
+    return f"{bot_name(difficulty, number)}@{BOT_EMAIL_DOMAIN}"
+
+
+def is_bot_email(email: str | None) -> bool:
+    return bool(email) and email.endswith("@" + BOT_EMAIL_DOMAIN)
+
+
+def difficulty_of(email: str) -> str:
+    difficulty = email.split("@", 1)[0].split("-", 1)[0]
+    return difficulty if difficulty in DIFFICULTIES else DEFAULT_DIFFICULTY
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """ Пул процессов для поиска: event loop uvicorn не блокируется вычислениями """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=BOT_WORKERS)
+    return _executor
+
+
+def think(payload):
+    """
+    Выполняется в процессе пула: восстанавливает игру из снимка и ищет ход.
+    Возвращает (код Action, SearchStats).
+    """
+    width, height, num_players, chain, snapshot, player_id, difficulty = payload
+    key = (width, height, num_players, chain)
+    game = _worker_games.get(key)
+    if game is None:
+        game = _worker_games[key] = Game(width, height, num_players, chain_reactions=chain, seed=0)
+    game.restore(snapshot)
+    action, stats = TreeSearch.search(game, player_id, **DIFFICULTIES[difficulty])
+    return action.value, stats
+
+
+class LobbyBots:
+    """
+    Боты одного лобби. start() запускает поиск хода сразу после тика, пока
+    люди думают; collect() дожидается результатов к моменту обработки тика.
+    """
+
+    def __init__(self, bots: dict[int, tuple[int, str]]):
+        self.bots = bots           # user_id -> (внутренний id игрока, сложность)
+        self.pending = {}          # user_id -> Future
+        self.stats = TreeSearch.SearchStats()
+
+    def start(self, game: Game):
+        loop = asyncio.get_running_loop()
+        snapshot = game.snapshot()
+        for user_id, (player_id, difficulty) in self.bots.items():
+            if not game.players[player_id].alive:
+                continue
+            payload = (game.width, game.height, game.num_players, game.chain_reactions,
+                       snapshot, player_id, difficulty)
+            self.pending[user_id] = loop.run_in_executor(get_executor(), think, payload)
+
+    async def collect(self) -> dict[int, Action]:
+        """ Ходы ботов (user_id -> Action); при ошибке поиска бот стоит на месте """
+        actions = {}
+        pending, self.pending = self.pending, {}
+        for user_id, future in pending.items():
+            try:
+                code, stats = await future
+            except Exception as e:
+                print(f"[BOT] Search failed for bot {user_id}: {e!r}")
+                actions[user_id] = Action.STAY
+                continue
+            actions[user_id] = Action(code)
+            self.stats.merge(stats)
+            bot_stats.merge(stats)
+            if bot_stats.searches % BOT_STATS_LOG_EVERY == 0:
+                print(f"[BOT STATS] {bot_stats.summary()}")
+        return actions
+
+    def cancel(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
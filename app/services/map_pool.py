@@ -0,0 +1,158 @@
+import asyncio
+import math
+import os
+import random
+import statistics
+from collections import deque
+
+from bomberman.GameTools import Game, Tile, DIRECTIONS
+
+
+MAP_POOL_SIZE = int(os.getenv("MAP_POOL_SIZE", 50))
+# Большие поля проверяются в десятки раз дольше, а такие лобби редки
+MAP_POOL_SIZE_LARGE = int(os.getenv("MAP_POOL_SIZE_LARGE", 10))
+MAP_POOL_MAX_PLAYERS = int(os.getenv("MAP_POOL_MAX_PLAYERS", 16))
+MAX_GENERATION_ATTEMPTS = 200
+
+# Критерии честности карты; отклонения считаются от медианы по всем спавнам,
+# чтобы вероятность отбраковки не росла экспоненциально с числом игроков
+MIN_OPEN_AREA = 3          # свободных клеток, доступных со спавна без подрыва блоков
+OPEN_AREA_CAP = 12         # дальше свободное пространство уже не даёт преимущества
+OPEN_AREA_TOLERANCE = 4
+CRATES_RADIUS = 4          # сколько шагов от спавна считаем "рядом"
+CRATES_TOLERANCE = 3
+
+# Размеры поля: классическое 13x11 до 4 игроков, для больших лобби поле растёт
+DEFAULT_BOARD_SIZE = (13, 11)
+CLASSIC_MAX_PLAYERS = 4
+CELLS_PER_PLAYER_SIDE = 5  # примерно столько клеток стороны поля на каждого игрока в ряду
+MAX_BOARD_SIDE = 101
+
+_system_random = random.SystemRandom()
+
+
+def board_size(num_players: int) -> tuple[int, int]:
+    """ Размер поля (ширина, высота) для лобби на num_players игроков """
+    if num_players <= CLASSIC_MAX_PLAYERS:
+        return DEFAULT_BOARD_SIZE
+    # нечётная сторона, чтобы сетка неразрушаемых стен замыкалась рамкой
+    side = min(MAX_BOARD_SIDE, 2 * CELLS_PER_PLAYER_SIDE * math.ceil(math.sqrt(num_players)) + 1)
+    return side, side
+
+
+# Конфигурации (ширина, высота, игроки), для которых пул пополняется заранее:
+# все размеры лобби до MAP_POOL_MAX_PLAYERS с полем из board_size
+POOL_CONFIGS = [(*board_size(n), n) for n in range(2, MAP_POOL_MAX_PLAYERS + 1)]
+
+
+def pool_size(num_players: int) -> int:
+    return MAP_POOL_SIZE if num_players <= CLASSIC_MAX_PLAYERS else MAP_POOL_SIZE_LARGE
+
+
+def pool_key(width: int, height: int, num_players: int) -> str:
+    return f"map_pool:{width}x{height}:{num_players}"
+
+
+def _bfs(game: Game, start, passable, limit=None) -> dict:
+    """ Расстояния от start до клеток, проходимых по passable(tile) """
+    dist = {start: 0}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        if limit is not None and dist[(x, y)] >= limit:
+            continue
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if (nx, ny) in dist or not (0 <= nx < game.width and 0 <= ny < game.height):
+                continue
+            if passable(game.grid[ny][nx]):
+                dist[(nx, ny)] = dist[(x, y)] + 1
+                queue.append((nx, ny))
+    return dist
+
+
+def validate_map(game: Game) -> bool:
+    """
+    Проверяет сгенерированную карту:
+    - все спавны связаны между собой, если разрушаемые блоки считать проходимыми;
+    - у каждого игрока есть свободное место вокруг спавна;
+    - свободное место и число блоков рядом со спавном у каждого игрока близки к медиане.
+    """
+    spawns = [(p.x, p.y) for p in game.players.values()]
+
+    not_wall = lambda tile: tile != Tile.WALL
+    reachable = _bfs(game, spawns[0], not_wall)
+    if any(spawn not in reachable for spawn in spawns):
+        return False
+
+    open_areas = [
+        min(len(_bfs(game, spawn, lambda tile: tile == Tile.EMPTY)), OPEN_AREA_CAP)
+        for spawn in spawns
+    ]
+    if min(open_areas) < MIN_OPEN_AREA or not _close_to_median(open_areas, OPEN_AREA_TOLERANCE):
+        return False
+
+    crates = [
+        sum(1 for x, y in _bfs(game, spawn, not_wall, limit=CRATES_RADIUS) if game.grid[y][x] == Tile.DESTRUCTIBLE)
+        for spawn in spawns
+    ]
+    return _close_to_median(crates, CRATES_TOLERANCE)
+
+
+def _close_to_median(values, tolerance) -> bool:
+    median = statistics.median(values)
+    return all(abs(value - median) <= tolerance for value in values)
+
+
+def _random_seed() -> int:
+    # 31 бит: seed хранится в JSON и читается фронтендом без потери точности
+    return _system_random.getrandbits(31)
+
+
+def generate_seed(width: int, height: int, num_players: int) -> int | None:
+    """ Подбирает seed, карта которого проходит validate_map; None, если не нашёлся """
+    for _ in range(MAX_GENERATION_ATTEMPTS):
+        seed = _random_seed()
+        if validate_map(Game(width, height, num_players, seed=seed)):
+            return seed
+    return None
+
+
+async def take_seed(redis, width: int, height: int, num_players: int) -> int:
+    """
+    Выдаёт заранее проверенный seed из пула (redis.asyncio клиент).
+    Если пул пуст, генерирует карту в пуле потоков, не блокируя цикл событий;
+    если проверенной карты не нашлось, игра идёт на непроверенной.
+    """
+    key = pool_key(width, height, num_players)
+    seed = await redis.lpop(key)
+    if seed is not None:
+        return int(seed)
+    print(f"[MAP POOL] Pool {key} is empty, generating inline")
+    loop = asyncio.get_running_loop()
+    seed = await loop.run_in_executor(None, generate_seed, width, height, num_players)
+    if seed is None:
+        print(f"[MAP POOL] No valid map for {key} after {MAX_GENERATION_ATTEMPTS} attempts, using an unchecked one")
+        seed = _random_seed()
+    return seed
+
+
+def refill_pool(redis, configs=POOL_CONFIGS, size: int | None = None) -> int:
+    """
+    Дополняет пулы до size (по умолчанию pool_size) проверенных seed'ов
+    (синхронный клиент) и возвращает число новых
+    """
+    added = 0
+    for width, height, num_players in configs:
+        key = pool_key(width, height, num_players)
+        missing = (size if size is not None else pool_size(num_players)) - redis.llen(key)
+        if missing <= 0:
+            continue
+        seeds = [generate_seed(width, height, num_players) for _ in range(missing)]
+        seeds = [seed for seed in seeds if seed is not None]
+        if not seeds:
+            print(f"[MAP POOL] No valid map found for {key}")
+            continue
+        redis.rpush(key, *seeds)
+        added += len(seeds)
+    return added
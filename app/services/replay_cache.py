@@ -0,0 +1,157 @@
+import os
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any
+
+from redis import Redis, RedisError
+
+from app.services import replay_store
+
+
+# Реплеи неизменяемы, поэтому кадры кэшируются без инвалидации: gzip-сжатый
+# JSON-массив кадров в LRU процесса (ограничен суммарным размером) и в Redis.
+# FRAMES_VERSION входит в ключ Redis — его нужно поднять, если меняется движок
+# или формат кадров.
+FRAMES_VERSION = 1
+LRU_MAX_BYTES = int(os.getenv("REPLAY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+REDIS_TTL_SECONDS = int(os.getenv("REPLAY_CACHE_TTL", 7 * 24 * 3600))
+REDIS_ENABLED = os.getenv("REPLAY_CACHE_REDIS", "1") == "1"
+COMPRESS_LEVEL = 6
+
+_lru: "OrderedDict[int, bytes]" = OrderedDict()
+_lru_bytes = 0
+_lock = threading.Lock()
+_building: Dict[int, threading.Lock] = {}   # replay_id -> блокировка, чтобы реплей симулировался один раз
+_redis = None
+
+# Меняются только под _lock (см. _count), потоки пула FastAPI работают параллельно
+counters = {
+    "hits": 0,           # найдено в LRU процесса
+    "redis_hits": 0,     # найдено в Redis
+    "misses": 0,         # пришлось симулировать
+    "evictions": 0,      # вытеснено из LRU
+    "redis_errors": 0,
+    "precomputed": 0,    # отдано из кадров, посчитанных задачей Celery
+}
+
+
+def _count(name: str):
+    with _lock:
+        counters[name] += 1
+
+
+def redis_key(replay_id: int) -> str:
+    return f"replay:{replay_id}:frames:v{FRAMES_VERSION}"
+
+
+def _get_redis() -> Redis:
+    global _redis
+    if _redis is None:
+        _redis = Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            socket_connect_timeout=0.5,
+            socket_timeout=2,
+        )
+    return _redis
+
+
+def encode_frames(frames: List[Dict[str, Any]]) -> bytes:
+    return gzip.compress(json.dumps(frames, separators=(",", ":")).encode(), COMPRESS_LEVEL, mtime=0)
+
+
+def decode_frames(blob: bytes) -> List[Dict[str, Any]]:
+    return json.loads(gzip.decompress(blob))
+
+
+def _lru_get(replay_id: int) -> bytes | None:
+    with _lock:
+        blob = _lru.get(replay_id)
+        if blob is not None:
+            _lru.move_to_end(replay_id)
+        return blob
+
+
+def _lru_put(replay_id: int, blob: bytes):
+    global _lru_bytes
+    if len(blob) > LRU_MAX_BYTES:
+        return
+    with _lock:
+        old = _lru.pop(replay_id, None)
+        if old is not None:
+            _lru_bytes -= len(old)
+        _lru[replay_id] = blob
+        _lru_bytes += len(blob)
+        while _lru_bytes > LRU_MAX_BYTES:
+            _, evicted = _lru.popitem(last=False)
+            _lru_bytes -= len(evicted)
+            counters["evictions"] += 1
+
+
+def _redis_call(method: str, *args):
+    if not REDIS_ENABLED:
+        return None
+    try:
+        return getattr(_get_redis(), method)(*args)
+    except RedisError as e:
+        _count("redis_errors")
+        print(f"[REPLAY CACHE] Redis {method} failed: {e!r}")
+        return None
+
+
+def precomputed_blob(replay) -> bytes | None:
+    """ Кадры, записанные в строку Replay задачей precompute_replay_frames, если они актуальны """
+    if replay.frames_version != FRAMES_VERSION:
+        return None
+    blob = replay_store.load_frames(replay)
+    if blob is not None:
+        _count("precomputed")
+    return blob
+
+
+def get_frames_blob(replay_id: int, simulate: Callable[[], List[Dict[str, Any]]]) -> bytes:
+    """
+    Кадры реплея как gzip-сжатый JSON-массив: из LRU, из Redis или
+    результат simulate(), который затем кладётся в оба уровня
+    """
+    blob = _lru_get(replay_id)
+    if blob is not None:
+        _count("hits")
+        return blob
+
+    # Блокировку сборки убирает только создавший её поток, когда закончит:
+    # иначе первый освободившийся поток удалил бы её, пока другой ещё строит кадры
+    with _lock:
+        building = _building.get(replay_id)
+        created = building is None
+        if created:
+            building = _building[replay_id] = threading.Lock()
+    try:
+        with building:
+            # пока ждали блокировку, кадры мог посчитать другой поток
+            blob = _lru_get(replay_id)
+            if blob is not None:
+                _count("hits")
+                return blob
+
+            blob = _redis_call("get", redis_key(replay_id))
+            if blob is not None:
+                _count("redis_hits")
+            else:
+                _count("misses")
+                blob = encode_frames(simulate())
+                _redis_call("set", redis_key(replay_id), blob, REDIS_TTL_SECONDS)
+            _lru_put(replay_id, blob)
+    finally:
+        if created:
+            with _lock:
+                _building.pop(replay_id, None)
+    return blob
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {**counters, "entries": len(_lru), "bytes": _lru_bytes, "max_bytes": LRU_MAX_BYTES}
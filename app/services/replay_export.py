@@ -0,0 +1,128 @@
+"""
+Выгрузка реплеев для обучения ботов: gzip NDJSON, одна строка на реплей.
+
+Формат действий:
+  json    — список {"tick", "player_int_id", "action"}, как в /replays/{id};
+  packed  — base64 упакованного лога (bomberman.Codec.decode_action_log).
+С frames в строку добавляются кадры (посчитанные заранее или симуляцией).
+
+    python -m app.services.replay_export --out replays.ndjson.gz --since 2025-06-01 --format packed
+"""
+import sys
+import json
+import zlib
+import base64
+import argparse
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator
+
+from bomberman import Codec
+from app import crud
+from app.services import simulation, replay_cache, replay_store
+
+
+FORMATS = ("json", "packed")
+
+# NDJSON: размер порции и частота сброса gzip-потока
+STREAM_CHUNK_BYTES = 64 * 1024
+GZIP_FLUSH_EVERY = 64          # строк между Z_SYNC_FLUSH, чтобы клиент получал данные по мере готовности
+
+
+def ndjson(records: Iterable[Dict[str, Any]], compress: bool) -> Iterator[bytes]:
+    """
+    Кодирует каждую запись один раз в строку NDJSON и отдаёт порциями;
+    первая запись уходит сразу, остальные копятся до STREAM_CHUNK_BYTES
+    """
+    gz = zlib.compressobj(wbits=31) if compress else None   # 31: формат gzip
+    buf, size = [], 0
+    for i, record in enumerate(records):
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        if gz is not None:
+            line = gz.compress(line)
+            if i % GZIP_FLUSH_EVERY == 0:
+                line += gz.flush(zlib.Z_SYNC_FLUSH)
+        buf.append(line)
+        size += len(line)
+        if i == 0 or size >= STREAM_CHUNK_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if gz is not None:
+        buf.append(gz.flush())
+    if buf:
+        yield b"".join(buf)
+
+
+def export_record(replay, match, fmt: str = "json", with_frames: bool = False) -> Dict[str, Any]:
+    initial_map, actions = replay_store.load(replay)
+    record = {
+        "replay_id": replay.id,
+        "match_id": replay.match_id,
+        "created_at": replay.created_at.isoformat(),
+        "result": match.result,
+        "winner_id": match.winner_id,
+        "loser_id": match.loser_id,
+        "ticks": match.ticks,
+        "game_params": replay.game_params,
+        "initial_map": simulation.initial_state(replay.game_params, initial_map),
+    }
+    if fmt == "packed":
+        record["actions_packed"] = base64.b64encode(Codec.encode_action_log(actions)).decode()
+    else:
+        record["actions"] = actions
+    if with_frames:
+        blob = replay_cache.precomputed_blob(replay)
+        if blob is not None:
+            record["frames"] = replay_cache.decode_frames(blob)
+        else:
+            record["frames"] = simulation.simulate_replay(replay.game_params, initial_map, actions)
+    return record
+
+
+def iter_export(db, fmt: str = "json", with_frames: bool = False, **filters) -> Iterator[Dict[str, Any]]:
+    """ Записи выгрузки; filters — аргументы crud.iter_replays_for_export """
+    for replay, match in crud.iter_replays_for_export(db, with_frames=with_frames, **filters):
+        yield export_record(replay, match, fmt, with_frames)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="файл gzip NDJSON ('-' — stdout)")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--player", type=int, dest="player_id")
+    parser.add_argument("--min-rating", type=int)
+    parser.add_argument("--max-rating", type=int)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--format", choices=FORMATS, default="json")
+    parser.add_argument("--frames", action="store_true", help="добавить кадры")
+    args = parser.parse_args(argv)
+
+    from app.core.database import SessionLocal
+    db = SessionLocal()
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    exported = 0
+    try:
+        records = iter_export(
+            db, args.format, args.frames,
+            since=args.since, until=args.until, player_id=args.player_id,
+            min_rating=args.min_rating, max_rating=args.max_rating, limit=args.limit,
+        )
+
+        def counted():
+            nonlocal exported
+            for record in records:
+                exported += 1
+                yield record
+
+        for chunk in ndjson(counted(), compress=True):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        db.close()
+    print(f"[EXPORT] {exported} replays", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Хранилище содержимого реплеев вне Postgres.
+
+Бэкенд выбирается переменной REPLAY_STORE:
+  postgres  — всё лежит в строке Replay, как раньше (по умолчанию);
+  segments  — сжатые записи дописываются в сегментные файлы в REPLAY_SEGMENT_DIR
+              (том media), в Postgres остаются метаданные и ссылка
+              "<сегмент>:<смещение>:<длина>"; чтение — через mmap без копирования.
+
+Перенос существующих строк:
+    python -m app.services.replay_store pack               # JSONB-действия -> упакованный лог
+    python -m app.services.replay_store migrate            # Postgres -> сегменты
+    python -m app.services.replay_store migrate --back     # сегменты -> Postgres
+"""
+import os
+import sys
+import json
+import mmap
+import zlib
+import fcntl
+import struct
+import argparse
+import threading
+from typing import Any, Dict, List, Tuple
+
+from bomberman import Codec
+
+
+REPLAY_STORE = os.getenv("REPLAY_STORE", "postgres")
+SEGMENT_DIR = os.getenv("REPLAY_SEGMENT_DIR", os.path.join("media", "replays"))
+SEGMENT_MAX_BYTES = int(os.getenv("REPLAY_SEGMENT_MAX_BYTES", 256 * 1024 * 1024))
+
+# Запись в сегменте: RECORD (длина, crc32 данных) и сами данные
+RECORD = struct.Struct("<II")
+# Данные реплея: PAYLOAD (magic, версия, длина карты), zlib-сжатый JSON
+# начальной карты и упакованный лог действий (Codec.encode_action_log)
+PAYLOAD = struct.Struct("<2sBI")
+PAYLOAD_MAGIC = b"RP"
+PAYLOAD_VERSION = 1
+
+
+class StoreError(Exception):
+    pass
+
+
+def pack_actions(actions: List[Dict[str, Any]]) -> bytes | None:
+    """
+    Упакованный лог действий или None, если распаковка не вернёт те же строки —
+    тогда действия остаются JSONB-массивом
+    """
+    packed = Codec.encode_action_log(actions)
+    try:
+        if Codec.decode_action_log(packed) == actions:
+            return packed
+    except Codec.CodecError:
+        pass
+    return None
+
+
+def encode_payload(initial_map: Dict[str, Any], actions_packed: bytes) -> bytes:
+    map_z = zlib.compress(json.dumps(initial_map, separators=(",", ":")).encode())
+    return PAYLOAD.pack(PAYLOAD_MAGIC, PAYLOAD_VERSION, len(map_z)) + map_z + actions_packed
+
+
+def decode_payload(buf) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """ (initial_map, действия) из данных реплея; buf может быть memoryview на mmap """
+    magic, version, map_len = PAYLOAD.unpack_from(buf)
+    if magic != PAYLOAD_MAGIC or version != PAYLOAD_VERSION:
+        raise StoreError("Not a replay payload")
+    start = PAYLOAD.size
+    initial_map = json.loads(zlib.decompress(buf[start:start + map_len]))
+    return initial_map, Codec.decode_action_log(buf[start + map_len:])
+
+
+class SegmentStore:
+    """
+    Append-only сегменты segment-NNNNNN.seg. Запись — под flock на файле LOCK,
+    поэтому дописывать могут несколько процессов (uvicorn, воркеры Celery);
+    когда сегмент превышает max_bytes, начинается следующий. Записанные байты
+    не меняются, поэтому отображения mmap кэшируются и только расширяются.
+    """
+
+    def __init__(self, root: str = SEGMENT_DIR, max_bytes: int = SEGMENT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.root, f"segment-{segment:06d}.seg")
+
+    def _last_segment(self) -> int:
+        numbers = [
+            int(name[8:14]) for name in os.listdir(self.root)
+            if name.startswith("segment-") and name.endswith(".seg")
+        ]
+        return max(numbers, default=1)
+
+    def put(self, data: bytes) -> str:
+        with open(os.path.join(self.root, "LOCK"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                segment = self._last_segment()
+                path = self._path(segment)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size and size + RECORD.size + len(data) > self.max_bytes:
+                    segment += 1
+                    path, size = self._path(segment), 0
+                with open(path, "ab") as f:
+                    f.write(RECORD.pack(len(data), zlib.crc32(data)))
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return f"{segment}:{size + RECORD.size}:{len(data)}"
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < end:
+                # сегмент мог вырасти после отображения — отображаем заново;
+                # старое отображение живёт, пока на него есть memoryview
+                with open(self._path(segment), "rb") as f:
+                    mapped = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(mapped) < end:
+                raise StoreError(f"Segment {segment} is shorter than {end} bytes")
+            return mapped
+
+    def get(self, ref: str) -> memoryview:
+        """ Данные записи — срез mmap без копирования """
+        segment, offset, length = (int(part) for part in ref.split(":"))
+        view = memoryview(self._map(segment, offset + length))
+        stored_length, crc = RECORD.unpack_from(view, offset - RECORD.size)
+        data = view[offset:offset + length]
+        if stored_length != length or zlib.crc32(data) != crc:
+            raise StoreError(f"Corrupted replay record {ref}")
+        return data
+
+
+_store = None
+
+
+def _segment_store() -> SegmentStore:
+    global _store
+    if _store is None:
+        _store = SegmentStore()
+    return _store
+
+
+def get_store() -> SegmentStore | None:
+    """ Хранилище сегментов или None, если содержимое реплеев хранится в Postgres """
+    if REPLAY_STORE == "postgres":
+        return None
+    if REPLAY_STORE != "segments":
+        raise StoreError(f"Unknown REPLAY_STORE {REPLAY_STORE!r}")
+    return _segment_store()
+
+
+def load(replay) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    (initial_map, действия) реплея, где бы они ни лежали: в сегменте, в
+    JSONB-массиве (реплеи, записанные до упаковки или не упаковываемые без
+    потерь) или в упакованном логе
+    """
+    if replay.payload_ref is not None:
+        return decode_payload(_segment_store().get(replay.payload_ref))
+    if replay.actions is not None:
+        return replay.initial_map, replay.actions
+    return replay.initial_map, Codec.decode_action_log(replay.actions_packed)
+
+
+def load_frames(replay) -> bytes | None:
+    """ Посчитанные заранее кадры из сегмента или из строки """
+    if replay.frames_ref is not None:
+        return bytes(_segment_store().get(replay.frames_ref))
+    return replay.frames
+
+
+def migrate(db, back: bool = False, batch: int = 200) -> int:
+    """
+    Переносит содержимое реплеев (карту, действия, посчитанные кадры) из строк
+    в сегменты или обратно (back). Строки берутся порциями по id, каждая порция
+    коммитится отдельно, поэтому прерванный перенос можно просто запустить снова.
+    """
+    from sqlalchemy.orm import undefer, undefer_group
+    from app import models   # только для CLI: сервису модели не нужны
+
+    store = _segment_store()
+    moved, last_id = 0, 0
+    pending = models.Replay.payload_ref.isnot(None) if back else models.Replay.payload_ref.is_(None)
+    while True:
+        replays = (
+            db.query(models.Replay)
+              .options(undefer_group("payload"), undefer(models.Replay.frames))
+              .filter(pending, models.Replay.id > last_id)
+              .order_by(models.Replay.id)
+              .limit(batch)
+              .all()
+        )
+        if not replays:
+            return moved
+        for replay in replays:
+            if back:
+                initial_map, actions = decode_payload(store.get(replay.payload_ref))
+                replay.initial_map = initial_map
+                replay.actions_packed = Codec.encode_action_log(actions)
+                replay.payload_ref = None
+                if replay.frames_ref is not None:
+                    replay.frames = bytes(store.get(replay.frames_ref))
+                    replay.frames_ref = None
+            else:
+                if replay.actions is not None or replay.actions_packed is None:
+                    packed = pack_actions(replay.actions or [])
+                    if packed is None:
+                        print(f"[REPLAY STORE] Replay {replay.id}: actions do not pack losslessly, kept in Postgres")
+                        continue
+                else:
+                    packed = replay.actions_packed
+                replay.payload_ref = store.put(encode_payload(replay.initial_map or {}, packed))
+                replay.initial_map = replay.actions = replay.actions_packed = None
+                if replay.frames is not None:
+                    replay.frames_ref = store.put(replay.frames)
+                    replay.frames = None
+        db.commit()
+        moved += sum(1 for replay in replays if (replay.payload_ref is None) == back)
+        last_id = replays[-1].id
+        print(f"[REPLAY STORE] Moved {moved} replays")
+
+
+def pack(db, batch: int = 200) -> Tuple[int, int]:
+    """
+    Упаковывает JSONB-массивы действий в строках Postgres. JSONB очищается только
+    у реплеев, чей упакованный лог распаковывается в точно те же строки;
+    возвращает (упаковано, оставлено как есть).
+    """
+    from sqlalchemy.orm import undefer_group
+    from app import models   # только для CLI: сервису модели не нужны
+
+    packed_count = kept = last_id = 0
+    while True:
+        replays = (
+            db.query(models.Replay)
+              .options(undefer_group("payload"))
+              .filter(models.Replay.actions.isnot(None), models.Replay.id > last_id)
+              .order_by(models.Replay.id)
+              .limit(batch)
+              .all()
+        )
+        if not replays:
+            return packed_count, kept
+        for replay in replays:
+            packed = pack_actions(replay.actions)
+            if packed is None:
+                kept += 1
+                print(f"[REPLAY STORE] Replay {replay.id}: actions do not pack losslessly, kept as JSONB")
+                continue
+            replay.actions_packed = packed
+            replay.actions = None
+            packed_count += 1
+        db.commit()
+        last_id = replays[-1].id
+        print(f"[REPLAY STORE] Packed {packed_count} replays, kept {kept}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("migrate", help="перенести содержимое существующих реплеев")
+    cmd.add_argument("--back", action="store_true", help="из сегментов обратно в Postgres")
+    cmd.add_argument("--batch", type=int, default=200)
+    cmd = sub.add_parser("pack", help="упаковать JSONB-действия, которые распаковываются без потерь")
+    cmd.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    from app.core.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if args.command == "pack":
+            packed, kept = pack(db, batch=args.batch)
+            print(f"[REPLAY STORE] Done: {packed} replays packed, {kept} kept as JSONB")
+            return 0
+        moved = migrate(db, back=args.back, batch=args.batch)
+    finally:
+        db.close()
+    print(f"[REPLAY STORE] Done: {moved} replays moved to {'Postgres' if args.back else SEGMENT_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
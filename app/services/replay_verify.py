@@ -0,0 +1,151 @@
+"""
+Повторная проверка реплеев: каждый реплей заново симулируется и конечное
+состояние сравнивается с сохранённым MatchResult (результат, число тиков, а
+для реплеев с game_params["player_ids"] — победитель и проигравший).
+
+Прогресс (последний проверенный id) хранится в Redis, поэтому таблицу можно
+проходить частями; расхождения складываются в хэш MISMATCHES_KEY.
+
+    python -m app.services.replay_verify --workers 8           # продолжить с контрольной точки
+    python -m app.services.replay_verify --reset --workers 8   # после изменения движка: с начала
+"""
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from redis import Redis
+
+from app import crud
+from app.services import simulation, replay_store
+
+
+CHECKPOINT_KEY = "replays:verify:last_id"
+MISMATCHES_KEY = "replays:verify:mismatches"   # replay_id -> JSON со списком расхождений
+PENDING_KEY = "replays:verify:pending"         # есть разосланные, но не завершённые порции
+BATCH_SIZE = 500                               # реплеев между сохранениями контрольной точки
+
+
+def get_redis() -> Redis:
+    return Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=0,
+        decode_responses=True,
+    )
+
+
+def expected_result(game, game_params: Dict[str, Any]) -> Dict[str, Any]:
+    """ Результат, который записал бы handle_ws для конечного состояния game """
+    winner = game.get_winner()
+    outcome = {"ticks": game.tick_count}
+    if winner == -1:
+        outcome["result"] = "unfinished"
+        return outcome
+    outcome["result"] = "draw" if winner is None else "win"
+
+    player_ids = game_params.get("player_ids")
+    if player_ids:
+        # та же логика выбора, что при завершении игры в handle_ws
+        if winner is None:
+            outcome["winner_id"] = player_ids[0]
+            outcome["loser_id"] = next(uid for uid in player_ids if uid != outcome["winner_id"])
+        else:
+            outcome["winner_id"] = player_ids[winner]
+            outcome["loser_id"] = next(uid for pid, uid in enumerate(player_ids) if pid != winner)
+    return outcome
+
+
+def check(job: Tuple) -> Tuple[int, List[str]]:
+    """
+    Выполняется в процессе пула: (replay_id, game_params, initial_map,
+    действия, сохранённый результат) -> (replay_id, расхождения)
+    """
+    replay_id, game_params, initial_map, actions, stored = job
+    try:
+        game = simulation.run_replay(game_params, initial_map, actions)
+    except Exception as e:
+        return replay_id, [f"simulation failed: {e!r}"]
+    outcome = expected_result(game, game_params)
+    problems = [
+        f"{key}: stored {stored[key]!r}, replay gives {value!r}"
+        for key, value in outcome.items()
+        if stored[key] != value
+    ]
+    return replay_id, problems
+
+
+def _job(replay, match) -> Tuple:
+    initial_map, actions = replay_store.load(replay)
+    stored = {
+        "result": match.result,
+        "ticks": match.ticks,
+        "winner_id": match.winner_id,
+        "loser_id": match.loser_id,
+    }
+    # действия передаются как сохранены: проверяется именно то, что лежит в базе
+    return replay.id, replay.game_params, initial_map, actions, stored
+
+
+def load_jobs(db, after_id: int | None = None, ids: List[int] | None = None, limit: int = BATCH_SIZE) -> List[Tuple]:
+    return [_job(replay, match) for replay, match in crud.iter_replays_for_export(db, after_id=after_id, ids=ids, limit=limit)]
+
+
+def run_checks(jobs: List[Tuple], pool: ProcessPoolExecutor | None = None, workers: int = 1) -> List[Tuple[int, List[str]]]:
+    """ Проверяет jobs в пуле из workers процессов или, без пула, в текущем процессе """
+    if pool is None:
+        return [check(job) for job in jobs]
+    return list(pool.map(check, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def record(redis: Redis, results: List[Tuple[int, List[str]]]) -> int:
+    """ Сохраняет расхождения (и снимает отметку с реплеев, которые теперь сходятся); возвращает их число """
+    mismatches = 0
+    for replay_id, problems in results:
+        if problems:
+            mismatches += 1
+            redis.hset(MISMATCHES_KEY, replay_id, json.dumps(problems))
+            print(f"[VERIFY] Replay {replay_id}: {'; '.join(problems)}")
+        else:
+            redis.hdel(MISMATCHES_KEY, replay_id)
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="реплеев между контрольными точками")
+    parser.add_argument("--limit", type=int, help="проверить не больше стольких реплеев")
+    parser.add_argument("--reset", action="store_true", help="начать с первого реплея и очистить расхождения")
+    args = parser.parse_args(argv)
+
+    from app.core.database import SessionLocal
+    redis = get_redis()
+    if args.reset:
+        redis.delete(CHECKPOINT_KEY, MISMATCHES_KEY, PENDING_KEY)
+    db = SessionLocal()
+    checked = mismatches = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            while args.limit is None or checked < args.limit:
+                after_id = int(redis.get(CHECKPOINT_KEY) or 0)
+                batch = args.batch if args.limit is None else min(args.batch, args.limit - checked)
+                jobs = load_jobs(db, after_id=after_id, limit=batch)
+                db.expunge_all()
+                if not jobs:
+                    break
+                mismatches += record(redis, run_checks(jobs, pool, args.workers))
+                redis.set(CHECKPOINT_KEY, jobs[-1][0])
+                checked += len(jobs)
+                print(f"[VERIFY] {checked} replays checked (up to id {jobs[-1][0]}), {mismatches} mismatches")
+    finally:
+        db.close()
+        redis.close()
+    print(f"[VERIFY] Done: {checked} replays, {mismatches} mismatches; all flagged: {MISMATCHES_KEY}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
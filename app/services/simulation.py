@@ -1,35 +1,208 @@
-from bomberman.GameTools import Game, Action
-from collections import defaultdict
-from typing import List, Dict, Any
+import os
+import threading
+from bomberman.GameTools import Game, Action, TickStats
+from bomberman import Codec
+from app.services import replay_cache, replay_store
+from collections import defaultdict, OrderedDict
+from typing import List, Dict, Any, Iterator, Optional
+
+
+# Профилирование фаз движка (ENGINE_STATS=1); replay_stats копит статистику всех симуляций процесса
+ENGINE_STATS_ENABLED = os.getenv("ENGINE_STATS", "0") == "1"
+replay_stats = TickStats()
+
+# Ключевые кадры для перемотки: каждый KEYFRAME_INTERVAL-й кадр реплея,
+# хранятся для последних KEYFRAME_CACHE_SIZE реплеев. Кэш общий для потоков
+# пула FastAPI, поэтому меняется только под _keyframe_lock
+KEYFRAME_INTERVAL = int(os.getenv("REPLAY_KEYFRAME_INTERVAL", 50))
+KEYFRAME_CACHE_SIZE = int(os.getenv("REPLAY_KEYFRAME_CACHE_SIZE", 32))
+_keyframe_cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_keyframe_lock = threading.Lock()
+
+
+def initial_state(game_params: Dict[str, Any], initial_map: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Начальное состояние: сохранённая карта (в формате export_state или
+    компактном формате bomberman.Codec) или карта, сгенерированная заново по seed
+    """
+    if Codec.is_compact(initial_map):
+        state = Codec.decode_compact(initial_map)
+        state.pop("state_hash")
+        return state
+    if initial_map:
+        return initial_map
+
+    game = Game(
+        width=game_params["width"],
+        height=game_params["height"],
+        num_players=game_params["num_players"],
+        seed=game_params["seed"],
+    )
+    return game.export_state()
+
+
+def new_game(game_params: Dict[str, Any], state: Dict[str, Any], cls: type = Game) -> Game:
+    """ Игра класса cls (Game или подкласс) с параметрами реплея в состоянии state """
+    game = cls(
+        width=game_params["width"],
+        height=game_params["height"],
+        num_players=len(state["players"]),
+        # реплеи, записанные до появления цепных взрывов, не содержат этого флага
+        chain_reactions=game_params.get("chain_reactions", False),
+    )
+    game.import_state(state)
+    return game
+
+
+def action_ticks(actions: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """ Действия, сгруппированные по тикам: i-й элемент порождает кадр i + 1 """
+    ticks: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for a in actions:
+        ticks[a["tick"]].append(a)
+    return [ticks[tick] for tick in sorted(ticks)]
+
+
+def step(game: Game, tick_actions: List[Dict[str, Any]]):
+    """ Применяет действия одного тика (элемент action_ticks) и продвигает игру на тик """
+    for a in tick_actions:
+        game.set_player_action(a["player_int_id"], Action[a["action"]])
+    game.update()
+
+
+def iter_replay(
+    game_params: Dict[str, Any],
+    initial_map: Dict[str, Any],
+    actions: List[Dict[str, Any]],
+    stats: Optional[TickStats] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Генератор кадров игры: каждый кадр строится, только когда его запросили.
+    Если передан stats (или включён ENGINE_STATS), в него пишется время фаз движка по тикам.
+    """
+
+    initial_map = initial_state(game_params, initial_map)
+    game = new_game(game_params, initial_map)
+    if stats is None and ENGINE_STATS_ENABLED:
+        stats = TickStats()
+    if stats is not None:
+        game.enable_stats(stats)
+
+    yield initial_map
+    for tick_actions in action_ticks(actions):
+        step(game, tick_actions)
+        yield game.export_state()
+
+    if ENGINE_STATS_ENABLED:
+        replay_stats.merge(stats)
+        print(f"[ENGINE STATS] replay {stats.summary()}")
 
 
 def simulate_replay(
     game_params: Dict[str, Any],
     initial_map: Dict[str, Any],
-    actions: List[Dict[str, Any]]
+    actions: List[Dict[str, Any]],
+    stats: Optional[TickStats] = None
 ) -> List[Dict[str, Any]]:
     """ Возвращает список состояний (кадров) игры """
+    return list(iter_replay(game_params, initial_map, actions, stats))
 
-    width       = game_params["width"]
-    height      = game_params["height"]
-    radius      = game_params.get("radius")
-    num_players = len(initial_map["players"])
 
-    game = Game(width=width, height=height, num_players=num_players)
-    game.import_state(initial_map)
+def run_replay(
+    game_params: Dict[str, Any],
+    initial_map: Dict[str, Any],
+    actions: List[Dict[str, Any]]
+) -> Game:
+    """ Игра в конечном состоянии реплея — без построения кадров """
+    game = new_game(game_params, initial_state(game_params, initial_map))
+    for tick_actions in action_ticks(actions):
+        step(game, tick_actions)
+    return game
 
-    frames = [initial_map]
 
-    ticks: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
-    for a in actions:
-        ticks[a["tick"]].append(a)
+def build_keyframes(
+    game_params: Dict[str, Any],
+    initial_map: Dict[str, Any],
+    actions: List[Dict[str, Any]],
+    interval: int = KEYFRAME_INTERVAL
+) -> Dict[str, Any]:
+    """
+    Один проход симуляции с сохранением каждого interval-го кадра.
+    Возвращает {"interval", "frame_count", "states"}, где states[i] — кадр i * interval.
+    """
+    state = initial_state(game_params, initial_map)
+    game = new_game(game_params, state)
+    states = [state]
+    ticks = action_ticks(actions)
+    for i, tick_actions in enumerate(ticks, start=1):
+        step(game, tick_actions)
+        if i % interval == 0:
+            states.append(game.export_state())
+    return {"interval": interval, "frame_count": len(ticks) + 1, "states": states}
+
+
+def iter_range(
+    game_params: Dict[str, Any],
+    actions: List[Dict[str, Any]],
+    keyframes: Dict[str, Any],
+    start: int,
+    stop: int
+) -> Iterator[Dict[str, Any]]:
+    """
+    Кадры start..stop-1: восстанавливает ближайший ключевой кадр не позже start
+    и досчитывает только недостающие тики
+    """
+    stop = min(stop, keyframes["frame_count"])
+    if start >= stop:
+        return
+    interval = keyframes["interval"]
+    base = start // interval
+    state = keyframes["states"][base]
+    if start == base * interval:
+        yield state
+    game = new_game(game_params, state)
+
+    ticks = action_ticks(actions)
+    for i in range(base * interval + 1, stop):
+        step(game, ticks[i - 1])
+        if i >= start:
+            yield game.export_state()
+
+
+def simulate_range(
+    game_params: Dict[str, Any],
+    actions: List[Dict[str, Any]],
+    keyframes: Dict[str, Any],
+    start: int,
+    stop: int
+) -> List[Dict[str, Any]]:
+    return list(iter_range(game_params, actions, keyframes, start, stop))
+
+
+def get_keyframes(replay) -> Dict[str, Any]:
+    """
+    Ключевые кадры реплея из кэша процесса; реплеи неизменяемы, поэтому ключ — id.
+    Кадры считаются вне блокировки: два потока могут посчитать один реплей дважды.
+    """
+    with _keyframe_lock:
+        keyframes = _keyframe_cache.get(replay.id)
+        if keyframes is not None:
+            _keyframe_cache.move_to_end(replay.id)
+            return keyframes
 
-    for tick in sorted(ticks):
-        for a in ticks[tick]:
-            pid = a["player_int_id"]
-            act = Action[a["action"]]
-            game.set_player_action(pid, act)
-        game.update()
-        frames.append(game.export_state())
+    blob = replay_cache.precomputed_blob(replay)
+    if blob is not None:
+        # разобрать готовые кадры дешевле, чем симулировать реплей заново
+        frames = replay_cache.decode_frames(blob)
+        keyframes = {
+            "interval": KEYFRAME_INTERVAL,
+            "frame_count": len(frames),
+            "states": frames[::KEYFRAME_INTERVAL],
+        }
+    else:
+        keyframes = build_keyframes(replay.game_params, *replay_store.load(replay))
 
-    return frames
+    with _keyframe_lock:
+        _keyframe_cache[replay.id] = keyframes
+        while len(_keyframe_cache) > KEYFRAME_CACHE_SIZE:
+            _keyframe_cache.popitem(last=False)
+    return keyframes
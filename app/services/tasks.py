@@ -1,12 +1,23 @@
+import os
 from datetime import datetime, timedelta
-from celery import shared_task
+from celery import shared_task, chord
+from redis import Redis
 from sqlalchemy.orm import Session
 
 from app.core.database import SessionLocal
-from app import models
+from app import models, crud
+from app.services import map_pool, bot, simulation, replay_cache, replay_store, replay_verify, analytics
 
 
 LOBBY_TIMEOUT_MINUTES = 5
+BOT_FILL_AFTER_SECONDS = int(os.getenv("BOT_FILL_AFTER_SECONDS", 60))
+VERIFY_REPLAYS_PER_RUN = int(os.getenv("VERIFY_REPLAYS_PER_RUN", 2000))
+VERIFY_CHUNK = int(os.getenv("VERIFY_CHUNK", 50))
+# Если порции не отчитались за это время (упал воркер), следующий запуск разошлёт их заново
+VERIFY_PENDING_TTL = int(os.getenv("VERIFY_PENDING_TTL", 3600))
+ANALYTICS_PER_RUN = int(os.getenv("ANALYTICS_PER_RUN", 1000))
+ANALYTICS_CHUNK = int(os.getenv("ANALYTICS_CHUNK", 50))
+ANALYTICS_PENDING_TTL = int(os.getenv("ANALYTICS_PENDING_TTL", 3600))
 
 
 @shared_task(name="app.tasks.expire_old_lobbies")
@@ -33,3 +44,171 @@ def expire_old_lobbies():
             print(f"[Celery] Expired {updated} lobbies older than {LOBBY_TIMEOUT_MINUTES}m")
     finally:
         db.close()
+
+
+@shared_task(name="app.tasks.refill_map_pool")
+def refill_map_pool():
+    """
+    Заранее генерирует и проверяет карты, чтобы старт лобби не ждал генерации.
+    """
+    redis = Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=0,
+    )
+    try:
+        added = map_pool.refill_pool(redis)
+        if added:
+            print(f"[Celery] Added {added} maps to the map pool")
+    finally:
+        redis.close()
+
+
+@shared_task(name="app.tasks.fill_lobbies_with_bots")
+def fill_lobbies_with_bots():
+    """
+    Сажает бота во все открытые лобби, где единственный игрок ждёт соперника
+    дольше BOT_FILL_AFTER_SECONDS.
+    """
+    db: Session = SessionLocal()
+    try:
+        waiting_since = datetime.utcnow() - timedelta(seconds=BOT_FILL_AFTER_SECONDS)
+        lobbies = crud.get_lobbies_to_fill_with_bots(db, waiting_since)
+        if not lobbies:
+            return
+        for lobby in lobbies:
+            bot_user = crud.get_or_create_bot_user(db, bot.DEFAULT_DIFFICULTY, lobby.id)
+            crud.join_lobby(db, bot_user.id, lobby.id)
+        print(f"[Celery] Added a bot to {len(lobbies)} waiting lobbies")
+    finally:
+        db.close()
+
+
+@shared_task(name="app.tasks.precompute_replay_frames")
+def precompute_replay_frames(replay_id: int):
+    """
+    Симулирует сохранённый реплей в воркере и записывает сжатые кадры в строку
+    Replay, чтобы API отдавало их без симуляции.
+    """
+    db: Session = SessionLocal()
+    try:
+        replay = crud.get_replay(db, replay_id)
+        if replay is None or replay.frames_version == replay_cache.FRAMES_VERSION:
+            return
+        frames = simulation.simulate_replay(replay.game_params, *replay_store.load(replay))
+        blob = replay_cache.encode_frames(frames)
+        crud.set_replay_frames(db, replay_id, blob, replay_cache.FRAMES_VERSION)
+        print(f"[Celery] Precomputed {len(frames)} frames of replay {replay_id} ({len(blob)} bytes)")
+    finally:
+        db.close()
+
+
+@shared_task(name="app.tasks.verify_replays")
+def verify_replays():
+    """
+    Следующие VERIFY_REPLAYS_PER_RUN реплеев после контрольной точки раздаются
+    задачам verify_replay_batch по VERIFY_CHUNK штук — их параллельно выполняют
+    процессы воркера. Контрольная точка сдвигается, только когда все порции
+    завершились (verify_replays_done), а пока они выполняются, новые не
+    рассылаются. Дойдя до конца таблицы, задача ничего не делает, пока точку
+    не сбросят (python -m app.services.replay_verify --reset).
+    """
+    db: Session = SessionLocal()
+    redis = replay_verify.get_redis()
+    try:
+        if not redis.set(replay_verify.PENDING_KEY, 1, nx=True, ex=VERIFY_PENDING_TTL):
+            return
+        after_id = int(redis.get(replay_verify.CHECKPOINT_KEY) or 0)
+        ids = crud.get_replay_ids_after(db, after_id, VERIFY_REPLAYS_PER_RUN)
+        if not ids:
+            redis.delete(replay_verify.PENDING_KEY)
+            return
+        chord(
+            verify_replay_batch.s(ids[i:i + VERIFY_CHUNK]) for i in range(0, len(ids), VERIFY_CHUNK)
+        )(verify_replays_done.s(ids[-1]))
+        print(f"[Celery] Queued verification of {len(ids)} replays up to id {ids[-1]}")
+    finally:
+        redis.close()
+        db.close()
+
+
+@shared_task(name="app.tasks.verify_replay_batch")
+def verify_replay_batch(ids: list[int]) -> int:
+    """ Симулирует реплеи ids и отмечает расхождения с MatchResult """
+    db: Session = SessionLocal()
+    redis = replay_verify.get_redis()
+    try:
+        results = replay_verify.run_checks(replay_verify.load_jobs(db, ids=ids, limit=len(ids)))
+        mismatches = replay_verify.record(redis, results)
+        print(f"[Celery] Verified {len(results)} replays, {mismatches} mismatches")
+        return mismatches
+    finally:
+        redis.close()
+        db.close()
+
+
+@shared_task(name="app.tasks.verify_replays_done")
+def verify_replays_done(mismatches: list[int], last_id: int):
+    """ Все порции проверены: контрольная точка переходит на last_id """
+    redis = replay_verify.get_redis()
+    try:
+        redis.set(replay_verify.CHECKPOINT_KEY, last_id)
+        redis.delete(replay_verify.PENDING_KEY)
+        print(f"[Celery] Verified replays up to id {last_id}, {sum(mismatches)} mismatches")
+    finally:
+        redis.close()
+
+
+@shared_task(name="app.tasks.compute_replay_analytics")
+def compute_replay_analytics():
+    """
+    Раздаёт задачам compute_analytics_batch по ANALYTICS_CHUNK реплеев после
+    курсора analytics.CURSOR_KEY, у матчей которых нет аналитики версии
+    analytics.ANALYTICS_VERSION. Курсор сдвигается, когда все порции завершились
+    (compute_replay_analytics_done); реплеи с ошибкой остаются позади курсора в
+    analytics.FAILED_KEY и заново не берутся. Пока порции выполняются, новые не рассылаются.
+    """
+    db: Session = SessionLocal()
+    redis = analytics.get_redis()
+    try:
+        if not redis.set(analytics.PENDING_KEY, 1, nx=True, ex=ANALYTICS_PENDING_TTL):
+            return
+        after_id = int(redis.get(analytics.CURSOR_KEY) or 0)
+        ids = crud.get_replay_ids_without_analytics(db, analytics.ANALYTICS_VERSION, after_id, ANALYTICS_PER_RUN)
+        if not ids:
+            redis.delete(analytics.PENDING_KEY)
+            return
+        chord(
+            compute_analytics_batch.s(ids[i:i + ANALYTICS_CHUNK]) for i in range(0, len(ids), ANALYTICS_CHUNK)
+        )(compute_replay_analytics_done.s(ids[-1]))
+        print(f"[Celery] Queued analytics of {len(ids)} replays up to id {ids[-1]}")
+    finally:
+        redis.close()
+        db.close()
+
+
+@shared_task(name="app.tasks.compute_analytics_batch")
+def compute_analytics_batch(ids: list[int]) -> int:
+    """ Считает аналитику матчей реплеев ids и сохраняет её """
+    db: Session = SessionLocal()
+    redis = analytics.get_redis()
+    try:
+        results = analytics.run(analytics.load_jobs(db, ids))
+        saved = analytics.save(db, results, redis)
+        print(f"[Celery] Computed analytics of {saved}/{len(results)} replays")
+        return saved
+    finally:
+        redis.close()
+        db.close()
+
+
+@shared_task(name="app.tasks.compute_replay_analytics_done")
+def compute_replay_analytics_done(saved: list[int], last_id: int):
+    """ Все порции посчитаны: курсор аналитики переходит на last_id """
+    redis = analytics.get_redis()
+    try:
+        redis.set(analytics.CURSOR_KEY, last_id)
+        redis.delete(analytics.PENDING_KEY)
+        print(f"[Celery] Analytics computed up to id {last_id}, {sum(saved)} matches saved")
+    finally:
+        redis.close()
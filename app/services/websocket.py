@@ -7,11 +7,14 @@ from fastapi import WebSocket, WebSocketDisconnect, Depends
 from redis.asyncio import Redis
 from sqlalchemy.orm import Session
 
-from bomberman.GameTools import Game, Action
+from bomberman.GameTools import Game, Action, TickStats
+from bomberman import Codec
 from app.core.database import SessionLocal
 from app import models, crud
 from app.core import database, auth
 from app.crud import store_match_result, store_replay
+from app.services import map_pool, bot
+from app.celery_app import celery_app
 
 # Redis client (adjust host/port via environment or here)
 redis_client = Redis(
@@ -21,6 +24,37 @@ redis_client = Redis(
     decode_responses=True
 )
 
+# После матча кадры реплея считаются в воркере Celery (tasks.precompute_replay_frames)
+REPLAY_PRECOMPUTE = os.getenv("REPLAY_PRECOMPUTE", "1") == "1"
+
+# Доска печатается в лог только для небольших полей
+BOARD_LOG_MAX_CELLS = 32 * 32
+
+# Профилирование фаз движка: ENGINE_STATS=1 включает TickStats для каждой игры,
+# сводка по игре печатается каждые ENGINE_STATS_LOG_EVERY тиков и в конце матча
+ENGINE_STATS_ENABLED = os.getenv("ENGINE_STATS", "0") == "1"
+ENGINE_STATS_LOG_EVERY = int(os.getenv("ENGINE_STATS_LOG_EVERY", 100))
+engine_stats = TickStats()                 # сумма по всем завершённым играм процесса
+
+# Цепные взрывы (взрыв поджигает другие бомбы в тот же тик) в живых лобби
+# выключены: по умолчанию играются прежние правила
+CHAIN_REACTIONS = os.getenv("CHAIN_REACTIONS", "0") == "1"
+
+# Между ключевыми кадрами (полное состояние) клиентам уходят только изменения за тик
+KEYFRAME_INTERVAL = int(os.getenv("KEYFRAME_INTERVAL", 20))
+
+# Формат состояний выбирается websocket-подпротоколом. Клиенты без подпротокола
+# получают прежние сообщения: полное состояние каждый тик, без ключевых кадров и дельт
+FORMAT_LEGACY = "legacy"
+FORMAT_JSON = "json"
+FORMAT_COMPACT = "compact"   # bomberman.Codec.compact_state / compact_diff
+FORMAT_BINARY = "binary"     # bomberman.Codec.encode_state / encode_diff, ввод — один байт
+SUBPROTOCOLS = {
+    "bomberman.json": FORMAT_JSON,
+    "bomberman.compact.v1": FORMAT_COMPACT,
+    "bomberman.binary.v1": FORMAT_BINARY,
+}
+
 # In-memory mappings
 
 connections = defaultdict(lambda: defaultdict(list))         # lobby_id -> { user_id: [WebSocket, WebSocket, ...] }
@@ -31,11 +65,110 @@ player_maps = {}                           # lobby_id -> { user_id: internal_id
 reverse_player_maps = {}                   # lobby_id -> { internal_id: user_id }
 replay_data = {}
 init_locks = {}
+tick_locks = {}                            # lobby_id -> Lock: один тик обрабатывается за раз
+lobby_bots = {}                            # lobby_id -> bot.LobbyBots
+
+
+def _remap_players(players: dict, lobby_id: str) -> dict:
+    # internal id → user_id
+    return {
+        str(reverse_player_maps[lobby_id][int(internal)]): info
+        for internal, info in players.items()
+    }
+
+
+def keyframe(game: Game, lobby_id: str) -> dict:
+    """ Полное состояние игры с user_id вместо внутренних id игроков """
+    st = game.export_state()
+    st["players"] = _remap_players(st["players"], lobby_id)
+    # 64-bit Zobrist hash as hex: JSON numbers lose precision past 2**53 in JS clients
+    st["state_hash"] = format(game.state_hash, "016x")
+    return st
+
+
+def select_subprotocol(requested: list[str]) -> str | None:
+    """ Первый поддерживаемый подпротокол из предложенных клиентом """
+    return next((name for name in requested if name in SUBPROTOCOLS), None)
+
+
+def state_message(game: Game, lobby_id: str, fmt: str, event: str = "keyframe", since_tick: int | None = None):
+    """
+    Состояние игры в формате соединения: изменения с since_tick ("delta"),
+    если они известны, иначе полное состояние с событием event.
+    В бинарном формате возвращает bytes, тип сообщения записан в заголовке.
+    В прежнем формате дельт нет: тик и resync дают состояние без поля event,
+    init_state и reconnect_state — состояние с событием.
+    """
+    if fmt == FORMAT_LEGACY:
+        state = keyframe(game, lobby_id)
+        return state if event == "keyframe" else {"event": event, **state}
+
+    ids = reverse_player_maps[lobby_id]
+    if fmt == FORMAT_BINARY:
+        diff = None if since_tick is None else Codec.encode_diff(game, since_tick, ids)
+        return diff if diff is not None else Codec.encode_state(game, ids)
+
+    if fmt == FORMAT_COMPACT:
+        diff = None if since_tick is None else Codec.compact_diff(game, since_tick, ids)
+        if diff is None:
+            return {"event": event, **Codec.compact_state(game, ids)}
+        return {"event": "delta", **diff}
+
+    diff = None if since_tick is None else game.export_diff(since_tick)
+    if diff is None:
+        return {"event": event, **keyframe(game, lobby_id)}
+    diff["players"] = _remap_players(diff["players"], lobby_id)
+    diff["state_hash"] = format(game.state_hash, "016x")
+    return {"event": "delta", **diff}
+
+
+async def send_message(ws: WebSocket, message):
+    if isinstance(message, bytes):
+        await ws.send_bytes(message)
+    else:
+        await ws.send_json(message)
+
+
+async def broadcast_state(game: Game, lobby_id: str, event: str, since_tick: int | None = None):
+    """ Рассылает состояние всем соединениям лобби, кодируя его один раз на формат """
+    messages = {}
+    for uid in lobby_connections[lobby_id]:
+        for ws in connections[lobby_id].get(uid, []):
+            fmt = ws.state.codec
+            if fmt not in messages:
+                messages[fmt] = state_message(game, lobby_id, fmt, event, since_tick)
+            await send_message(ws, messages[fmt])
+
+
+async def receive_message(websocket: WebSocket) -> dict:
+    """ Сообщение клиента как dict; бинарный ввод (один байт) переводится в JSON-эквивалент """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return Codec.decode_input(message["bytes"])
+    return json.loads(message["text"])
+
+
+def queue_replay_precompute(replay_id: int):
+    """ Ставит предрасчёт кадров реплея в очередь Celery (блокирующий вызов) """
+    try:
+        celery_app.send_task("app.tasks.precompute_replay_frames", args=[replay_id], retry=False)
+    except Exception as e:
+        # без предрасчёта кадры посчитает API при первом просмотре
+        print(f"[REPLAY] Could not queue frame precompute for replay {replay_id}: {e!r}")
+
 
+async def save_keyframe(game: Game, lobby_id: str):
+    # Последний ключевой кадр в компактном формате
+    state = Codec.compact_state(game, reverse_player_maps[lobby_id])
+    await redis_client.set(f"game:{lobby_id}:state", json.dumps(state))
 
-async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Session):
+
+async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Session, subprotocol: str | None = None):
     # 1) Accept the WebSocket connection
-    await websocket.accept()
+    await websocket.accept(subprotocol=subprotocol)
+    websocket.state.codec = SUBPROTOCOLS.get(subprotocol, FORMAT_LEGACY)
     print(f"[CONNECTED] User {user_id} connected to lobby {lobby_id}")
 
     # 2) Register the connection
@@ -50,37 +183,53 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
           .filter(models.LobbyPlayer.lobby_id == int(lobby_id))
           .count()
     )
-    print(f"[EXPECTED] Lobby {lobby_id} expects {expected_players} players")
+    # Боты занимают места, но не подключаются: их ходы считаются на сервере
+    bot_users = crud.get_lobby_bots(db, int(lobby_id))
+    expected_humans = expected_players - len(bot_users)
+    print(f"[EXPECTED] Lobby {lobby_id} expects {expected_players} players ({len(bot_users)} bots)")
 
     # 4) Wait until all expected players connect via WS
-    print(f"[LOBBY WAIT] {len(lobby_connections[lobby_id])}/{expected_players} connected, waiting…")
-    while len(lobby_connections[lobby_id]) < expected_players:
+    print(f"[LOBBY WAIT] {len(lobby_connections[lobby_id])}/{expected_humans} connected, waiting…")
+    while len(lobby_connections[lobby_id]) < expected_humans:
         await asyncio.sleep(0.5)
 
     lock = init_locks.setdefault(lobby_id, asyncio.Lock())
     async with lock:
         # 5) Initialize the game and mappings once
         if lobby_id not in game_instances:
-            uids = list(lobby_connections[lobby_id])
+            uids = list(lobby_connections[lobby_id]) + [b.id for b in bot_users]
             player_map = {uid: idx for idx, uid in enumerate(uids)}
             reverse_map = {idx: uid for uid, idx in player_map.items()}
             player_maps[lobby_id] = player_map
             reverse_player_maps[lobby_id] = reverse_map
+            lobby_bots[lobby_id] = bot.LobbyBots({
+                b.id: (player_map[b.id], bot.difficulty_of(b.email)) for b in bot_users
+            })
 
             print(f"[INIT] Creating game {lobby_id} for players {player_map}")
             crud.update_lobby_status(db, int(lobby_id), models.LobbyStatus.in_progress)
 
-            game = Game(width=13, height=11, num_players=expected_players)
+            width, height = map_pool.board_size(expected_players)
+            seed = await map_pool.take_seed(redis_client, width, height, expected_players)
+            game = Game(width=width, height=height, num_players=expected_players,
+                        chain_reactions=CHAIN_REACTIONS, seed=seed)
             game.lobby_id = lobby_id
+            if ENGINE_STATS_ENABLED:
+                game.enable_stats()
             game_instances[lobby_id] = game
 
-            # Сохраняем параметры игры
+            # Сохраняем параметры игры; карта восстанавливается по seed, поэтому initial_map не храним
             replay_data[lobby_id] = {
                 "game_params": {
-                    "width": 13,
-                    "height": 11,
+                    "width": width,
+                    "height": height,
+                    "num_players": expected_players,
+                    "seed": seed,
+                    "chain_reactions": game.chain_reactions,
+                    # user_id по внутреннему id игрока — для проверки результата по реплею
+                    "player_ids": uids,
                 },
-                "initial_map": game.export_state(),
+                "initial_map": {},
                 "actions": []
             }
 
@@ -95,22 +244,14 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
             print(f"[GAME] Lobby {lobby_id} → start_game sent to {len(uids)} clients")
 
             # 5b) Broadcast the initial game state
-            init = game.export_state()
-            players_int = init.pop("players")
-            remapped = {}
-            for internal, info in players_int.items():
-                uid = reverse_player_maps[lobby_id][int(internal)]
-                remapped[str(uid)] = info
-            init["players"] = remapped
-
-            for uid in uids:
-                ws = connections[lobby_id].get(uid)
-                for ws in connections[lobby_id].get(uid, []):
-                    await ws.send_json({"event": "init_state", **init})
-            print(f"[INIT STATE] {init['tick']}")
+            await broadcast_state(game, lobby_id, "init_state")
+            print(f"[INIT STATE] {game.tick_count}")
 
             # 5c) Store initial state in Redis
-            await redis_client.set(f"game:{lobby_id}:state", json.dumps(init))
+            await save_keyframe(game, lobby_id)
+
+            # 5d) Bots start thinking about the first tick
+            lobby_bots[lobby_id].start(game)
             print(f"[REDIS] Initial state stored for lobby {lobby_id}")
         else:
             # 5x) Reconnection handling
@@ -122,11 +263,8 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
                     "event": "start_game",
                     "user_id": user_id
                 })
-                # load last known game state from Redis
-                saved = await redis_client.get(f"game:{lobby_id}:state")
-                if saved:
-                    state = json.loads(saved)
-                    await websocket.send_json({"event": "reconnect_state", **state})
+                # the game lives in this process, so send its current state: Redis only has the last keyframe
+                await send_message(websocket, state_message(game, lobby_id, websocket.state.codec, "reconnect_state"))
 
     game = game_instances[lobby_id]
 
@@ -134,13 +272,22 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
         while True:
             # 6) Receive action from a client
             try:
-                data = await asyncio.wait_for(websocket.receive_json(), timeout=5.0)
+                data = await asyncio.wait_for(receive_message(websocket), timeout=5.0)
                 # action_type = data.get("action", "STAY")
             except asyncio.TimeoutError:
                 data = {"action": "STAY"}
                 # action_type = "STAY"
+            except Codec.CodecError as e:
+                print(f"[ERROR] Invalid binary input from user {user_id}: {e}")
+                continue
 
             # data = await websocket.receive_json()
+            # Клиент, потерявший дельту, просит полное состояние
+            if data.get("event") == "resync":
+                print(f"[RESYNC] User {user_id} in lobby {lobby_id} at tick {game.tick_count}")
+                await send_message(websocket, state_message(game, lobby_id, websocket.state.codec))
+                continue
+
             action_type = data.get("action")
             print(f"[RECEIVED] From {user_id}: {action_type}")
 
@@ -148,48 +295,57 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
                 print(f"[ERROR] Invalid action '{action_type}' from user {user_id}")
                 continue
 
-            # 7) Store the action
-            lobby_actions[lobby_id][user_id] = Action[action_type]
-            replay_data[lobby_id]["actions"].append({
-                "tick": game.tick_count,
-                "player_int_id": player_maps[lobby_id][user_id],
-                "action": action_type,
-                **{k: v for k, v in data.items() if k != "action"}
-            })
-            print(f"[ACTION] Collected {len(lobby_actions[lobby_id])}/{expected_players} actions")
-
-            # 8) Wait until all players have sent their action
-            if len(lobby_actions[lobby_id]) < expected_players:
-                continue
-
-            # 9) Process the tick
-            print(f"[TICK] Processing tick #{game.tick_count + 1}")
-            for uid, action in lobby_actions[lobby_id].items():
-                internal_id = player_maps[lobby_id][uid]
-                game.set_player_action(internal_id, action)
-            lobby_actions[lobby_id].clear()
-
-            game.update()
+            # Пока обрабатывается тик (ждём ходы ботов), новые ходы относятся к следующему тику
+            async with tick_locks.setdefault(lobby_id, asyncio.Lock()):
+                # 7) Store the action
+                lobby_actions[lobby_id][user_id] = Action[action_type]
+                replay_data[lobby_id]["actions"].append({
+                    "tick": game.tick_count,
+                    "player_int_id": player_maps[lobby_id][user_id],
+                    "action": action_type,
+                    **{k: v for k, v in data.items() if k != "action"}
+                })
+                print(f"[ACTION] Collected {len(lobby_actions[lobby_id])}/{expected_humans} actions")
+
+                # 8) Wait until all players have sent their action
+                if len(lobby_actions[lobby_id]) < expected_humans:
+                    continue
+
+                # 8a) Collect the bots' moves, searched since the previous tick
+                bots = lobby_bots.get(lobby_id)
+                if bots is not None:
+                    for uid, action in (await bots.collect()).items():
+                        lobby_actions[lobby_id][uid] = action
+                        replay_data[lobby_id]["actions"].append({
+                            "tick": game.tick_count,
+                            "player_int_id": player_maps[lobby_id][uid],
+                            "action": action.name,
+                        })
+
+                # 9) Process the tick
+                print(f"[TICK] Processing tick #{game.tick_count + 1}")
+                for uid, action in lobby_actions[lobby_id].items():
+                    internal_id = player_maps[lobby_id][uid]
+                    game.set_player_action(internal_id, action)
+                lobby_actions[lobby_id].clear()
+
+                game.update()
+            if game.stats is not None and game.tick_count % ENGINE_STATS_LOG_EVERY == 0:
+                print(f"[ENGINE STATS] Lobby {lobby_id}: {game.stats.summary()}")
 
             # 10) Log the board for debugging
-            print("[BOARD]")
-            game.print_board(id_map=reverse_player_maps[lobby_id])
+            if game.width * game.height <= BOARD_LOG_MAX_CELLS:
+                print("[BOARD]")
+                game.print_board(id_map=reverse_player_maps[lobby_id])
 
             # 11) Export, broadcast, and save state
-            st = game.export_state()
-            # remap players → user_ids
-            pi = st.pop("players")
-            mp = {}
-            for internal, info in pi.items():
-                mp[str(reverse_player_maps[lobby_id][int(internal)])] = info
-            st["players"] = mp
-
-            # save and broadcast
-            await redis_client.set(f"game:{lobby_id}:state", json.dumps(st))
-            for uid in lobby_connections[lobby_id]:
-                ws = connections[lobby_id].get(uid)
-                for ws in connections[lobby_id].get(uid, []):
-                    await ws.send_json(st)
+            # keyframe every KEYFRAME_INTERVAL ticks, otherwise the changes of this tick
+            since_tick = game.tick_count - 1 if game.tick_count % KEYFRAME_INTERVAL else None
+            await broadcast_state(game, lobby_id, "keyframe", since_tick)
+
+            # Redis keeps the last keyframe; deltas are only broadcast
+            if since_tick is None:
+                await save_keyframe(game, lobby_id)
 
             # 12) Check for game over
             winner_internal = game.get_winner()
@@ -207,6 +363,13 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
                     )
 
                 print(f"[GAME OVER] Lobby {lobby_id} result={result}, winner={winner_user_id}")
+                bots = lobby_bots.pop(lobby_id, None)
+                if bots is not None and bots.bots:
+                    print(f"[BOT STATS] Lobby {lobby_id}: {bots.stats.summary()}")
+                if game.stats is not None:
+                    engine_stats.merge(game.stats)
+                    print(f"[ENGINE STATS] Lobby {lobby_id}: {game.stats.summary()}")
+                    print(f"[ENGINE STATS] All games: {engine_stats.summary()}")
                 crud.update_lobby_status(db, int(lobby_id), models.LobbyStatus.finished)
 
                 match = store_match_result(
@@ -219,13 +382,16 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
                 )
 
                 rd = replay_data[lobby_id]
-                store_replay(
+                replay = store_replay(
                     db,
                     match.id,
                     rd["game_params"],
                     rd["initial_map"],
                     rd["actions"]
                 )
+                if REPLAY_PRECOMPUTE:
+                    # send_task ходит в брокер синхронно, поэтому — в пуле потоков, без ожидания
+                    asyncio.get_running_loop().run_in_executor(None, queue_replay_precompute, replay.id)
 
                 # Remove state from Redis
                 await redis_client.delete(f"game:{lobby_id}:state")
@@ -247,8 +413,14 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
                 del reverse_player_maps[lobby_id]
                 del replay_data[lobby_id]
                 init_locks.pop(lobby_id, None)
+                tick_locks.pop(lobby_id, None)
                 break
 
+            # 13) Bots start thinking about the next tick while humans do
+            bots = lobby_bots.get(lobby_id)
+            if bots is not None:
+                bots.start(game)
+
     except WebSocketDisconnect:
         print(f"[DISCONNECT] User {user_id} left lobby {lobby_id}")
         lst = connections[lobby_id].get(user_id, [])
@@ -270,6 +442,10 @@ async def handle_ws(websocket: WebSocket, user_id: int, lobby_id: str, db: Sessi
             reverse_player_maps.pop(lobby_id, None)
             replay_data.pop(lobby_id, None)
             init_locks.pop(lobby_id, None)
+            tick_locks.pop(lobby_id, None)
+            bots = lobby_bots.pop(lobby_id, None)
+            if bots is not None:
+                bots.cancel()
 
     finally:
         db.close()
@@ -0,0 +1,35 @@
+"""
+Engine benchmarks and differential checks.
+
+    python -m benchmarks.engine --out bench.json [--compare old.json]
+    python -m benchmarks.differential [--trials 50 --ticks 300]
+"""
+import random
+
+from bomberman.GameTools import Action
+
+
+MOVES = [Action.STAY, Action.UP, Action.DOWN, Action.LEFT, Action.RIGHT]
+
+
+def random_actions(rng: random.Random, num_players, ticks, bomb_rate):
+    """ ticks rows of per-player actions; each action is BOMB with probability bomb_rate """
+    return [
+        [Action.BOMB if rng.random() < bomb_rate else rng.choice(MOVES) for _ in range(num_players)]
+        for _ in range(ticks)
+    ]
+
+
+def apply_tick(game, actions):
+    for pid, action in enumerate(actions):
+        game.set_player_action(pid, action)
+    game.update()
+
+
+def replay_actions(actions):
+    """ Action rows in the stored replay format (see app.services.websocket) """
+    return [
+        {"tick": tick, "player_int_id": pid, "action": action.name}
+        for tick, row in enumerate(actions)
+        for pid, action in enumerate(row)
+    ]
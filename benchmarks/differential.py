@@ -0,0 +1,412 @@
+"""
+Differential checks: every optimized engine path is run in lockstep with the
+reference Game on randomized action sequences, and the first state that
+differs is reported; Game itself is checked against a frozen copy of the
+original engine (benchmarks/baseline_engine.py). Exits with status 1 on any
+divergence.
+
+    python -m benchmarks.differential --trials 50 --ticks 300
+"""
+import argparse
+import json
+import random
+import sys
+
+import numpy as np
+
+from bomberman.GameTools import Game, Tile, apply_diff, zobrist_key, Z_TILE, Z_PLAYER, Z_BOMB, Z_FIRE, MASK64
+from bomberman.VecGame import VecGame
+from bomberman import Codec
+from app.services.simulation import simulate_replay, build_keyframes, simulate_range
+from benchmarks import random_actions, apply_tick, replay_actions, baseline_engine
+
+
+BOARDS = [(7, 5, 2), (13, 11, 2), (13, 11, 4), (15, 7, 3), (21, 21, 8)]
+
+
+def first_difference(expected, actual, path="state"):
+    """ Path of the first differing value in two export_state() dicts, or None """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual), key=str):
+            if key not in expected or key not in actual:
+                return f"{path}.{key}"
+            diff = first_difference(expected[key], actual[key], f"{path}.{key}")
+            if diff:
+                return diff
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return f"{path} (length {len(expected)} != {len(actual)})"
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            diff = first_difference(a, b, f"{path}[{i}]")
+            if diff:
+                return diff
+        return None
+    return None if expected == actual else f"{path} ({expected!r} != {actual!r})"
+
+
+def _reference_run(case):
+    """
+    Reference Game states: the start state followed by one state per tick.
+    The game keeps running after it is decided; case["decided_at"] is set to
+    the tick at which get_winner() first reported a result.
+    """
+    game = _new_game(Game)(case)
+    states = [(game.export_state(), game.state_hash)]
+    case["decided_at"] = None
+    for actions in case["actions"]:
+        apply_tick(game, actions)
+        states.append((game.export_state(), game.state_hash))
+        if case["decided_at"] is None and game.get_winner() != -1:
+            case["decided_at"] = game.tick_count
+    return states
+
+
+def _lockstep(case, reference, make, step, compare_hash=True):
+    # Steps a candidate with step(candidate, actions, rng) and compares it to
+    # the reference after every tick
+    junk = random.Random(case["seed"])
+    game = make(case)
+    for tick, (expected, expected_hash) in enumerate(reference):
+        if tick:
+            game = step(game, case["actions"][tick - 1], junk) or game
+        diff = first_difference(expected, game.export_state())
+        if diff is None and compare_hash and game.state_hash != expected_hash:
+            diff = f"state_hash ({expected_hash:016x} != {game.state_hash:016x})"
+        if diff:
+            return tick, diff
+    return None
+
+
+def _new_game(cls):
+    return lambda case: cls(case["width"], case["height"], case["num_players"],
+                            chain_reactions=case["chain_reactions"], seed=case["seed"])
+
+
+def check_clone(case, reference):
+    # Every tick runs on a fresh clone; the abandoned original is stepped with
+    # junk actions to catch state shared between the two
+    def step(game, actions, junk):
+        other = game.clone()
+        apply_tick(game, random_actions(junk, case["num_players"], 1, 0.5)[0])
+        apply_tick(other, actions)
+        return other
+    return _lockstep(case, reference, _new_game(Game), step)
+
+
+def check_snapshot(case, reference):
+    # Every tick wanders off with junk actions and comes back through restore()
+    def step(game, actions, junk):
+        snapshot = game.snapshot()
+        for _ in range(junk.randint(1, 3)):
+            apply_tick(game, random_actions(junk, case["num_players"], 1, 0.5)[0])
+        game.restore(snapshot)
+        apply_tick(game, actions)
+    return _lockstep(case, reference, _new_game(Game), step)
+
+
+def check_profiled(case, reference):
+    def make(case):
+        game = _new_game(Game)(case)
+        game.enable_stats()
+        return game
+    return _lockstep(case, reference, make, lambda g, a, _: apply_tick(g, a))
+
+
+def _scheme_hash(state):
+    # state_hash of an export_state() dict straight from the key definitions
+    h = sum(
+        zobrist_key(Z_TILE, x, y, Tile[name])
+        for y, row in enumerate(state["grid"]) for x, name in enumerate(row)
+    )
+    h += sum(zobrist_key(Z_PLAYER, int(pid), p["x"], p["y"], p["alive"]) for pid, p in state["players"].items())
+    h += sum(zobrist_key(Z_BOMB, b["owner_id"], b["x"], b["y"], b["timer"], b["radius"]) for b in state["bombs"])
+    h += sum(zobrist_key(Z_FIRE, f["x"], f["y"], f["ttl"]) for f in state["fire"])
+    return h & MASK64
+
+
+def check_state_hash(case, reference):
+    # The incrementally kept hash against one rebuilt by import_state() and
+    # against the key definitions
+    game = _new_game(Game)(case)
+    for tick, (expected, expected_hash) in enumerate(reference):
+        game.import_state(expected)
+        if game.state_hash != expected_hash:
+            return tick, f"imported state_hash ({expected_hash:016x} != {game.state_hash:016x})"
+        if tick % 10 == 0 and _scheme_hash(expected) != expected_hash:
+            return tick, "state_hash does not match the Zobrist key definitions"
+    return None
+
+
+def check_danger_map(case, reference):
+    # The map kept across ticks (rebuilt only when bombs are placed or go off)
+    # against one built from scratch on an imported copy of the state
+    game = _new_game(Game)(case)
+    fresh = _new_game(Game)(case)
+    for tick, (expected, _) in enumerate(reference):
+        if tick:
+            apply_tick(game, case["actions"][tick - 1])
+        fresh.import_state(expected)
+        danger, want = game.danger_map(), fresh.danger_map()
+        if danger != want:
+            y = next(y for y, (a, b) in enumerate(zip(want, danger)) if a != b)
+            x = next(x for x, (a, b) in enumerate(zip(want[y], danger[y])) if a != b)
+            return tick, f"danger[{y}][{x}] ({want[y][x]} != {danger[y][x]})"
+    return None
+
+
+def _baseline_game(state):
+    # The frozen engine can only spawn 4 players on a random map, so it starts
+    # from the imported start state instead of its own constructor
+    game = baseline_engine.Game.__new__(baseline_engine.Game)
+    game.import_state(state)
+    return game
+
+
+def check_baseline(case, reference):
+    # The current engine with default rules against the frozen pre-rewrite
+    # engine, continuously and from a fresh import_state() of its state every
+    # tick (the import must keep bomb tiles the blasts turned into fire)
+    if case["chain_reactions"]:
+        case = {**case, "chain_reactions": False}
+        reference = _reference_run(case)
+    baseline = _baseline_game(reference[0][0])
+    imported = _new_game(Game)(case)
+    for tick, (expected, _) in enumerate(reference):
+        if tick:
+            actions = case["actions"][tick - 1]
+            imported.import_state(baseline.export_state())
+            apply_tick(baseline, [baseline_engine.Action[action.name] for action in actions])
+            apply_tick(imported, actions)
+            diff = first_difference(baseline.export_state(), imported.export_state())
+            if diff:
+                return tick, f"imported: {diff}"
+        diff = first_difference(baseline.export_state(), expected)
+        if diff:
+            return tick, diff
+    return None
+
+
+def check_export_diff(case, reference):
+    # States rebuilt from the previous reference state and export_diff(),
+    # over one tick and over several
+    game = _new_game(Game)(case)
+    for tick in range(1, len(reference)):
+        apply_tick(game, case["actions"][tick - 1])
+        for back in (1, 5):
+            if tick - back < 0:
+                continue
+            state = apply_diff(reference[tick - back][0], game.export_diff(tick - back))
+            diff = first_difference(reference[tick][0], state)
+            if diff:
+                return tick, f"diff over {back} ticks: {diff}"
+    return None
+
+
+def check_codec(case, reference):
+    # Binary and compact encodings of every state and of every one-tick diff
+    game = _new_game(Game)(case)
+    for tick, (expected, expected_hash) in enumerate(reference):
+        if tick:
+            apply_tick(game, case["actions"][tick - 1])
+        for name, state, diff in (
+            ("binary", Codec.decode(Codec.encode_state(game)),
+             tick and Codec.decode(Codec.encode_diff(game, tick - 1))),
+            ("compact", Codec.decode_compact(json.loads(json.dumps(Codec.compact_state(game)))),
+             tick and Codec.decode_compact(json.loads(json.dumps(Codec.compact_diff(game, tick - 1))))),
+        ):
+            if state.pop("state_hash") != expected_hash:
+                return tick, f"{name} state_hash"
+            found = first_difference(expected, state)
+            if found is None and diff:
+                diff.pop("state_hash")
+                found = first_difference(expected, apply_diff(reference[tick - 1][0], diff))
+            if found:
+                return tick, f"{name}: {found}"
+    return None
+
+
+class _VecBoard:
+    """ Board 0 of a one-board VecGame behind the bits of the Game API used by _lockstep """
+
+    def __init__(self, case, start):
+        self.vec = VecGame(1, case["width"], case["height"], case["num_players"], seed=case["seed"],
+                           chain_reactions=case["chain_reactions"])
+        self.vec.import_state(0, start)
+        self.done = False
+
+    def step(self, actions):
+        _, dones, _ = self.vec.step(np.array([[action.value for action in actions]]))
+        # a finished board is reset at once; its last state is not observable
+        self.done = bool(dones[0])
+
+    def export_state(self):
+        return self.vec.export_state(0)
+
+
+def _dedup_fire(state):
+    # VecGame keeps one fire flag per tile and ttl, Game may hold duplicates
+    state = dict(state)
+    state["fire"] = [
+        {"x": x, "y": y, "ttl": ttl}
+        for y, x, ttl in sorted({(f["y"], f["x"], f["ttl"]) for f in state["fire"]})
+    ]
+    return state
+
+
+def check_vec_game(case, reference):
+    # VecGame resets a board as soon as it is decided, so compare up to that tick
+    board = _VecBoard(case, reference[0][0])
+    for tick, (expected, _) in enumerate(reference):
+        if tick:
+            board.step(case["actions"][tick - 1])
+            if board.done or tick == case["decided_at"]:
+                if board.done and tick == case["decided_at"]:
+                    return None
+                return tick, f"VecGame done={board.done}, Game decided at tick {case['decided_at']}"
+        diff = first_difference(_dedup_fire(expected), board.export_state())
+        if diff:
+            return tick, diff
+    return None
+
+
+def _replay_params(case):
+    return {"width": case["width"], "height": case["height"], "num_players": case["num_players"],
+            "seed": case["seed"], "chain_reactions": case["chain_reactions"]}
+
+
+def _compare_frames(expected_frames, frames):
+    if len(frames) != len(expected_frames):
+        return min(len(frames), len(expected_frames)), f"frame count ({len(expected_frames)} != {len(frames)})"
+    for tick, (expected, frame) in enumerate(zip(expected_frames, frames)):
+        diff = first_difference(expected, frame)
+        if diff:
+            return tick, diff
+    return None
+
+
+def check_simulate_replay(case, reference):
+    ticks = len(reference) - 1
+    frames = simulate_replay(_replay_params(case), {}, replay_actions(case["actions"][:ticks]))
+    return _compare_frames([state for state, _ in reference], frames)
+
+
+def check_keyframes(case, reference):
+    # Windows of frames resumed from keyframes (import_state of an exported state)
+    rng = random.Random(case["seed"])
+    actions = replay_actions(case["actions"][:len(reference) - 1])
+    keyframes = build_keyframes(_replay_params(case), {}, actions, interval=7)
+    for _ in range(5):
+        start = rng.randrange(len(reference))
+        stop = min(len(reference), start + rng.randint(1, 20))
+        for tick, frame in enumerate(simulate_range(_replay_params(case), actions, keyframes, start, stop), start):
+            diff = first_difference(reference[tick][0], frame)
+            if diff:
+                return tick, diff
+    return None
+
+
+def check_action_log(case, reference):
+    # Rows as a live game records them: players in arrival order, sometimes a
+    # second action in the same tick, extra client keys. The packed log must
+    # give back the same rows, and simulate_replay the same states.
+    rng = random.Random(case["seed"])
+    rows = []
+    for tick, actions in enumerate(case["actions"][:len(reference) - 1]):
+        order = list(range(len(actions)))
+        rng.shuffle(order)
+        if rng.random() < 0.1:
+            order.append(rng.randrange(len(actions)))
+        for pid in order:
+            row = {"tick": tick, "player_int_id": pid, "action": actions[pid].name}
+            if rng.random() < 0.05:
+                row["seq"] = rng.randrange(4)
+            rows.append(row)
+
+    decoded = Codec.decode_action_log(Codec.encode_action_log(rows))
+    for i, (row, got) in enumerate(zip(rows, decoded)):
+        if row != got:
+            return row["tick"], f"action row {i} ({row!r} != {got!r})"
+    if len(decoded) != len(rows):
+        return 0, f"action rows ({len(rows)} != {len(decoded)})"
+    params = _replay_params(case)
+    return _compare_frames(simulate_replay(params, {}, rows), simulate_replay(params, {}, decoded))
+
+
+CHECKS = {
+    "action_log": check_action_log,
+    "baseline": check_baseline,
+    "clone": check_clone,
+    "codec": check_codec,
+    "danger_map": check_danger_map,
+    "export_diff": check_export_diff,
+    "keyframes": check_keyframes,
+    "snapshot": check_snapshot,
+    "state_hash": check_state_hash,
+    "profiled": check_profiled,
+    "vec_game": check_vec_game,
+    "simulate_replay": check_simulate_replay,
+}
+
+
+def make_case(rng: random.Random, ticks):
+    width, height, num_players = rng.choice(BOARDS)
+    bomb_rate = rng.choice([0.02, 0.05, 0.15])
+    return {
+        "width": width,
+        "height": height,
+        "num_players": num_players,
+        "seed": rng.getrandbits(31),
+        "bomb_rate": bomb_rate,
+        "actions": random_actions(rng, num_players, ticks, bomb_rate),
+        "chain_reactions": rng.random() < 0.5,
+    }
+
+
+def run(checks, trials, ticks, seed):
+    """ Runs the checks on trials random cases and returns the list of divergences """
+    rng = random.Random(seed)
+    failures = []
+    for trial in range(trials):
+        case = make_case(rng, ticks)
+        reference = _reference_run(case)
+        for name in checks:
+            result = CHECKS[name](case, reference)
+            if result is not None:
+                tick, diff = result
+                failures.append({
+                    "check": name,
+                    "trial": trial,
+                    "tick": tick,
+                    "difference": diff,
+                    "case": {k: v for k, v in case.items() if k != "actions"},
+                })
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="append", choices=sorted(CHECKS), help="run only these checks")
+    parser.add_argument("--out", help="write the divergences as JSON")
+    args = parser.parse_args(argv)
+
+    checks = args.check or list(CHECKS)
+    failures = run(checks, args.trials, args.ticks, args.seed)
+
+    for failure in failures:
+        print(f"[DIVERGED] {failure['check']} trial={failure['trial']} tick={failure['tick']}: "
+              f"{failure['difference']} case={failure['case']}")
+    print(f"{len(checks)} checks x {args.trials} trials: {len(failures)} divergences")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"checks": checks, "trials": args.trials, "ticks": args.ticks,
+                       "seed": args.seed, "failures": failures}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
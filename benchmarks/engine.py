@@ -0,0 +1,196 @@
+"""
+Engine benchmarks: Game.update throughput across board sizes and bomb
+densities, export_state/import_state cost and simulate_replay on long action
+logs. Results are written as JSON so runs on different commits can be
+compared.
+
+    python -m benchmarks.engine --out bench.json
+    python -m benchmarks.engine --quick --compare bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bomberman.GameTools import Game
+from app.services.simulation import simulate_replay
+from benchmarks import random_actions, apply_tick, replay_actions
+
+
+ENGINES = {"Game": Game}
+BOARDS = [(13, 11, 4), (41, 41, 16), (101, 101, 16)]
+BOMB_RATES = [0.02, 0.2]
+UPDATE_TICKS = 2000
+STATE_ROUNDS = 200
+REPLAY_TICKS = 2000
+REPLAY_BOARDS = [(13, 11, 4), (41, 41, 16)]
+
+
+def _best_of(repeat, run):
+    # run() returns (seconds, operations); the fastest repeat is reported
+    return min((run() for _ in range(repeat)), key=lambda r: r[0] / r[1])
+
+
+def _result(params, seconds, ops):
+    return {
+        "params": params,
+        "ops": ops,
+        "seconds": seconds,
+        "per_second": ops / seconds,
+        "us_per_op": seconds / ops * 1e6,
+    }
+
+
+def bench_update(cls, width, height, num_players, bomb_rate, ticks, repeat):
+    actions = random_actions(random.Random(1), num_players, ticks, bomb_rate)
+    start = cls(width, height, num_players, seed=1).snapshot()
+
+    def run():
+        # A decided game is put back to the start so that every tick has live players
+        game = cls(width, height, num_players, seed=1)
+        elapsed = 0.0
+        for row in actions:
+            t = time.perf_counter()
+            apply_tick(game, row)
+            elapsed += time.perf_counter() - t
+            if game.get_winner() != -1:
+                game.restore(start)
+        return elapsed, ticks
+
+    return _best_of(repeat, run)
+
+
+def _mid_game(cls, width, height, num_players):
+    # A state with bombs, fire and crates gone: 30 ticks of busy random play
+    game = cls(width, height, num_players, seed=2)
+    for row in random_actions(random.Random(2), num_players, 30, 0.3):
+        apply_tick(game, row)
+    return game
+
+
+def bench_export(cls, width, height, num_players, rounds, repeat):
+    game = _mid_game(cls, width, height, num_players)
+
+    def run():
+        t = time.perf_counter()
+        for _ in range(rounds):
+            game.export_state()
+        return time.perf_counter() - t, rounds
+
+    return _best_of(repeat, run)
+
+
+def bench_import(cls, width, height, num_players, rounds, repeat):
+    state = _mid_game(cls, width, height, num_players).export_state()
+    game = cls(width, height, num_players, seed=3)
+
+    def run():
+        t = time.perf_counter()
+        for _ in range(rounds):
+            game.import_state(state)
+        return time.perf_counter() - t, rounds
+
+    return _best_of(repeat, run)
+
+
+def bench_simulate(width, height, num_players, ticks, repeat):
+    game_params = {"width": width, "height": height, "num_players": num_players, "seed": 4, "chain_reactions": True}
+    actions = replay_actions(random_actions(random.Random(4), num_players, ticks, 0.05))
+
+    def run():
+        t = time.perf_counter()
+        frames = simulate_replay(game_params, {}, actions)
+        return time.perf_counter() - t, len(frames) - 1
+
+    return _best_of(repeat, run)
+
+
+def run_all(quick=False, repeat=3):
+    scale = 10 if quick else 1
+    boards = BOARDS[:2] if quick else BOARDS
+    results = {}
+
+    for name, cls in ENGINES.items():
+        for width, height, num_players in boards:
+            board = f"{width}x{height}x{num_players}"
+            for rate in BOMB_RATES:
+                params = {"engine": name, "width": width, "height": height,
+                          "num_players": num_players, "bomb_rate": rate}
+                seconds, ops = bench_update(cls, width, height, num_players, rate, UPDATE_TICKS // scale, repeat)
+                results[f"update/{name}/{board}/bombs={rate}"] = _result(params, seconds, ops)
+
+            params = {"engine": name, "width": width, "height": height, "num_players": num_players}
+            seconds, ops = bench_export(cls, width, height, num_players, STATE_ROUNDS // scale, repeat)
+            results[f"export_state/{name}/{board}"] = _result(params, seconds, ops)
+            seconds, ops = bench_import(cls, width, height, num_players, STATE_ROUNDS // scale, repeat)
+            results[f"import_state/{name}/{board}"] = _result(params, seconds, ops)
+
+    for width, height, num_players in REPLAY_BOARDS:
+        params = {"width": width, "height": height, "num_players": num_players, "ticks": REPLAY_TICKS // scale}
+        seconds, ops = bench_simulate(width, height, num_players, REPLAY_TICKS // scale, repeat)
+        results[f"simulate_replay/{width}x{height}x{num_players}"] = _result(params, seconds, ops)
+
+    return results
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def metadata():
+    return {
+        "commit": _git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(old, new):
+    """ Prints per-benchmark speed of new relative to old (>1 is faster) """
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            print(f"{name:55s} {result['us_per_op']:12.2f} us   (new)")
+            continue
+        ratio = before["us_per_op"] / result["us_per_op"]
+        print(f"{name:55s} {result['us_per_op']:12.2f} us   {ratio:5.2f}x vs {before['us_per_op']:.2f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="fewer ticks and no 101x101 boards")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    report = {"meta": metadata(), "results": run_all(args.quick, args.repeat)}
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    else:
+        for name, result in report["results"].items():
+            print(f"{name:55s} {result['us_per_op']:12.2f} us  {result['per_second']:12.0f}/s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
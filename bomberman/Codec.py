@@ -0,0 +1,430 @@
+import json
+import struct
+
+import numpy as np
+
+from bomberman.GameTools import Action, TILE_NAMES
+
+
+# Binary format, little-endian. Every message starts with HEADER:
+#   magic b"BM", version, kind (KIND_STATE / KIND_DIFF), tick, width, height, state_hash
+# A state then has counts (players, bombs, fire), the grid as 4-bit tile codes
+# (two cells per byte, low nibble first, row-major) and the entity records.
+# A diff has the since tick, counts (tiles, players, bombs, fire), tile
+# records and the entity records; bombs and fire are always complete lists.
+VERSION = 1
+MAGIC = b"BM"
+KIND_STATE = 0
+KIND_DIFF = 1
+
+HEADER = struct.Struct("<2sBBIHHQ")
+STATE_COUNTS = struct.Struct("<HHI")
+DIFF_COUNTS = struct.Struct("<IIHHI")    # since, tiles, players, bombs, fire
+TILE = struct.Struct("<HHB")             # x, y, tile code
+PLAYER = struct.Struct("<IHHB")          # id, x, y, alive
+BOMB = struct.Struct("<IHHBB")           # owner_id, x, y, timer, radius
+FIRE = struct.Struct("<HHB")             # x, y, ttl
+
+# Client input in binary mode is a single byte: an Action value or RESYNC
+RESYNC = 0xFF
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _player_id(player_ids, pid):
+    return pid if player_ids is None else player_ids[pid]
+
+
+# --- binary -----------------------------------------------------------------
+
+def _pack_grid(codes: bytes):
+    cells = np.frombuffer(codes, dtype=np.uint8)
+    if len(cells) % 2:
+        cells = np.append(cells, 0)
+    return (cells[0::2] | (cells[1::2] << 4)).astype(np.uint8).tobytes()
+
+
+def _unpack_grid(buf, width, height):
+    packed = np.frombuffer(buf, dtype=np.uint8)
+    cells = np.empty(len(packed) * 2, dtype=np.uint8)
+    cells[0::2] = packed & 0x0F
+    cells[1::2] = packed >> 4
+    return cells[:width * height].reshape(height, width)
+
+
+def _entity_records(game, pids, player_ids):
+    players = b"".join(
+        PLAYER.pack(_player_id(player_ids, pid), game.players[pid].x, game.players[pid].y, game.players[pid].alive)
+        for pid in pids
+    )
+    bombs = b"".join(BOMB.pack(b.owner_id, b.x, b.y, b.timer, b.radius) for b in game.bombs)
+    fire = b"".join(FIRE.pack(x, y, ttl) for x, y, ttl in game.fire)
+    return players + bombs + fire
+
+
+def encode_state(game, player_ids=None):
+    """
+    Full state of game as a binary message. player_ids maps internal player
+    ids to the ids sent to clients (bomb owners stay internal, as in
+    export_state).
+    """
+    header = HEADER.pack(MAGIC, VERSION, KIND_STATE, game.tick_count, game.width, game.height, game.state_hash)
+    counts = STATE_COUNTS.pack(len(game.players), len(game.bombs), len(game.fire))
+    grid = _pack_grid(game._grid_bytes())
+    return header + counts + grid + _entity_records(game, list(game.players), player_ids)
+
+
+def encode_diff(game, since_tick, player_ids=None):
+    """ Binary counterpart of Game.export_diff(since_tick); None when the changes are unknown """
+    changes = game.changes_since(since_tick)
+    if changes is None:
+        return None
+    tiles, pids = changes
+    pids = sorted(pids)
+
+    header = HEADER.pack(MAGIC, VERSION, KIND_DIFF, game.tick_count, game.width, game.height, game.state_hash)
+    counts = DIFF_COUNTS.pack(since_tick, len(tiles), len(pids), len(game.bombs), len(game.fire))
+    tile_records = b"".join(
+        TILE.pack(x, y, game.grid[y][x]) for x, y in sorted(tiles, key=lambda cell: (cell[1], cell[0]))
+    )
+    return header + counts + tile_records + _entity_records(game, pids, player_ids)
+
+
+def decode(buf):
+    """
+    Binary message as an export_state() dict (KIND_STATE) or an
+    export_diff() dict (KIND_DIFF), with the hash under "state_hash".
+    """
+    if len(buf) < HEADER.size:
+        raise CodecError("Message too short")
+    magic, version, kind, tick, width, height, state_hash = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise CodecError("Not a game state message")
+    if version != VERSION:
+        raise CodecError(f"Unsupported codec version {version}")
+
+    offset = HEADER.size
+    if kind == KIND_STATE:
+        n_players, n_bombs, n_fire = STATE_COUNTS.unpack_from(buf, offset)
+        offset += STATE_COUNTS.size
+        size = (width * height + 1) // 2
+        grid = _unpack_grid(buf[offset:offset + size], width, height)
+        offset += size
+        state = {
+            "tick": tick,
+            "width": width,
+            "height": height,
+            "grid": [[TILE_NAMES[code] for code in row] for row in grid.tolist()],
+        }
+    elif kind == KIND_DIFF:
+        since, n_tiles, n_players, n_bombs, n_fire = DIFF_COUNTS.unpack_from(buf, offset)
+        offset += DIFF_COUNTS.size
+        end = offset + n_tiles * TILE.size
+        state = {
+            "tick": tick,
+            "since": since,
+            "tiles": [
+                {"x": x, "y": y, "tile": TILE_NAMES[code]}
+                for x, y, code in TILE.iter_unpack(buf[offset:end])
+            ],
+        }
+        offset = end
+    else:
+        raise CodecError(f"Unknown message kind {kind}")
+
+    def records(record, count):
+        nonlocal offset
+        end = offset + count * record.size
+        if end > len(buf):
+            raise CodecError("Message truncated")
+        items = list(record.iter_unpack(buf[offset:end]))
+        offset = end
+        return items
+
+    state["players"] = {pid: {"x": x, "y": y, "alive": bool(alive)} for pid, x, y, alive in records(PLAYER, n_players)}
+    state["bombs"] = [
+        {"owner_id": owner, "x": x, "y": y, "timer": timer, "radius": radius}
+        for owner, x, y, timer, radius in records(BOMB, n_bombs)
+    ]
+    state["fire"] = [{"x": x, "y": y, "ttl": ttl} for x, y, ttl in records(FIRE, n_fire)]
+    state["state_hash"] = state_hash
+    return state
+
+
+def encode_input(action=None, resync=False):
+    return bytes([RESYNC if resync else action.value])
+
+
+def decode_input(buf):
+    """ One-byte client message as the JSON message it stands for: {"action": name} or {"event": "resync"} """
+    if len(buf) != 1:
+        raise CodecError("Binary input is a single byte")
+    if buf[0] == RESYNC:
+        return {"event": "resync"}
+    try:
+        return {"action": Action(buf[0]).name}
+    except ValueError:
+        raise CodecError(f"Unknown action code {buf[0]}") from None
+
+
+# --- compact JSON -------------------------------------------------------------
+#
+# {"v": 1, "tick", "width", "height", "state_hash": hex, "palette": [tile names],
+#  "grid": one string per row, one palette index digit per cell,
+#  "players": {id: [x, y, alive]}, "bombs": [[owner_id, x, y, timer, radius]],
+#  "fire": [[x, y, ttl]]}
+# A diff has "since" and "tiles": [[x, y, code]] instead of "grid".
+# Digit strings beat run-length encoding here: crates break runs up, and a
+# string is a single JSON token to encode and decode.
+
+_DIGITS = bytes.maketrans(bytes(range(10)), b"0123456789")
+
+
+def _grid_rows(codes: bytes, width):
+    digits = codes.translate(_DIGITS).decode("ascii")
+    return [digits[i:i + width] for i in range(0, len(digits), width)]
+
+
+def _compact_entities(game, pids, player_ids):
+    return {
+        "players": {
+            str(_player_id(player_ids, pid)): [game.players[pid].x, game.players[pid].y, int(game.players[pid].alive)]
+            for pid in pids
+        },
+        "bombs": [[b.owner_id, b.x, b.y, b.timer, b.radius] for b in game.bombs],
+        "fire": [list(entry) for entry in game.fire],
+    }
+
+
+def compact_state(game, player_ids=None):
+    """ Full state as a compact JSON-ready dict """
+    return {
+        "v": VERSION,
+        "tick": game.tick_count,
+        "width": game.width,
+        "height": game.height,
+        "state_hash": format(game.state_hash, "016x"),
+        "palette": list(TILE_NAMES),
+        "grid": _grid_rows(game._grid_bytes(), game.width),
+        **_compact_entities(game, list(game.players), player_ids),
+    }
+
+
+def compact_diff(game, since_tick, player_ids=None):
+    changes = game.changes_since(since_tick)
+    if changes is None:
+        return None
+    tiles, pids = changes
+    return {
+        "v": VERSION,
+        "tick": game.tick_count,
+        "since": since_tick,
+        "state_hash": format(game.state_hash, "016x"),
+        "tiles": [[x, y, int(game.grid[y][x])] for x, y in sorted(tiles, key=lambda cell: (cell[1], cell[0]))],
+        **_compact_entities(game, sorted(pids), player_ids),
+    }
+
+
+def is_compact(obj):
+    return isinstance(obj, dict) and "v" in obj
+
+
+def decode_compact(obj):
+    """ Compact dict as an export_state() / export_diff() dict (player ids as ints, hash as an int) """
+    if obj.get("v") != VERSION:
+        raise CodecError(f"Unsupported codec version {obj.get('v')}")
+    names = obj.get("palette", TILE_NAMES)
+    state = {"tick": obj["tick"]}
+    if "grid" in obj:
+        state["width"], state["height"] = obj["width"], obj["height"]
+        rows = obj["grid"]
+        if len(rows) != obj["height"] or any(len(row) != obj["width"] for row in rows):
+            raise CodecError("Grid size does not match the board")
+        state["grid"] = [[names[int(code)] for code in row] for row in rows]
+    else:
+        state["since"] = obj["since"]
+        state["tiles"] = [{"x": x, "y": y, "tile": names[code]} for x, y, code in obj["tiles"]]
+
+    state["players"] = {int(pid): {"x": x, "y": y, "alive": bool(alive)} for pid, (x, y, alive) in obj["players"].items()}
+    state["bombs"] = [
+        {"owner_id": owner, "x": x, "y": y, "timer": timer, "radius": radius}
+        for owner, x, y, timer, radius in obj["bombs"]
+    ]
+    state["fire"] = [{"x": x, "y": y, "ttl": ttl} for x, y, ttl in obj["fire"]]
+    state["state_hash"] = int(obj["state_hash"], 16)
+    return state
+
+
+# --- action log -----------------------------------------------------------------
+# Replay action rows packed in arrival order, which matters: Game applies the
+# actions of a tick in the order they were set. ACTION_LOG_HEADER (magic b"BA",
+# version, row count), a varint count of distinct extra-key objects followed by
+# each as varint length + JSON, then tick groups. A group is a zigzag varint
+# tick delta from the previous group's last tick, varint row count and varint
+# repeat count: the next `repeat` ticks have exactly the same rows, so long
+# stretches of STAY cost three bytes. A row is the Action value (| HAS_EXTRAS
+# with a varint index into the extras table for client keys other than tick,
+# player_int_id and action) and the varint player id; a row that does not fit
+# (unknown action, non-integer tick or player) is RAW_ROW + varint length + JSON.
+
+ACTION_LOG_MAGIC = b"BA"
+ACTION_LOG_VERSION = 2
+ACTION_LOG_HEADER = struct.Struct("<2sBI")
+HAS_EXTRAS = 0x80
+RAW_ROW = 0xFF
+_ACTION_NAMES = {action.value: action.name for action in Action}
+_ACTION_CODES = {action.name: action.value for action in Action}
+_ROW_KEYS = ("tick", "player_int_id", "action")
+
+
+def _write_varint(out: bytearray, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise CodecError("Truncated action log")
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_json(out: bytearray, obj):
+    data = json.dumps(obj, separators=(",", ":")).encode()
+    _write_varint(out, len(data))
+    out += data
+
+
+def _read_json(buf, pos):
+    length, pos = _read_varint(buf, pos)
+    if pos + length > len(buf):
+        raise CodecError("Truncated action log")
+    return json.loads(bytes(buf[pos:pos + length])), pos + length
+
+
+def _pack_row(row, extras):
+    # (row bytes, tick) or (row bytes, None) for a RAW_ROW
+    out = bytearray()
+    code = _ACTION_CODES.get(row.get("action"))
+    tick, pid = row.get("tick"), row.get("player_int_id")
+    if code is None or type(tick) is not int or type(pid) is not int or pid < 0:
+        out.append(RAW_ROW)
+        _write_json(out, row)
+        return bytes(out), None
+    extra = {key: value for key, value in row.items() if key not in _ROW_KEYS}
+    if extra:
+        out.append(code | HAS_EXTRAS)
+        _write_varint(out, pid)
+        _write_varint(out, extras.setdefault(json.dumps(extra, separators=(",", ":")), len(extras)))
+    else:
+        out.append(code)
+        _write_varint(out, pid)
+    return bytes(out), tick
+
+
+def encode_action_log(actions):
+    """ Action rows of a stored replay ({"tick", "player_int_id", "action", ...}) as packed bytes """
+    extras = {}
+    groups = []     # [tick, row count, rows, has RAW_ROW]
+    for row in actions:
+        packed, tick = _pack_row(row, extras)
+        if groups and (tick is None or tick == groups[-1][0]):
+            group = groups[-1]
+            group[1] += 1
+            group[2].append(packed)
+            group[3] = group[3] or tick is None
+        else:
+            groups.append([tick if tick is not None else 0, 1, [packed], tick is None])
+
+    out = bytearray(ACTION_LOG_HEADER.pack(ACTION_LOG_MAGIC, ACTION_LOG_VERSION, len(actions)))
+    _write_varint(out, len(extras))
+    for extra in extras:
+        data = extra.encode()
+        _write_varint(out, len(data))
+        out += data
+
+    last, i = 0, 0
+    while i < len(groups):
+        tick, count, rows, raw = groups[i]
+        body = b"".join(rows)
+        repeat = 0
+        # RAW_ROW rows carry their own tick, so only plain groups are repeated
+        while not raw and i + repeat + 1 < len(groups):
+            n_tick, n_count, n_rows, n_raw = groups[i + repeat + 1]
+            if n_raw or n_tick != tick + repeat + 1 or n_count != count or b"".join(n_rows) != body:
+                break
+            repeat += 1
+        delta = tick - last
+        _write_varint(out, delta << 1 if delta >= 0 else (-delta << 1) - 1)
+        _write_varint(out, count)
+        _write_varint(out, repeat)
+        out += body
+        last = tick + repeat
+        i += repeat + 1
+    return bytes(out)
+
+
+def decode_action_log(buf):
+    """ Packed action log as action rows, in the order they were recorded """
+    if len(buf) < 3:
+        raise CodecError("Truncated action log")
+    magic, version = bytes(buf[:2]), buf[2]
+    if magic != ACTION_LOG_MAGIC:
+        raise CodecError("Not an action log")
+    if version != ACTION_LOG_VERSION:
+        raise CodecError(f"Unsupported codec version {version}")
+    if len(buf) < ACTION_LOG_HEADER.size:
+        raise CodecError("Truncated action log")
+
+    _, _, total = ACTION_LOG_HEADER.unpack_from(buf)
+    pos = ACTION_LOG_HEADER.size
+    count, pos = _read_varint(buf, pos)
+    extras = []
+    for _ in range(count):
+        extra, pos = _read_json(buf, pos)
+        extras.append(extra)
+
+    rows, tick = [], 0
+    while len(rows) < total:
+        delta, pos = _read_varint(buf, pos)
+        tick += (delta >> 1) if not delta & 1 else -((delta + 1) >> 1)
+        count, pos = _read_varint(buf, pos)
+        repeat, pos = _read_varint(buf, pos)
+        group = []
+        for _ in range(count):
+            if pos >= len(buf):
+                raise CodecError("Truncated action log")
+            code = buf[pos]
+            pos += 1
+            if code == RAW_ROW:
+                row, pos = _read_json(buf, pos)
+                group.append(row)
+                continue
+            pid, pos = _read_varint(buf, pos)
+            name = _ACTION_NAMES.get(code & ~HAS_EXTRAS)
+            if name is None:
+                raise CodecError(f"Unknown action code {code & ~HAS_EXTRAS}")
+            row = {"tick": tick, "player_int_id": pid, "action": name}
+            if code & HAS_EXTRAS:
+                index, pos = _read_varint(buf, pos)
+                if index >= len(extras):
+                    raise CodecError(f"Unknown extras index {index}")
+                row.update(extras[index])
+            group.append(row)
+        rows.extend(group)
+        for k in range(1, repeat + 1):
+            rows.extend({**row, "tick": tick + k} for row in group)
+        tick += repeat
+    if len(rows) != total or pos != len(buf):
+        raise CodecError("Malformed action log")
+    return rows
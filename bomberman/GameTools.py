@@ -1,9 +1,11 @@
 import random
-from enum import Enum
-from collections import defaultdict
+import time
+from enum import Enum, IntEnum
+from functools import lru_cache
+from collections import defaultdict, deque
 
 
-class Tile(Enum):
+class Tile(IntEnum):
     EMPTY = 0
     WALL = 1
     DESTRUCTIBLE = 2
@@ -20,7 +22,104 @@ class Action(Enum):
     BOMB = 5
 
 
+TILES = tuple(Tile)  # indexed by tile code
+TILE_NAMES = tuple(tile.name for tile in Tile)
+TILE_CHARS = ('.', '#', '+', 'B', '?')  # FIRE without a fire entry shows as '?'
+WALKABLE = (Tile.EMPTY, Tile.FIRE)
+
+# Members used by the update loop as plain globals: on Python 3.11 every
+# Tile.X / Action.X is a slow class attribute lookup
+_EMPTY, _WALL, _CRATE, _BOMB, _FIRE = TILES
+_STAY, _UP, _DOWN, _LEFT, _RIGHT, _PLACE_BOMB = Action
+
+
+def _stay():
+    return _STAY
+
+# Zobrist hashing: every (tile, player, bomb, fire entry) feature of a state
+# has a fixed pseudo-random 64-bit key and the state hash is the sum of the
+# keys of its features modulo 2**64. A sum rather than XOR is used so that
+# duplicate fire entries on one tile do not cancel out. A key is
+# splitmix64 folded over the feature fields, starting from 0:
+#   tile:   (1, x, y, tile)
+#   player: (2, id, x, y, alive)
+#   bomb:   (3, owner_id, x, y, timer, radius)
+#   fire:   (4, x, y, ttl)
+# Games look the keys up in a ZobristTable of their board size. Tiles and
+# players are kept in a running sum; bombs and fire change every tick and
+# are only a few entries, so their keys are added when state_hash is read.
+MASK64 = (1 << 64) - 1
+Z_TILE, Z_PLAYER, Z_BOMB, Z_FIRE = 1, 2, 3, 4
+NUM_TILES = len(Tile)
+BOMB_TIMER = 3    # ticks from placing a bomb to its blast
+BOMB_RADIUS = 2
+FIRE_TTL = 2      # ticks a blast keeps burning
+
+
+def _splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def _fold(key, *fields):
+    for field in fields:
+        key = _splitmix64(key ^ int(field))
+    return key
+
+
+def zobrist_key(*fields):
+    return _fold(0, *fields)
+
+
+class _Rows(dict):
+    """ Key rows built on first access by build(key) """
+
+    def __init__(self, build):
+        super().__init__()
+        self._build = build
+
+    def __missing__(self, key):
+        row = self[key] = self._build(key)
+        return row
+
+
+class ZobristTable:
+    """
+    Zobrist keys of one board size as flat lists indexed by cell = y * width + x:
+    tiles[cell * NUM_TILES + tile], fire[cell * (FIRE_TTL + 1) + ttl],
+    players[id][cell * 2 + alive] and bombs[owner_id, radius][cell * (BOMB_TIMER + 1) + timer].
+    Player and bomb rows are built the first time an id is seen. Shared by all
+    games of the size, see zobrist_table().
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.tiles = self._row((Z_TILE,), range(NUM_TILES))
+        self.fire = self._row((Z_FIRE,), range(FIRE_TTL + 1))
+        self.players = _Rows(lambda pid: self._row((Z_PLAYER, pid), (0, 1)))
+        self.bombs = _Rows(lambda key: self._row((Z_BOMB, key[0]), range(BOMB_TIMER + 1), key[1]))
+
+    def _row(self, prefix, values, *suffix):
+        # keys of prefix + (x, y, value) + suffix for every cell and value
+        row = []
+        for y in range(self.height):
+            for x in range(self.width):
+                cell = _fold(0, *prefix, x, y)
+                row.extend(_fold(cell, value, *suffix) for value in values)
+        return row
+
+
+@lru_cache(maxsize=32)
+def zobrist_table(width, height):
+    return ZobristTable(width, height)
+
+
 class Player:
+    __slots__ = ("id", "x", "y", "alive")
+
     def __init__(self, player_id, x, y):
         self.id = player_id
         self.x = x
@@ -29,7 +128,9 @@ class Player:
 
 
 class Bomb:
-    def __init__(self, owner_id, x, y, timer=3, radius=2):
+    __slots__ = ("owner_id", "x", "y", "timer", "radius")
+
+    def __init__(self, owner_id, x, y, timer=BOMB_TIMER, radius=BOMB_RADIUS):
         self.owner_id = owner_id
         self.x = x
         self.y = y
@@ -37,9 +138,118 @@ class Bomb:
         self.radius = radius
 
 
+class GameSnapshot:
+    """
+    Immutable copy of a Game state: the grid as one byte per cell, entities
+    as plain tuples. Produced by Game.snapshot() and applied with
+    Game.restore() on a game of the same size.
+    """
+    __slots__ = ("width", "height", "tick", "grid", "players", "bombs", "fire", "actions", "state_hash")
+
+    def __init__(self, width, height, tick, grid, players, bombs, fire, actions, state_hash):
+        self.width = width
+        self.height = height
+        self.tick = tick
+        self.state_hash = state_hash
+        self.grid = grid          # bytes, row-major tile codes
+        self.players = players    # ((id, x, y, alive), ...)
+        self.bombs = bombs        # ((owner_id, x, y, timer, radius), ...)
+        self.fire = fire          # ((x, y, ttl), ...)
+        self.actions = actions    # ((player_id, Action), ...) pending for the next update
+
+
+class TickStats:
+    """
+    Counters collected by Game.update() while profiling is on (Game.enable_stats()).
+    Times are perf_counter_ns() nanoseconds summed over all profiled ticks;
+    stats of several games are combined with merge().
+    """
+    __slots__ = (
+        "ticks", "total_ns", "max_tick_ns",
+        "move_ns", "bombs_ns", "fire_ns",
+        "players_moved", "players_killed", "bombs_placed", "bombs_exploded",
+        "fire_added", "fire_cleared",
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def merge(self, other):
+        for name in self.__slots__:
+            if name == "max_tick_ns":
+                self.max_tick_ns = max(self.max_tick_ns, other.max_tick_ns)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def summary(self):
+        # Mean per-tick phase times in microseconds, for logs
+        ticks = self.ticks or 1
+        return (
+            f"ticks={self.ticks} avg={self.total_ns / ticks / 1000:.1f}us max={self.max_tick_ns / 1000:.1f}us "
+            f"move={self.move_ns / ticks / 1000:.1f}us bombs={self.bombs_ns / ticks / 1000:.1f}us "
+            f"fire={self.fire_ns / ticks / 1000:.1f}us moved={self.players_moved} killed={self.players_killed} "
+            f"placed={self.bombs_placed} exploded={self.bombs_exploded} "
+            f"fire+={self.fire_added} fire-={self.fire_cleared}"
+        )
+
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+def spawn_positions(width, height, num_players):
+    """
+    Up to four players start in the corners. Larger games spread the players
+    evenly along the ring of cells next to the outer wall, clockwise from the
+    top-left corner, using only cells with odd coordinates (never a pillar).
+    """
+    corners = [(1, 1), (width - 2, 1), (1, height - 2), (width - 2, height - 2)]
+    if num_players <= len(corners):
+        return corners[:num_players]
+
+    right, bottom = width - 2 - (width % 2 == 0), height - 2 - (height % 2 == 0)
+    ring = (
+        [(x, 1) for x in range(1, right, 2)]
+        + [(right, y) for y in range(1, bottom, 2)]
+        + [(x, bottom) for x in range(right, 1, -2)]
+        + [(1, y) for y in range(bottom, 1, -2)]
+    )
+    if len(ring) < 2 * num_players:
+        raise ValueError(f"A {width}x{height} board is too small for {num_players} players")
+
+    step = len(ring) / num_players
+    return [ring[int(i * step)] for i in range(num_players)]
+
+
+def apply_diff(state, diff):
+    """ export_state() dict at diff["since"] with Game.export_diff() applied: the state at diff["tick"] """
+    state = dict(state, tick=diff["tick"], bombs=diff["bombs"], fire=diff["fire"])
+    state["grid"] = [row[:] for row in state["grid"]]
+    for tile in diff["tiles"]:
+        state["grid"][tile["y"]][tile["x"]] = tile["tile"]
+    state["players"] = {**state["players"], **diff["players"]}
+    return state
+
+
+UNREACHABLE = -1   # distance_map value for tiles that cannot be reached
+NO_DANGER = -1     # danger_map value for tiles no known blast will reach
+DISTANCE_CACHE_SIZE = 64
+DIFF_HISTORY = 64  # ticks of tile/player changes kept for export_diff
+
+
 class Game:
-    def __init__(self, width, height, num_players):
+    def __init__(self, width, height, num_players, chain_reactions=False, seed=None):
         self.num_players = num_players
+        # The same seed always generates the same map; None uses the global random state
+        self.seed = seed
+        # With chain_reactions a blast that reaches another bomb sets it off in
+        # the same tick. Off by default: live lobbies and old replays play the
+        # original rules.
+        self.chain_reactions = chain_reactions
 
         self.width = width
         self.height = height
@@ -47,20 +257,49 @@ class Game:
         self.players = {}
         self.bombs = []
         self.fire = []
-        self.actions = defaultdict(lambda: Action.STAY)
+        self.actions = defaultdict(_stay)
         self.tick_count = 0
-        self._place_walls()
+
+        # Per-tile occupancy indexes; players are few and move every tick, so
+        # they are looked up by scanning the player list instead
+        self._fire_at = {}      # (x, y) -> number of fire entries on the tile
+        self._bombs_at = {}     # (x, y) -> Bomb
+
+        # Cached distance/danger maps and the board versions they were built for
+        self._walk_version = 0      # bumped when a tile becomes (un)walkable
+        self._bomb_version = 0      # bumped when a bomb is placed or goes off
+        self._distance_cache = (0, {})
+        self._blast_cache = None    # (bomb version, tick, blast offsets), see danger_map
+        self._danger_cache = None   # (key, danger map), see danger_map
+
+        # TickStats while profiling is on, None keeps update() on the plain path
+        self.stats = None
+
+        # Tiles and players changed per tick, for export_diff
+        self._dirty_tiles = set()
+        self._dirty_players = set()
+        self._history = deque(maxlen=DIFF_HISTORY)    # (tick, tiles, player ids)
+        self._diff_floor = 0                         # oldest tick export_diff can start from
+
+        self._zobrist = zobrist_table(width, height)
+        self._hash = 0     # tiles and players, see state_hash
+        self._place_walls(random.Random(seed) if seed is not None else random)
         self._spawn_players(num_players)
+        self._hash = self._compute_hash()
 
-    def _place_walls(self):
+    def _place_walls(self, rng):
+        # Row by row, rolling crates in the same order as a per-cell loop would
+        last_x, last_y = self.width - 1, self.height - 1
         for y in range(self.height):
-            for x in range(self.width):
-                if x == 0 or y == 0 or x == self.width - 1 or y == self.height - 1:
-                    self.grid[y][x] = Tile.WALL
-                elif (x % 2 == 0 and y % 2 == 0):
-                    self.grid[y][x] = Tile.WALL
-                elif random.random() < 0.2:
-                    self.grid[y][x] = Tile.DESTRUCTIBLE
+            if y == 0 or y == last_y:
+                self.grid[y] = [_WALL] * self.width
+                continue
+            self.grid[y] = [
+                _WALL if x == 0 or x == last_x or (x % 2 == 0 and y % 2 == 0)
+                else _CRATE if rng.random() < 0.2
+                else _EMPTY
+                for x in range(self.width)
+            ]
 
     def _ensure_spawn_exit(self, x, y):
         candidates = []
@@ -78,136 +317,463 @@ class Game:
             self.grid[ny][nx] = Tile.EMPTY
 
     def _spawn_players(self, num_players):
-        positions = [(1, 1), (self.width - 2, 1), (1, self.height - 2), (self.width - 2, self.height - 2)]
+        positions = spawn_positions(self.width, self.height, num_players)
         for i in range(num_players):
             x, y = positions[i]
             self.players[i] = Player(i, x, y)
             self.grid[y][x] = Tile.EMPTY  # ensure spawn area is clear
             self._ensure_spawn_exit(x, y)
 
+    def place_player(self, player_id, x, y):
+        player = self.players[player_id]
+        keys = self._zobrist.players[player_id]
+        width, alive = self.width, player.alive
+        self._hash += keys[(y * width + x) * 2 + alive] - keys[(player.y * width + player.x) * 2 + alive]
+        player.x, player.y = x, y
+        self._dirty_players.add(player_id)
+
+    def players_at(self, x, y):
+        return {pid for pid, p in self.players.items() if p.alive and p.x == x and p.y == y}
+
+    def bomb_at(self, x, y):
+        return self._bombs_at.get((x, y))
+
+    def is_burning(self, x, y):
+        return (x, y) in self._fire_at
+
+    @property
+    def state_hash(self):
+        return (self._hash + self._entity_hash()) & MASK64
+
+    def _entity_hash(self):
+        # Keys of the bombs and fire entries, which are not in the running sum
+        zobrist, width = self._zobrist, self.width
+        h = 0
+        for bomb in self.bombs:
+            h += zobrist.bombs[bomb.owner_id, bomb.radius][(bomb.y * width + bomb.x) * (BOMB_TIMER + 1) + bomb.timer]
+        fire = zobrist.fire
+        for x, y, ttl in self.fire:
+            h += fire[(y * width + x) * (FIRE_TTL + 1) + ttl]
+        return h
+
+    def _rehash(self, old_key, new_key):
+        self._hash += new_key - old_key
+
+    def _set_tile(self, x, y, tile):
+        row = self.grid[y]
+        old = row[x]
+        if old != tile:
+            row[x] = tile
+            keys = self._zobrist.tiles
+            cell = (y * self.width + x) * NUM_TILES
+            self._hash += keys[cell + tile] - keys[cell + old]
+            self._dirty_tiles.add((x, y))
+            if (old in WALKABLE) != (tile in WALKABLE):
+                self._walk_version += 1
+
+    def _board_changed(self):
+        self._walk_version += 1
+        self._bomb_version += 1
+
+    def distance_map(self, x, y):
+        """
+        Shortest number of moves from (x, y) to every tile as dist[y][x],
+        UNREACHABLE where there is no path. Fire is walkable, bombs are not.
+        The map is cached until a tile changes walkability; do not modify it.
+        """
+        version, cache = self._distance_cache
+        if version != self._walk_version or len(cache) >= DISTANCE_CACHE_SIZE:
+            cache = {}
+            self._distance_cache = (self._walk_version, cache)
+        dist = cache.get((x, y))
+        if dist is not None:
+            return dist
+
+        dist = [[UNREACHABLE] * self.width for _ in range(self.height)]
+        dist[y][x] = 0
+        queue = deque([(x, y)])
+        while queue:
+            cx, cy = queue.popleft()
+            step = dist[cy][cx] + 1
+            for dx, dy in DIRECTIONS:
+                nx, ny = cx + dx, cy + dy
+                if self._is_walkable(nx, ny) and dist[ny][nx] == UNREACHABLE:
+                    dist[ny][nx] = step
+                    queue.append((nx, ny))
+
+        cache[(x, y)] = dist
+        return dist
+
+    def danger_map(self):
+        """
+        For every tile the number of updates until a blast reaches it as
+        danger[y][x]: 0 if it is burning now, k if a bomb already on the board
+        sets it on fire during the k-th next update, NO_DANGER otherwise.
+        Follows the same rules as update (radius, walls, crates burned by
+        earlier blasts, chain reactions) assuming nobody places new bombs.
+        Cached for the tick; do not modify it.
+
+        Blasts depend only on the bombs and the crates, and crates only burn
+        when a bomb goes off, so the bombs are simulated again only after a
+        bomb is placed or goes off. In between the blast times are shifted by
+        the ticks passed.
+        """
+        version, tick = self._bomb_version, self.tick_count
+        # Between placements and blasts the map changes only as timers run
+        # down, which needs bombs, and as fire burns out, which shrinks the list
+        key = (version, tick if self.bombs else None, len(self.fire))
+        cached = self._danger_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        if self._blast_cache is None or self._blast_cache[0] != version:
+            self._blast_cache = (version, tick, self._blast_offsets())
+        _, built, blasts = self._blast_cache
+        passed = tick - built
+        danger = [[NO_DANGER] * self.width for _ in range(self.height)]
+        for (x, y), ticks in blasts.items():
+            danger[y][x] = ticks - passed
+        for x, y in self._fire_at:
+            danger[y][x] = 0
+
+        self._danger_cache = (key, danger)
+        return danger
+
+    def _blast_offsets(self):
+        # (x, y) -> the update in which a bomb now on the board first sets the tile on fire
+        blasts = {}
+        if self.bombs:
+            future = self.clone()
+            ticks = 0
+            while future.bombs:
+                ticks += 1
+                future._update_bombs()
+                # fire created during this update is the only one with a full ttl
+                for x, y, ttl in future.fire:
+                    if ttl == FIRE_TTL and (x, y) not in blasts:
+                        blasts[(x, y)] = ticks
+                future._clear_fire()
+        return blasts
+
+    def _player_key(self, player):
+        return self._zobrist.players[player.id][(player.y * self.width + player.x) * 2 + player.alive]
+
+    def _grid_hash(self):
+        keys = self._zobrist.tiles
+        h = 0
+        cell = 0
+        for row in self.grid:
+            for tile in row:
+                h += keys[cell + tile]
+                cell += NUM_TILES
+        return h
+
+    def _compute_hash(self):
+        # The running sum: tiles and players only
+        h = self._grid_hash()
+        for player in self.players.values():
+            h += self._player_key(player)
+        return h
+
     def set_player_action(self, player_id, action):
         if player_id in self.players and self.players[player_id].alive:
             self.actions[player_id] = action
 
     def update(self):
+        if self.stats is not None:
+            return self._update_profiled()
         self.tick_count += 1
         self._move_players()
         self._update_bombs()
         self._clear_fire()
-        self.actions = defaultdict(lambda: Action.STAY)  # reset actions
+        self.actions = defaultdict(_stay)  # reset actions
+        self._end_tick()
+
+    def _end_tick(self):
+        self._history.append((self.tick_count, self._dirty_tiles, self._dirty_players))
+        self._dirty_tiles = set()
+        self._dirty_players = set()
+
+    def _reset_history(self):
+        # Changes before an import/restore are unknown, diffs start over from here
+        self._dirty_tiles = set()
+        self._dirty_players = set()
+        self._history = deque(maxlen=DIFF_HISTORY)
+        self._diff_floor = self.tick_count
+
+    def enable_stats(self, stats=None):
+        """ Starts collecting per-phase TickStats (a fresh one unless given) and returns it """
+        self.stats = stats if stats is not None else TickStats()
+        return self.stats
+
+    def disable_stats(self):
+        stats, self.stats = self.stats, None
+        return stats
+
+    def _update_profiled(self):
+        # Same phases as update(); counts are taken from the sizes of the
+        # entity lists around each phase, so the phases themselves stay untouched
+        stats = self.stats
+        clock = time.perf_counter_ns
+        start = clock()
+        self.tick_count += 1
+
+        stats.players_moved += sum(1 for pid in self.actions if self.players[pid].alive)
+        bombs = len(self.bombs)
+        self._move_players()
+        t_move = clock()
+        stats.bombs_placed += len(self.bombs) - bombs
+
+        bombs, fire = len(self.bombs), len(self.fire)
+        alive = sum(1 for player in self.players.values() if player.alive)
+        self._update_bombs()
+        t_bombs = clock()
+        stats.bombs_exploded += bombs - len(self.bombs)
+        stats.fire_added += len(self.fire) - fire
+        stats.players_killed += alive - sum(1 for player in self.players.values() if player.alive)
+
+        fire = len(self.fire)
+        self._clear_fire()
+        end = clock()
+        stats.fire_cleared += fire - len(self.fire)
+
+        self.actions = defaultdict(_stay)  # reset actions
+        self._end_tick()
+
+        stats.ticks += 1
+        stats.move_ns += t_move - start
+        stats.bombs_ns += t_bombs - t_move
+        stats.fire_ns += end - t_bombs
+        stats.total_ns += end - start
+        stats.max_tick_ns = max(stats.max_tick_ns, end - start)
 
     def _move_players(self):
+        players, grid = self.players, self.grid
         for pid, action in self.actions.items():
-            player = self.players[pid]
+            player = players[pid]
             if not player.alive:
                 continue
 
-            dx, dy = 0, 0
-            if action == Action.UP:
-                dy = -1
-            elif action == Action.DOWN:
-                dy = 1
-            elif action == Action.LEFT:
-                dx = -1
-            elif action == Action.RIGHT:
-                dx = 1
-            elif action == Action.BOMB:
-                if self.grid[player.y][player.x] != Tile.BOMB:
-                    self.bombs.append(Bomb(pid, player.x, player.y))
-                    self.grid[player.y][player.x] = Tile.BOMB
+            x, y = player.x, player.y
+            if action is _UP:
+                y -= 1
+            elif action is _DOWN:
+                y += 1
+            elif action is _LEFT:
+                x -= 1
+            elif action is _RIGHT:
+                x += 1
+            elif action is _PLACE_BOMB:
+                if grid[y][x] != _BOMB:
+                    bomb = Bomb(pid, x, y)
+                    self.bombs.append(bomb)
+                    self._bombs_at[(x, y)] = bomb
+                    self._set_tile(x, y, _BOMB)
+                    self._bomb_version += 1
+                continue
+            else:
                 continue
 
-            nx, ny = player.x + dx, player.y + dy
-            if self._is_walkable(nx, ny):
-                player.x, player.y = nx, ny
+            if 0 <= x < self.width and 0 <= y < self.height and grid[y][x] in WALKABLE:
+                self.place_player(pid, x, y)
 
     def _is_walkable(self, x, y):
         if not (0 <= x < self.width and 0 <= y < self.height):
             return False
-        return self.grid[y][x] in (Tile.EMPTY, Tile.FIRE)
+        return self.grid[y][x] in WALKABLE
 
     def _update_bombs(self):
-        for bomb in self.bombs[:]:
+        if not self.bombs:
+            return
+        ready = []
+        for bomb in self.bombs:
             bomb.timer -= 1
             if bomb.timer <= 0:
-                self._explode_bomb(bomb)
-                self.bombs.remove(bomb)
+                ready.append(bomb)
+        if not ready:
+            return
+        self._bomb_version += 1
+
+        # In list order; a bomb already set off by a chain reaction is skipped
+        detonated = set()
+        for bomb in ready:
+            if bomb in detonated:
+                continue
+            detonated.add(bomb)
+            queue = deque([bomb])
+            while queue:
+                burned = self._explode_bomb(queue.popleft())
+                if not self.chain_reactions:
+                    continue
+                for cell in burned:
+                    other = self._bombs_at.get(cell)
+                    if other is not None and other not in detonated:
+                        detonated.add(other)
+                        queue.append(other)
+
+        self.bombs = [bomb for bomb in self.bombs if bomb not in detonated]
 
     def _explode_bomb(self, bomb):
+        pos = (bomb.x, bomb.y)
+        if self._bombs_at.get(pos) is bomb:
+            del self._bombs_at[pos]
+
+        burned = self._blast(bomb)
+        for cell in burned:
+            self.fire.append((cell[0], cell[1], FIRE_TTL))
+            self._fire_at[cell] = self._fire_at.get(cell, 0) + 1
+
+        # Check for players caught in explosion
+        fire_at = self._fire_at
+        for pid, player in self.players.items():
+            if player.alive and (player.x, player.y) in fire_at:
+                old_key = self._player_key(player)
+                player.alive = False
+                self._rehash(old_key, self._player_key(player))
+                self._dirty_players.add(pid)
+
+        return burned
+
+    def _blast(self, bomb):
+        # Sets the blast cells on fire and returns them, centre first
         x, y = bomb.x, bomb.y
-        self.grid[y][x] = Tile.FIRE
-        self.fire.append((x, y, 2))
+        grid, width, height = self.grid, self.width, self.height
+        self._set_tile(x, y, _FIRE)
+        burned = [(x, y)]
 
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+        for dx, dy in DIRECTIONS:
             for i in range(1, bomb.radius + 1):
                 nx, ny = x + dx * i, y + dy * i
-                if not (0 <= nx < self.width and 0 <= ny < self.height):
+                if not (0 <= nx < width and 0 <= ny < height):
                     break
-                tile = self.grid[ny][nx]
-                if tile == Tile.WALL:
+                tile = grid[ny][nx]
+                if tile == _WALL:
                     break
-                if tile == Tile.DESTRUCTIBLE:
-                    self.grid[ny][nx] = Tile.FIRE
-                    self.fire.append((nx, ny, 2))
+                self._set_tile(nx, ny, _FIRE)
+                burned.append((nx, ny))
+                if tile == _CRATE:
                     break
-                self.grid[ny][nx] = Tile.FIRE
-                self.fire.append((nx, ny, 2))
 
-        # Check for players caught in explosion
-        for pid, player in self.players.items():
-            if (player.x, player.y) in [(fx, fy) for fx, fy, _ in self.fire]:
-                player.alive = False
+        return burned
 
     def _clear_fire(self):
+        if not self.fire:
+            return
+        grid = self.grid
         new_fire = []
         for x, y, ttl in self.fire:
             if ttl > 1:
                 new_fire.append((x, y, ttl - 1))
             else:
-                if self.grid[y][x] == Tile.FIRE:
-                    self.grid[y][x] = Tile.EMPTY
+                if grid[y][x] == _FIRE:
+                    self._set_tile(x, y, _EMPTY)
+                self._drop_fire((x, y))
         self.fire = new_fire
 
+    def _drop_fire(self, cell):
+        left = self._fire_at[cell] - 1
+        if left:
+            self._fire_at[cell] = left
+        else:
+            del self._fire_at[cell]
+
+    def _rebuild_indexes(self):
+        self._fire_at = {}
+        for x, y, _ in self.fire:
+            self._fire_at[(x, y)] = self._fire_at.get((x, y), 0) + 1
+        self._bombs_at = {(bomb.x, bomb.y): bomb for bomb in self.bombs}
+
     def export_state(self):
         return {
             "tick": self.tick_count,
             "width": self.width,
             "height": self.height,
-            "grid": [[tile.name for tile in row] for row in self.grid],
-            "players": {
-                pid: {
-                    "x": player.x,
-                    "y": player.y,
-                    "alive": player.alive
-                } for pid, player in self.players.items()
-            },
-            "bombs": [
-                {
-                    "owner_id": bomb.owner_id,
-                    "x": bomb.x,
-                    "y": bomb.y,
-                    "timer": bomb.timer,
-                    "radius": bomb.radius
-                } for bomb in self.bombs
-            ],
-            "fire": [
+            "grid": [list(map(TILE_NAMES.__getitem__, row)) for row in self.grid],
+            "players": self._export_players(self.players),
+            "bombs": self._export_bombs(),
+            "fire": self._export_fire()
+        }
+
+    def export_diff(self, since_tick):
+        """
+        Changes between the export_state() taken at since_tick and now: tiles
+        and players that changed, plus the full (short-lived) bombs and fire
+        lists. Returns None when the changes are no longer known: since_tick is
+        more than DIFF_HISTORY ticks back, in the future, or before the last
+        import_state()/restore().
+        """
+        changes = self.changes_since(since_tick)
+        if changes is None:
+            return None
+        tiles, pids = changes
+
+        return {
+            "tick": self.tick_count,
+            "since": since_tick,
+            "tiles": [
                 {
                     "x": x,
                     "y": y,
-                    "ttl": ttl
-                } for x, y, ttl in self.fire
-            ]
+                    "tile": TILE_NAMES[self.grid[y][x]]
+                } for x, y in sorted(tiles, key=lambda cell: (cell[1], cell[0]))
+            ],
+            "players": self._export_players(sorted(pids)),
+            "bombs": self._export_bombs(),
+            "fire": self._export_fire()
+        }
+
+    def changes_since(self, since_tick):
+        """ (tiles, player ids) changed after since_tick, or None when unknown (see export_diff) """
+        floor = self._diff_floor
+        if len(self._history) == self._history.maxlen:
+            floor = max(floor, self._history[0][0] - 1)
+        if not floor <= since_tick <= self.tick_count:
+            return None
+
+        tiles, pids = set(self._dirty_tiles), set(self._dirty_players)
+        for tick, changed_tiles, changed_players in reversed(self._history):
+            if tick <= since_tick:
+                break
+            tiles |= changed_tiles
+            pids |= changed_players
+        return tiles, pids
+
+    def _export_players(self, pids):
+        return {
+            pid: {
+                "x": self.players[pid].x,
+                "y": self.players[pid].y,
+                "alive": self.players[pid].alive
+            } for pid in pids
         }
 
+    def _export_bombs(self):
+        return [
+            {
+                "owner_id": bomb.owner_id,
+                "x": bomb.x,
+                "y": bomb.y,
+                "timer": bomb.timer,
+                "radius": bomb.radius
+            } for bomb in self.bombs
+        ]
+
+    def _export_fire(self):
+        return [
+            {
+                "x": x,
+                "y": y,
+                "ttl": ttl
+            } for x, y, ttl in self.fire
+        ]
+
     def import_state(self, state: dict):
         self.tick_count = state["tick"]
         self.width = state["width"]
         self.height = state["height"]
+        self._zobrist = zobrist_table(self.width, self.height)
 
-        self.grid = [
-            [Tile[cell_name] for cell_name in row]
-            for row in state["grid"]
-        ]
+        self.grid = [list(map(Tile.__getitem__, row)) for row in state["grid"]]
 
         self.players = {}
         for pid_str, pdata in state["players"].items():
@@ -220,18 +786,90 @@ class Game:
         for bd in state["bombs"]:
             bomb = Bomb(bd["owner_id"], bd["x"], bd["y"], bd["timer"], bd["radius"])
             self.bombs.append(bomb)
-            self.grid[bomb.y][bomb.x] = Tile.BOMB
 
-        self.fire = []
-        for fd in state["fire"]:
-            x, y, ttl = fd["x"], fd["y"], fd["ttl"]
-            self.fire.append((x, y, ttl))
-            self.grid[y][x] = Tile.FIRE
+        # The grid already holds the BOMB and FIRE tiles. Without chain
+        # reactions a bomb can outlive a blast over its tile, which then shows
+        # FIRE and later EMPTY, so tiles are not derived from the entities.
+        self.fire = [(fd["x"], fd["y"], fd["ttl"]) for fd in state["fire"]]
 
-        self.actions = defaultdict(lambda: Action.STAY)
+        self._rebuild_indexes()
+        self._board_changed()
+        self._reset_history()
+        self._hash = self._compute_hash()
+        self.actions = defaultdict(_stay)
+
+    def observe(self, player_id, out=None):
+        # Feature planes for AI agents, see bomberman/Observation.py for the layout
+        from bomberman.Observation import encode
+        return encode(self, player_id, out)
+
+    def clone(self):
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+
+        other.grid = [row[:] for row in self.grid]
+        other.players = {}
+        for pid, player in self.players.items():
+            p = Player(pid, player.x, player.y)
+            p.alive = player.alive
+            other.players[pid] = p
+        other.bombs = [Bomb(b.owner_id, b.x, b.y, b.timer, b.radius) for b in self.bombs]
+        other.fire = self.fire[:]
+        other.actions = defaultdict(_stay, self.actions)
+
+        other._fire_at = dict(self._fire_at)
+        other._bombs_at = {(bomb.x, bomb.y): bomb for bomb in other.bombs}
+        other._distance_cache = (self._walk_version, {})
+        # the blast and danger caches are keyed by version and never modified,
+        # so the copy shares them
+        other.stats = None
+        other._dirty_tiles = set(self._dirty_tiles)
+        other._dirty_players = set(self._dirty_players)
+        other._history = deque(self._history, maxlen=DIFF_HISTORY)
+        return other
+
+    def snapshot(self):
+        return GameSnapshot(
+            self.width,
+            self.height,
+            self.tick_count,
+            self._grid_bytes(),
+            tuple((p.id, p.x, p.y, p.alive) for p in self.players.values()),
+            tuple((b.owner_id, b.x, b.y, b.timer, b.radius) for b in self.bombs),
+            tuple(self.fire),
+            tuple(self.actions.items()),
+            self.state_hash,
+        )
+
+    def restore(self, snapshot: GameSnapshot):
+        if (snapshot.width, snapshot.height) != (self.width, self.height):
+            raise ValueError("Snapshot board size does not match the game")
+
+        self.tick_count = snapshot.tick
+        buf, w = snapshot.grid, self.width
+        self.grid = [list(map(TILES.__getitem__, buf[i:i + w])) for i in range(0, len(buf), w)]
+
+        self.players = {}
+        for pid, x, y, alive in snapshot.players:
+            p = Player(pid, x, y)
+            p.alive = alive
+            self.players[pid] = p
+        self.bombs = [Bomb(*fields) for fields in snapshot.bombs]
+        self.fire = list(snapshot.fire)
+        self.actions = defaultdict(_stay, snapshot.actions)
+
+        self._rebuild_indexes()
+        self._board_changed()
+        self._reset_history()
+        self._hash = snapshot.state_hash - self._entity_hash()
+
+    def _grid_bytes(self):
+        return b"".join(bytes(row) for row in self.grid)
 
     def print_board(self, id_map: dict[int, int] | None = None):
-        board = [[self._tile_char(x, y) for x in range(self.width)] for y in range(self.height)]
+        board = [list(map(TILE_CHARS.__getitem__, row)) for row in self.grid]
+        for x, y in self._fire_at:
+            board[y][x] = '*'
 
         for pid, player in self.players.items():
             if player.alive:
@@ -242,21 +880,6 @@ class Game:
         for row in board:
             print("".join(row))
 
-    def _tile_char(self, x, y):
-        tile = self.grid[y][x]
-        if any((bx == x and by == y) for bx, by, _ in self.fire):
-            return '*'
-        elif tile == Tile.WALL:
-            return '#'
-        elif tile == Tile.DESTRUCTIBLE:
-            return '+'
-        elif tile == Tile.BOMB:
-            return 'B'
-        elif tile == Tile.EMPTY:
-            return '.'
-        else:
-            return '?'
-
     def get_winner(self):
         alive_players = [p.id for p in self.players.values() if p.alive]
         if len(alive_players) == 1:
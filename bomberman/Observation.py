@@ -0,0 +1,83 @@
+import numpy as np
+
+from bomberman.GameTools import Tile
+
+
+# Channel layout of an observation, each channel is a (height, width) plane
+CH_WALL = 0
+CH_CRATE = 1
+CH_BOMB = 2        # CH_BOMB + 0/1/2: bombs exploding in 1, 2, 3+ ticks
+CH_FIRE = 5        # CH_FIRE + 0/1: fire with ttl 1, ttl 2+
+CH_SELF = 7
+CH_OPPONENTS = 8
+NUM_CHANNELS = 9
+
+BOMB_TIMER_CHANNELS = 3
+FIRE_TTL_CHANNELS = 2
+
+
+def observation_shape(width, height):
+    return (NUM_CHANNELS, height, width)
+
+
+def encode(game, player_id, out=None, dtype=np.float32):
+    """
+    Writes the board as seen by player_id into out, a (channels, height,
+    width) array; allocates one when out is None. A dead player gets an
+    empty CH_SELF plane.
+    """
+    if out is None:
+        out = np.empty(observation_shape(game.width, game.height), dtype=dtype)
+
+    grid = np.array(game.grid, dtype=np.uint8)
+    np.equal(grid, Tile.WALL, out=out[CH_WALL], casting="unsafe")
+    np.equal(grid, Tile.DESTRUCTIBLE, out=out[CH_CRATE], casting="unsafe")
+    out[CH_BOMB:] = 0
+
+    for bomb in game.bombs:
+        ch = CH_BOMB + min(max(bomb.timer, 1), BOMB_TIMER_CHANNELS) - 1
+        out[ch, bomb.y, bomb.x] = 1
+    for x, y, ttl in game.fire:
+        ch = CH_FIRE + min(max(ttl, 1), FIRE_TTL_CHANNELS) - 1
+        out[ch, y, x] = 1
+    for pid, player in game.players.items():
+        if player.alive:
+            out[CH_SELF if pid == player_id else CH_OPPONENTS, player.y, player.x] = 1
+
+    return out
+
+
+def encode_batch(games, player_ids, out=None, dtype=np.float32):
+    """ Stacks encode() for (game, player_id) pairs of equally sized games into a (batch, channels, height, width) array """
+    if out is None:
+        first = games[0]
+        out = np.empty((len(games),) + observation_shape(first.width, first.height), dtype=dtype)
+    for i, (game, player_id) in enumerate(zip(games, player_ids)):
+        encode(game, player_id, out[i])
+    return out
+
+
+def encode_vec(vec, out=None, dtype=np.float32):
+    """ Observations of every player on every VecGame board as a (boards, players, channels, height, width) array """
+    n, p = vec.num_envs, vec.num_players
+    if out is None:
+        out = np.empty((n, p) + observation_shape(vec.width, vec.height), dtype=dtype)
+
+    out[:, :, CH_WALL] = (vec.grid == Tile.WALL)[:, None]
+    out[:, :, CH_CRATE] = (vec.grid == Tile.DESTRUCTIBLE)[:, None]
+    out[:, :, CH_BOMB:] = 0
+
+    env, slot = np.nonzero(vec.bomb_live)
+    ch = CH_BOMB + np.clip(vec.bomb_timer[env, slot], 1, BOMB_TIMER_CHANNELS) - 1
+    out[env, :, ch, vec.bomb_y[env, slot], vec.bomb_x[env, slot]] = 1
+
+    out[:, :, CH_FIRE] = vec.fire_old[:, None]
+    out[:, :, CH_FIRE + 1] = vec.fire_new[:, None]
+
+    env, pid = np.nonzero(vec.alive)
+    occupied = np.zeros((n, p, vec.height, vec.width), dtype=np.int16)
+    occupied[env, pid, vec.py[env, pid], vec.px[env, pid]] = 1
+    out[:, :, CH_SELF] = occupied
+    out[:, :, CH_OPPONENTS] = (occupied.sum(axis=1, keepdims=True) - occupied) > 0
+
+    return out
@@ -0,0 +1,313 @@
+"""
+Headless self-play tournaments: whole matches between Python policies,
+played directly on Game across a process pool.
+
+    python -m bomberman.Tournament random idle mcts --games 200 --workers 8
+    python -m bomberman.Tournament mybot.policy:act mcts --replays out/ --out results.json
+
+A policy is a built-in name (see POLICIES) or "module:attribute" naming a
+callable policy(game, player_id) that returns an Action (or its name or
+value). Every seat gets its own copy of the state before the tick, and the
+actions are applied together once all seats have chosen, so no policy sees
+another's move. A policy may be listed more than once; the copies play as
+separate entrants "spec#1", "spec#2", ... Before every match the random
+module is seeded from the match seed, so a tournament with the same
+arguments plays the same games.
+"""
+import argparse
+import importlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from bomberman.GameTools import Game, Action
+from bomberman import TreeSearch
+
+
+ELO_START = 1500
+ELO_K = 16
+
+
+def random_policy(game, player_id):
+    return TreeSearch.rollout_action(game, player_id, random)
+
+
+def idle_policy(game, player_id):
+    return Action.STAY
+
+
+def mcts_policy(game, player_id):
+    # Fixed rollout count rather than a time budget keeps results reproducible
+    action, _ = TreeSearch.search(game, player_id, time_budget=float("inf"), max_rollouts=200, rng=random)
+    return action
+
+
+POLICIES = {
+    "random": random_policy,
+    "idle": idle_policy,
+    "mcts": mcts_policy,
+}
+
+_resolved = {}
+
+
+def resolve_policy(spec):
+    """ Callable for a built-in policy name or a "module:attribute" spec """
+    if spec not in _resolved:
+        if spec in POLICIES:
+            _resolved[spec] = POLICIES[spec]
+        elif ":" in spec:
+            module, attr = spec.split(":", 1)
+            _resolved[spec] = getattr(importlib.import_module(module), attr)
+        else:
+            raise ValueError(f"Unknown policy {spec!r}: use one of {sorted(POLICIES)} or module:attribute")
+    return _resolved[spec]
+
+
+def _as_action(value):
+    if isinstance(value, Action):
+        return value
+    if isinstance(value, str):
+        return Action[value]
+    return Action(value)
+
+
+def seat_labels(policies):
+    """ Entrant names: a spec listed more than once becomes "spec#1", "spec#2", ... """
+    counts = Counter(policies)
+    seen = Counter()
+    labels = []
+    for spec in policies:
+        if counts[spec] == 1:
+            labels.append(spec)
+        else:
+            seen[spec] += 1
+            labels.append(f"{spec}#{seen[spec]}")
+    return labels
+
+
+def play_match(match):
+    """
+    Plays one match; match is a dict with "seats" (entrant names in player id
+    order), "specs" (their policy specs, defaults to the seats), "seed",
+    "width", "height", "max_ticks", "chain_reactions" and "record". Returns
+    the result dict, with the replay when recording.
+    """
+    seats = match["seats"]
+    specs = match.get("specs", seats)
+    policies = [resolve_policy(spec) for spec in specs]
+    random.seed(match["seed"])
+    game = Game(match["width"], match["height"], len(seats),
+                chain_reactions=match["chain_reactions"], seed=match["seed"])
+    view = game.clone()
+
+    actions = []
+    start = time.perf_counter()
+    winner = -1
+    while game.tick_count < match["max_ticks"]:
+        # Every policy decides on the same pre-tick state
+        snapshot = game.snapshot()
+        chosen = []
+        for pid, policy in enumerate(policies):
+            if not game.players[pid].alive:
+                continue
+            view.restore(snapshot)
+            try:
+                chosen.append((pid, _as_action(policy(view, pid))))
+            except Exception as e:
+                raise RuntimeError(f"Policy {seats[pid]} failed at tick {game.tick_count}: {e!r}") from e
+        for pid, action in chosen:
+            if match["record"]:
+                actions.append({"tick": game.tick_count, "player_int_id": pid, "action": action.name})
+            game.set_player_action(pid, action)
+        game.update()
+        winner = game.get_winner()
+        if winner != -1:
+            break
+
+    result = {
+        "index": match["index"],
+        "seats": seats,
+        "seed": match["seed"],
+        # seat index of the winner; None for a draw or when max_ticks ran out
+        "winner": winner if winner not in (-1, None) else None,
+        "ticks": game.tick_count,
+        "seconds": time.perf_counter() - start,
+    }
+    if match["record"]:
+        # Same layout as crud.store_replay: the map is rebuilt from the seed
+        result["replay"] = {
+            "game_params": {
+                "width": match["width"],
+                "height": match["height"],
+                "num_players": len(seats),
+                "seed": match["seed"],
+                "chain_reactions": match["chain_reactions"],
+            },
+            "initial_map": {},
+            "actions": actions,
+        }
+    return result
+
+
+def schedule(policies, num_players, games, seed, **params):
+    """
+    Matches for every combination of num_players distinct policies, each
+    played `games` times with seats rotated so no policy keeps one spawn.
+    """
+    rng = random.Random(seed)
+    matches = []
+    for group in itertools.combinations(policies, num_players):
+        for game in range(games):
+            shift = game % num_players
+            seats = list(group[shift:] + group[:shift])
+            matches.append({"index": len(matches), "seats": seats, "seed": rng.getrandbits(31), **params})
+    return matches
+
+
+def win_matrix(policies, results):
+    """ wins[a][b]: matches with both a and b in which a won """
+    wins = {a: {b: 0 for b in policies} for a in policies}
+    for result in results:
+        if result["winner"] is None:
+            continue
+        winner = result["seats"][result["winner"]]
+        for other in result["seats"]:
+            if other != winner:
+                wins[winner][other] += 1
+    return wins
+
+
+def elo_ratings(policies, results, passes=10):
+    """
+    Elo from pairwise outcomes: a winner beats every other seat, a draw is
+    half a point for each pair. Results are replayed in a shuffled order
+    several times with a shrinking K so the order of matches matters less.
+    """
+    ratings = {policy: float(ELO_START) for policy in policies}
+    rng = random.Random(0)
+    order = sorted(results, key=lambda r: r["index"])
+    for i in range(passes):
+        k = ELO_K / (i + 1)
+        rng.shuffle(order)
+        for result in order:
+            seats = result["seats"]
+            for a, b in itertools.combinations(range(len(seats)), 2):
+                if result["winner"] is None:
+                    score = 0.5
+                elif result["winner"] == a:
+                    score = 1.0
+                elif result["winner"] == b:
+                    score = 0.0
+                else:
+                    continue  # both lost to a third player
+                pa, pb = seats[a], seats[b]
+                expected = 1 / (1 + 10 ** ((ratings[pb] - ratings[pa]) / 400))
+                ratings[pa] += k * (score - expected)
+                ratings[pb] -= k * (score - expected)
+    return {policy: round(rating, 1) for policy, rating in ratings.items()}
+
+
+def run(policies, num_players=2, games=10, workers=None, seed=0, width=13, height=11,
+        max_ticks=500, chain_reactions=False, record=False, on_result=None):
+    """
+    Plays the tournament and returns the report dict (see main); results,
+    wins and Elo are keyed by entrant (see seat_labels). Rules default to
+    those of live lobbies, without chain reactions.
+    """
+    labels = seat_labels(policies)
+    spec_of = dict(zip(labels, policies))
+    matches = schedule(labels, num_players, games, seed, width=width, height=height,
+                       max_ticks=max_ticks, chain_reactions=chain_reactions, record=record)
+    for match in matches:
+        match["specs"] = [spec_of[label] for label in match["seats"]]
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(play_match, matches, chunksize=max(1, len(matches) // (4 * (workers or os.cpu_count() or 1)))):
+            if on_result is not None:
+                on_result(result)
+            result.pop("replay", None)
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    ticks = sum(r["ticks"] for r in results)
+    return {
+        "policies": labels,
+        "games": len(results),
+        "seconds": elapsed,
+        "games_per_second": len(results) / elapsed if elapsed else 0.0,
+        "ticks_per_second": ticks / elapsed if elapsed else 0.0,
+        "draws": sum(1 for r in results if r["winner"] is None),
+        "wins": win_matrix(labels, results),
+        "elo": elo_ratings(labels, results),
+        "results": results,
+    }
+
+
+def print_report(report):
+    policies = report["policies"]
+    print(f"{report['games']} games in {report['seconds']:.1f}s: "
+          f"{report['games_per_second']:.1f} games/s, {report['ticks_per_second']:.0f} ticks/s, "
+          f"{report['draws']} draws")
+
+    width = max(len(p) for p in policies) + 2
+    print("\nWins (row beat column):")
+    print(" " * width + "".join(f"{p:>{width}}" for p in policies))
+    for a in policies:
+        print(f"{a:<{width}}" + "".join(f"{report['wins'][a][b]:>{width}}" for b in policies))
+
+    print("\nElo:")
+    for policy, rating in sorted(report["elo"].items(), key=lambda item: -item[1]):
+        print(f"  {policy:<{width}} {rating:7.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("policies", nargs="+", help="built-in policy names or module:attribute")
+    parser.add_argument("--games", type=int, default=10, help="matches per group of policies")
+    parser.add_argument("--players", type=int, default=2, help="players per match")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=13)
+    parser.add_argument("--height", type=int, default=11)
+    parser.add_argument("--max-ticks", type=int, default=500, help="a match still running after this is a draw")
+    parser.add_argument("--chain-reactions", action="store_true",
+                        help="play with chain reactions (live lobbies play without, see CHAIN_REACTIONS)")
+    parser.add_argument("--replays", help="directory for replays in the store_replay format")
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if len(args.policies) < args.players:
+        parser.error(f"need at least {args.players} policies for {args.players}-player matches")
+    for spec in args.policies:
+        resolve_policy(spec)   # fail before starting the pool
+
+    on_result = None
+    if args.replays:
+        os.makedirs(args.replays, exist_ok=True)
+
+        def on_result(result):
+            path = os.path.join(args.replays, f"match_{result['index']:06d}.json")
+            with open(path, "w") as f:
+                json.dump({**result["replay"], "seats": result["seats"], "winner": result["winner"]}, f)
+
+    report = run(
+        args.policies, args.players, args.games, args.workers, args.seed, args.width, args.height,
+        args.max_ticks, args.chain_reactions, record=bool(args.replays), on_result=on_result,
+    )
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+import heapq
+import math
+import random
+import time
+
+from bomberman.GameTools import Action, Tile, DIRECTIONS, WALKABLE
+
+
+MOVE_DELTAS = {
+    Action.UP: (0, -1),
+    Action.DOWN: (0, 1),
+    Action.LEFT: (-1, 0),
+    Action.RIGHT: (1, 0),
+}
+
+# Used by the rollout loop as plain globals, see the note in GameTools
+_MOVES = tuple((action, dx, dy) for action, (dx, dy) in MOVE_DELTAS.items())
+_STAY, _BOMB = Action.STAY, Action.BOMB
+_WALL, _CRATE = Tile.WALL, Tile.DESTRUCTIBLE
+
+# Relative weights of the rollout policy; moves into fire and into a blast due
+# next tick are never picked, bombs only where there is a way out of the blast
+ROLLOUT_WEIGHTS = {Action.STAY: 2, Action.UP: 3, Action.DOWN: 3, Action.LEFT: 3, Action.RIGHT: 3, Action.BOMB: 1}
+BOMB_TARGET_WEIGHT = 4   # BOMB next to a crate or in line with an opponent
+APPROACH_FACTOR = 3      # the searching player's moves towards an opponent
+
+# Opponents in the search are not assumed to dodge every bomb: each tick an
+# opponent follows the careful rollout policy with this probability and the
+# careless one otherwise, so bombs that leave it a way out still count
+OPPONENT_CARE = 0.5
+
+CRATE_COST = 3           # steps a crate is worth on the way to an opponent, see approach_map
+
+# Terms of evaluate(); a live player short of winning stays between 0.05 and 0.95
+KILL_WEIGHT = 0.3
+CLOSENESS_WEIGHT = 0.3
+PRESSURE_WEIGHT = 0.15
+THREAT_PENALTY = 0.15
+
+
+class SearchStats:
+    """ Counters of one or more search() calls; combined with merge() """
+    __slots__ = ("searches", "rollouts", "seconds", "max_depth")
+
+    def __init__(self, searches=0, rollouts=0, seconds=0.0, max_depth=0):
+        self.searches = searches
+        self.rollouts = rollouts
+        self.seconds = seconds
+        self.max_depth = max_depth
+
+    @property
+    def rollouts_per_second(self):
+        return self.rollouts / self.seconds if self.seconds else 0.0
+
+    def merge(self, other):
+        self.searches += other.searches
+        self.rollouts += other.rollouts
+        self.seconds += other.seconds
+        self.max_depth = max(self.max_depth, other.max_depth)
+        return self
+
+    def summary(self):
+        return (
+            f"searches={self.searches} rollouts={self.rollouts} "
+            f"rollouts/s={self.rollouts_per_second:.0f} max_depth={self.max_depth}"
+        )
+
+
+class _Node:
+    __slots__ = ("visits", "value", "children")
+
+    def __init__(self):
+        self.visits = 0
+        self.value = 0.0
+        self.children = {}   # Action -> _Node
+
+
+def legal_actions(game, player_id):
+    """ Actions of player_id that change something: moves onto walkable tiles, BOMB where none lies, STAY """
+    player = game.players[player_id]
+    actions = [_STAY]
+    for action, dx, dy in _MOVES:
+        if game._is_walkable(player.x + dx, player.y + dy):
+            actions.append(action)
+    if game.bomb_at(player.x, player.y) is None:
+        actions.append(_BOMB)
+    return actions
+
+
+def blast_cells(game, x, y, radius):
+    """ Tiles a bomb at (x, y) would set on fire, by the rules of Game._blast """
+    grid = game.grid
+    cells = [(x, y)]
+    for dx, dy in DIRECTIONS:
+        for i in range(1, radius + 1):
+            nx, ny = x + dx * i, y + dy * i
+            if not (0 <= nx < game.width and 0 <= ny < game.height):
+                break
+            tile = grid[ny][nx]
+            if tile == _WALL:
+                break
+            cells.append((nx, ny))
+            if tile == _CRATE:
+                break
+    return cells
+
+
+def threat_map(game):
+    """
+    (x, y) -> number of updates until a bomb on the board sets the tile on
+    fire; tiles no bomb reaches are missing. A cheap approximation of
+    Game.danger_map: crates stay where they are, but chain reactions are
+    followed. Burning tiles count as 1 while a bomb goes off next update,
+    since any blast kills players standing in fire.
+    """
+    bombs = [(bomb.timer, blast_cells(game, bomb.x, bomb.y, bomb.radius)) for bomb in game.bombs]
+    if game.chain_reactions and len(bombs) > 1:
+        timers = [timer for timer, _ in bombs]
+        cells = [(bomb.x, bomb.y) for bomb in game.bombs]
+        changed = True
+        while changed:
+            changed = False
+            for i, (_, burned) in enumerate(bombs):
+                for j, cell in enumerate(cells):
+                    if timers[j] > timers[i] and cell in burned:
+                        timers[j] = timers[i]
+                        changed = True
+        bombs = [(timer, burned) for timer, (_, burned) in zip(timers, bombs)]
+
+    threats = {}
+    for timer, burned in bombs:
+        for cell in burned:
+            if threats.get(cell, timer + 1) > timer:
+                threats[cell] = timer
+    if any(timer <= 1 for timer, _ in bombs):
+        for x, y in game._fire_at:
+            threats[(x, y)] = 1
+    return threats
+
+
+def _can_escape(game, x, y, threats):
+    # A bomb placed on (x, y) blows up after two more moves: enough to step
+    # out of its lines around a corner, onto a tile no other bomb threatens soon
+    grid, width, height = game.grid, game.width, game.height
+    for dx, dy in DIRECTIONS:
+        nx, ny = x + dx, y + dy
+        if not (0 <= nx < width and 0 <= ny < height) or grid[ny][nx] not in WALKABLE:
+            continue
+        if threats.get((nx, ny), 3) <= 1:
+            continue
+        for px, py in ((dy, dx), (-dy, -dx)):
+            cx, cy = nx + px, ny + py
+            if 0 <= cx < width and 0 <= cy < height and grid[cy][cx] in WALKABLE and threats.get((cx, cy), 3) > 2:
+                return True
+    return False
+
+
+def _worth_bombing(game, player_id, x, y):
+    # A crate next to the tile or a live opponent within the blast lines
+    grid = game.grid
+    for dx, dy in DIRECTIONS:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < game.width and 0 <= ny < game.height and grid[ny][nx] == _CRATE:
+            return True
+    for pid, player in game.players.items():
+        if pid != player_id and player.alive and (player.x == x or player.y == y):
+            if abs(player.x - x) + abs(player.y - y) <= 2:
+                return True
+    return False
+
+
+def escape_moves(game, x, y, threats):
+    """
+    First moves of the shortest ways from (x, y) to a tile no blast threatens,
+    reaching it before the blast on (x, y) and stepping on no tile in the
+    update that sets it on fire. Empty when there is no such way.
+    """
+    limit = threats.get((x, y))
+    if limit is None:
+        return []
+    moves = []
+    frontier = [((x, y), None)]
+    seen = {(x, y)}
+    for step in range(1, limit + 1):
+        following = []
+        for (cx, cy), first in frontier:
+            for action, dx, dy in _MOVES:
+                cell = (cx + dx, cy + dy)
+                if cell in seen or not game._is_walkable(*cell) or game.is_burning(*cell):
+                    continue
+                timer = threats.get(cell)
+                if timer == step:
+                    continue
+                seen.add(cell)
+                first_move = first or action
+                if timer is None:
+                    moves.append(first_move)
+                else:
+                    following.append((cell, first_move))
+        if moves:
+            return moves
+        frontier = following
+    return moves
+
+
+def safe_actions(game, player_id, threats=None):
+    """
+    legal_actions without the ones that lose player_id on the spot: moves into
+    fire, staying or moving where a blast is due next update, and BOMB with no
+    way out. On a threatened tile only escape_moves, if there are any. Falls
+    back to legal_actions when nothing is safe.
+    """
+    if threats is None:
+        threats = threat_map(game)
+    player = game.players[player_id]
+    x, y = player.x, player.y
+    escapes = escape_moves(game, x, y, threats)
+    if escapes:
+        return escapes
+    grid, width, height, fire = game.grid, game.width, game.height, game._fire_at
+    stay = threats.get((x, y), 2) > 1
+    actions = [_STAY] if stay else []
+    for action, dx, dy in _MOVES:
+        nx, ny = x + dx, y + dy
+        if not (0 <= nx < width and 0 <= ny < height) or grid[ny][nx] not in WALKABLE:
+            continue
+        cell = (nx, ny)
+        if cell not in fire and threats.get(cell, 2) > 1:
+            actions.append(action)
+    if stay and game.bomb_at(x, y) is None and _can_escape(game, x, y, threats):
+        actions.append(_BOMB)
+    return actions or legal_actions(game, player_id)
+
+
+def rollout_action(game, player_id, rng, threats=None, careful=True, approach=None):
+    """
+    Random safe action of player_id (see safe_actions), weighted by
+    ROLLOUT_WEIGHTS, with bombs next to crates or opponents preferred and,
+    given an approach_map, moves towards an opponent. threats is
+    threat_map(game), computed if missing. A careless player only keeps out of
+    fire: it picks among all legal actions and does not flee.
+    """
+    player = game.players[player_id]
+    x, y = player.x, player.y
+    if not careful:
+        actions = [_STAY]
+        for action, dx, dy in _MOVES:
+            if game._is_walkable(x + dx, y + dy) and not game.is_burning(x + dx, y + dy):
+                actions.append(action)
+        if game.bomb_at(x, y) is None:
+            actions.append(_BOMB)
+        return rng.choices(actions, [ROLLOUT_WEIGHTS[action] for action in actions])[0]
+
+    if threats is None:
+        threats = threat_map(game)
+    actions = safe_actions(game, player_id, threats)
+    weights = [ROLLOUT_WEIGHTS[action] for action in actions]
+    here = approach[y][x] if approach is not None else None
+    for i, action in enumerate(actions):
+        if action is _BOMB:
+            if _worth_bombing(game, player_id, x, y):
+                weights[i] = BOMB_TARGET_WEIGHT
+        elif here is not None and action is not _STAY:
+            dx, dy = MOVE_DELTAS[action]
+            there = approach[y + dy][x + dx]
+            if there is not None and there < here:
+                weights[i] *= APPROACH_FACTOR
+    return rng.choices(actions, weights)[0]
+
+
+def approach_map(game, player_id):
+    """
+    For every tile as dist[y][x] the cost of the way from it to the nearest
+    live opponent of player_id: a step costs 1, breaking through a crate
+    CRATE_COST; None where no way exists. Bombs and fire do not block.
+    """
+    width, height, grid = game.width, game.height, game.grid
+    dist = [[None] * width for _ in range(height)]
+    heap = []
+    for pid, player in game.players.items():
+        if pid != player_id and player.alive:
+            dist[player.y][player.x] = 0
+            heap.append((0, player.x, player.y))
+    heapq.heapify(heap)
+    while heap:
+        d, x, y = heapq.heappop(heap)
+        if d > dist[y][x]:
+            continue
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height) or grid[ny][nx] == _WALL:
+                continue
+            nd = d + (CRATE_COST if grid[ny][nx] == _CRATE else 1)
+            if dist[ny][nx] is None or nd < dist[ny][nx]:
+                dist[ny][nx] = nd
+                heapq.heappush(heap, (nd, nx, ny))
+    return dist
+
+
+def evaluate(game, player_id, approach=None, pressure=0.0):
+    """
+    0 if player_id is dead, 1 if it is the last one alive; otherwise in
+    between by the share of opponents dead, with a penalty for ending in a
+    pending blast and bonuses for pressure (the share of opponents standing
+    in pending blasts, averaged over the ticks played) and for being close to
+    an opponent so that bots engage instead of idling. Closeness is read from
+    approach (an approach_map) when given, Manhattan distance to the nearest
+    opponent otherwise.
+    """
+    me = game.players[player_id]
+    if not me.alive:
+        return 0.0
+    opponents = [p for pid, p in game.players.items() if pid != player_id]
+    if not opponents:
+        return 1.0
+    alive = [p for p in opponents if p.alive]
+    if not alive:
+        return 1.0
+    limit = game.width + game.height
+    if approach is not None:
+        nearest = approach[me.y][me.x]
+        nearest = limit if nearest is None else min(nearest, limit)
+    else:
+        nearest = min(abs(p.x - me.x) + abs(p.y - me.y) for p in alive)
+    closeness = 1 - nearest / limit
+    value = 0.2 + KILL_WEIGHT * (len(opponents) - len(alive)) / len(opponents)
+    value += CLOSENESS_WEIGHT * closeness + PRESSURE_WEIGHT * pressure
+    if (me.x, me.y) in threat_map(game):
+        value -= THREAT_PENALTY
+    return value
+
+
+def _pressure(game, player_id, threats):
+    # Share of player_id's opponents standing where a blast is pending
+    opponents = [p for pid, p in game.players.items() if pid != player_id]
+    return sum(p.alive and (p.x, p.y) in threats for p in opponents) / len(opponents)
+
+
+def _step(game, player_id, action, rng, threats):
+    # threats is threat_map(game), shared by the rollout policies of all
+    # opponents; each of them plays carefully with probability OPPONENT_CARE
+    for pid, player in game.players.items():
+        if pid == player_id:
+            game.set_player_action(pid, action)
+        elif player.alive:
+            careful = rng.random() < OPPONENT_CARE
+            game.set_player_action(pid, rollout_action(game, pid, rng, threats, careful))
+    game.update()
+
+
+def search(game, player_id, time_budget=0.05, max_rollouts=None, depth=8, exploration=0.5, rng=None):
+    """
+    Open-loop Monte Carlo tree search for player_id over copies of game.
+
+    The tree branches on player_id's actions only; opponents act by the
+    rollout policy (careful with probability OPPONENT_CARE), so a node stands
+    for the average outcome of an action sequence. Every rollout restores a
+    snapshot of game, descends by UCB1 over safe_actions, expands one action,
+    then plays the rollout policy for everyone up to depth ticks and scores
+    the result with evaluate(), reading closeness from an approach_map of the
+    root position. Stops after time_budget seconds or max_rollouts rollouts,
+    whichever comes first.
+
+    Returns (action, SearchStats); the action is the most visited one.
+    """
+    rng = rng or random.Random()
+    start = time.perf_counter()
+    deadline = start + time_budget
+
+    if not game.players[player_id].alive:
+        return Action.STAY, SearchStats(searches=1)
+
+    snapshot = game.snapshot()
+    work = game.clone()
+    work.stats = None
+    approach = approach_map(game, player_id)
+    root = _Node()
+    rollouts = 0
+    max_depth = 0
+
+    while (max_rollouts is None or rollouts < max_rollouts) and time.perf_counter() < deadline:
+        work.restore(snapshot)
+        node, path, d = root, [root], 0
+        pressure = 0
+
+        # Selection and expansion along player_id's actions
+        while d < depth and work.players[player_id].alive and work.get_winner() == -1:
+            threats = threat_map(work)
+            pressure += _pressure(work, player_id, threats)
+            actions = safe_actions(work, player_id, threats)
+            untried = [a for a in actions if a not in node.children]
+            if untried:
+                action = rng.choice(untried)
+                node.children[action] = _Node()
+            else:
+                log_n = math.log(node.visits)
+                action = max(actions, key=lambda a: (
+                    node.children[a].value / node.children[a].visits
+                    + exploration * math.sqrt(log_n / node.children[a].visits)
+                ))
+            _step(work, player_id, action, rng, threats)
+            node = node.children[action]
+            path.append(node)
+            d += 1
+            if untried:
+                break
+        max_depth = max(max_depth, d)
+
+        # Rollout
+        while d < depth and work.players[player_id].alive and work.get_winner() == -1:
+            threats = threat_map(work)
+            pressure += _pressure(work, player_id, threats)
+            action = rollout_action(work, player_id, rng, threats, approach=approach)
+            _step(work, player_id, action, rng, threats)
+            d += 1
+
+        value = evaluate(work, player_id, approach, pressure / d if d else 0.0)
+        for visited in path:
+            visited.visits += 1
+            visited.value += value
+        rollouts += 1
+
+    stats = SearchStats(1, rollouts, time.perf_counter() - start, max_depth)
+    if not root.children:
+        return Action.STAY, stats
+    return max(root.children, key=lambda a: root.children[a].visits), stats
@@ -0,0 +1,355 @@
+import numpy as np
+
+from bomberman.GameTools import Tile, Action, DIRECTIONS, spawn_positions
+from bomberman.Observation import encode_vec
+
+
+EMPTY = Tile.EMPTY.value
+WALL = Tile.WALL.value
+DESTRUCTIBLE = Tile.DESTRUCTIBLE.value
+BOMB = Tile.BOMB.value
+FIRE = Tile.FIRE.value
+
+TILE_NAMES = [tile.name for tile in Tile]
+
+# Movement per action code
+ACTION_DX = np.array([0, 0, 0, -1, 1, 0], dtype=np.int16)
+ACTION_DY = np.array([0, -1, 1, 0, 0, 0], dtype=np.int16)
+
+BOMB_TIMER = 3
+BOMB_RADIUS = 2
+
+
+class VecGame:
+    """
+    N independent boards stepped together with NumPy.
+
+    Rules are those of Game.update, with or without chain reactions as
+    chain_reactions says (off by default, like Game). Without them a blast
+    turns a bomb's tile into fire but leaves the bomb ticking. Within a tick
+    players act in id order, as if Game.set_player_action was called for
+    player 0, 1, ... in turn. Actions are Action codes in an (N, players)
+    array; actions of dead players are ignored.
+
+    Fire is kept as two layers: fire_old holds fire from the previous tick
+    (ttl 1 in Game.export_state), fire_new holds fire created during the
+    current tick and is always empty between steps.
+    """
+
+    def __init__(self, num_envs, width=13, height=11, num_players=2,
+                 max_ticks=None, crate_chance=0.2, seed=None, chain_reactions=False):
+        self.num_envs = num_envs
+        self.chain_reactions = chain_reactions
+        self.width = width
+        self.height = height
+        self.num_players = num_players
+        self.max_ticks = max_ticks
+        self.crate_chance = crate_chance
+        self.rng = np.random.default_rng(seed)
+
+        # Every bomb lives for BOMB_TIMER ticks and a player places at most one per tick
+        self.bomb_capacity = BOMB_TIMER * num_players + 1
+
+        n, k = num_envs, self.bomb_capacity
+        self.grid = np.zeros((n, height, width), dtype=np.uint8)
+        self.fire_old = np.zeros((n, height, width), dtype=bool)
+        self.fire_new = np.zeros((n, height, width), dtype=bool)
+
+        self.bomb_at = np.full((n, height, width), -1, dtype=np.int16)
+        self.bomb_live = np.zeros((n, k), dtype=bool)
+        self.bomb_x = np.zeros((n, k), dtype=np.int16)
+        self.bomb_y = np.zeros((n, k), dtype=np.int16)
+        self.bomb_owner = np.zeros((n, k), dtype=np.int16)
+        self.bomb_timer = np.zeros((n, k), dtype=np.int16)
+        self.bomb_radius = np.zeros((n, k), dtype=np.int16)
+        self.bomb_seq = np.zeros((n, k), dtype=np.int64)   # placement order
+        self._next_seq = 0
+
+        self.px = np.zeros((n, num_players), dtype=np.int16)
+        self.py = np.zeros((n, num_players), dtype=np.int16)
+        self.alive = np.zeros((n, num_players), dtype=bool)
+        self.tick = np.zeros(n, dtype=np.int32)
+
+        self._rows = np.arange(n)
+        self._build_layout()
+        self.reset()
+
+    def _build_layout(self):
+        # Walls and spawn areas are the same on every board, only crates differ
+        w, h = self.width, self.height
+        ys, xs = np.indices((h, w))
+        self._walls = (
+            (xs == 0) | (ys == 0) | (xs == w - 1) | (ys == h - 1)
+            | ((xs % 2 == 0) & (ys % 2 == 0))
+        )
+        self._spawns = np.array(spawn_positions(w, h, self.num_players), dtype=np.int16)
+
+        # Same cells as Game._spawn_players/_ensure_spawn_exit clear
+        self._clear = np.zeros((h, w), dtype=bool)
+        for x, y in self._spawns.tolist():
+            self._clear[y, x] = True
+            self._clear[y, x + 1 if x == 1 else x - 1] = True
+            self._clear[y + 1 if y == 1 else y - 1, x] = True
+
+    def reset(self, mask=None):
+        envs = self._rows if mask is None else np.nonzero(mask)[0]
+        if len(envs) == 0:
+            return
+
+        crates = self.rng.random((len(envs), self.height, self.width)) < self.crate_chance
+        grid = np.where(self._walls, WALL, np.where(crates, DESTRUCTIBLE, EMPTY))
+        grid[:, self._clear] = EMPTY
+        self.grid[envs] = grid
+
+        self.fire_old[envs] = False
+        self.fire_new[envs] = False
+        self.bomb_at[envs] = -1
+        self.bomb_live[envs] = False
+        self.px[envs] = self._spawns[:, 0]
+        self.py[envs] = self._spawns[:, 1]
+        self.alive[envs] = True
+        self.tick[envs] = 0
+
+    def step(self, actions):
+        """
+        Advances every board by one tick.
+
+        Returns (rewards, dones, info): rewards is (N, players) with -1 for a
+        player killed this tick and +1 for the last survivor, dones is (N,).
+        info["winner"] holds the winner id or -1 (draw or still running) and
+        info["ticks"] the length of each board's game. Finished boards are
+        reset before returning.
+        """
+        actions = np.asarray(actions)
+        was_alive = self.alive.copy()
+
+        self.tick += 1
+        self._move_players(actions)
+        self._update_bombs()
+        self._clear_fire()
+
+        rewards = np.zeros((self.num_envs, self.num_players), dtype=np.float32)
+        rewards[was_alive & ~self.alive] = -1.0
+
+        survivors = self.alive.sum(axis=1)
+        dones = survivors <= 1
+        if self.max_ticks is not None:
+            dones |= self.tick >= self.max_ticks
+
+        winner = np.where(dones & (survivors == 1), self.alive.argmax(axis=1), -1)
+        won = winner >= 0
+        rewards[self._rows[won], winner[won]] += 1.0
+
+        info = {"winner": winner, "ticks": self.tick.copy()}
+        self.reset(dones)
+        return rewards, dones, info
+
+    def _move_players(self, actions):
+        rows = self._rows
+        for pid in range(self.num_players):
+            act = actions[:, pid]
+            alive = self.alive[:, pid]
+            x, y = self.px[:, pid], self.py[:, pid]
+
+            place = alive & (act == Action.BOMB.value) & (self.grid[rows, y, x] != BOMB)
+            if place.any():
+                self._place_bombs(np.nonzero(place)[0], pid)
+
+            dx, dy = ACTION_DX[act], ACTION_DY[act]
+            nx, ny = x + dx, y + dy
+            inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+            tile = self.grid[rows, np.clip(ny, 0, self.height - 1), np.clip(nx, 0, self.width - 1)]
+            moves = alive & ((dx != 0) | (dy != 0)) & inside & ((tile == EMPTY) | (tile == FIRE))
+            self.px[moves, pid] = nx[moves]
+            self.py[moves, pid] = ny[moves]
+
+    def _place_bombs(self, envs, pid):
+        free = ~self.bomb_live[envs]
+        if not free.any(axis=1).all():
+            raise RuntimeError("VecGame bomb capacity exceeded")
+        slot = free.argmax(axis=1)
+        x, y = self.px[envs, pid], self.py[envs, pid]
+
+        self.bomb_live[envs, slot] = True
+        self.bomb_x[envs, slot] = x
+        self.bomb_y[envs, slot] = y
+        self.bomb_owner[envs, slot] = pid
+        self.bomb_timer[envs, slot] = BOMB_TIMER
+        self.bomb_radius[envs, slot] = BOMB_RADIUS
+        self.bomb_seq[envs, slot] = self._next_seq
+        self._next_seq += 1
+
+        self.bomb_at[envs, y, x] = slot
+        self.grid[envs, y, x] = BOMB
+
+    def _update_bombs(self):
+        live = self.bomb_live
+        self.bomb_timer[live] -= 1
+        due = live & (self.bomb_timer <= 0)
+        envs = np.nonzero(due.any(axis=1))[0]
+        if len(envs) == 0:
+            return
+
+        self._resolve_explosions(envs, due[envs])
+
+        # Same as Game: after an explosion everyone standing in fire dies
+        burning = self.fire_old[envs] | self.fire_new[envs]
+        local = np.arange(len(envs))[:, None]
+        caught = burning[local, self.py[envs], self.px[envs]]
+        self.alive[envs] &= ~caught
+
+    def _resolve_explosions(self, envs, due):
+        # Game walks its bomb list in placement order and fully resolves each
+        # chain before moving on; the order matters because a crate burned by
+        # one blast no longer stops the next. Here every wave explodes one
+        # bomb per board, in that same order.
+        count, k = due.shape
+        seq = np.where(self.bomb_live[envs], self.bomb_seq[envs], np.iinfo(np.int64).max)
+        order = np.argsort(seq, axis=1, kind="stable")
+        due_in_order = np.take_along_axis(due, order, axis=1)
+        positions = np.arange(k)
+
+        detonated = np.zeros((count, k), dtype=bool)
+        queue = np.zeros((count, k), dtype=np.intp)
+        head = np.zeros(count, dtype=np.intp)
+        tail = np.zeros(count, dtype=np.intp)
+        cursor = np.zeros(count, dtype=np.intp)
+
+        while True:
+            idle = head == tail
+            if idle.any():
+                waiting = (
+                    due_in_order
+                    & ~np.take_along_axis(detonated, order, axis=1)
+                    & (positions >= cursor[:, None])
+                )
+                start = np.nonzero(idle & waiting.any(axis=1))[0]
+                if len(start):
+                    first = waiting[start].argmax(axis=1)
+                    slot = order[start, first]
+                    queue[start, tail[start]] = slot
+                    tail[start] += 1
+                    detonated[start, slot] = True
+                    cursor[start] = first + 1
+
+            active = np.nonzero(head < tail)[0]
+            if len(active) == 0:
+                break
+            slot = queue[active, head[active]]
+            head[active] += 1
+            self._explode(envs[active], slot, active, detonated, queue, tail)
+
+    def _explode(self, envs, slot, local, detonated, queue, tail):
+        bx, by = self.bomb_x[envs, slot], self.bomb_y[envs, slot]
+        radius = self.bomb_radius[envs, slot]
+        self.bomb_live[envs, slot] = False
+        # without chain reactions a newer bomb may have been placed on the tile
+        own = self.bomb_at[envs, by, bx] == slot
+        self.bomb_at[envs[own], by[own], bx[own]] = -1
+        self.grid[envs, by, bx] = FIRE
+        self.fire_new[envs, by, bx] = True
+
+        for dx, dy in DIRECTIONS:
+            going = np.ones(len(envs), dtype=bool)
+            for i in range(1, int(radius.max()) + 1):
+                nx, ny = bx + dx * i, by + dy * i
+                going &= (i <= radius) & (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+                nx, ny = np.clip(nx, 0, self.width - 1), np.clip(ny, 0, self.height - 1)
+                tile = self.grid[envs, ny, nx]
+                going &= tile != WALL
+                if not going.any():
+                    break
+
+                e, x, y = envs[going], nx[going], ny[going]
+                self.grid[e, y, x] = FIRE
+                self.fire_new[e, y, x] = True
+
+                # Blast reached another bomb: queue it behind the current chain
+                other = self.bomb_at[e, y, x]
+                hit = other >= 0
+                if self.chain_reactions and hit.any():
+                    owner, other = local[going][hit], other[hit]
+                    fresh = ~detonated[owner, other]
+                    owner, other = owner[fresh], other[fresh]
+                    detonated[owner, other] = True
+                    queue[owner, tail[owner]] = other
+                    tail[owner] += 1
+
+                going &= tile != DESTRUCTIBLE
+
+    def _clear_fire(self):
+        expired = self.fire_old & (self.grid == FIRE)
+        self.grid[expired] = EMPTY
+        self.fire_old, self.fire_new = self.fire_new, self.fire_old
+        self.fire_new[:] = False
+
+    def observe(self, out=None):
+        # (boards, players, channels, height, width), see bomberman/Observation.py
+        return encode_vec(self, out)
+
+    def export_state(self, env):
+        """ Board env in the Game.export_state format (fire in row-major order, without duplicates) """
+        bombs = sorted(np.nonzero(self.bomb_live[env])[0].tolist(), key=lambda slot: self.bomb_seq[env, slot])
+        fire = [(x, y, 1) for y, x in np.argwhere(self.fire_old[env]).tolist()]
+        fire += [(x, y, 2) for y, x in np.argwhere(self.fire_new[env]).tolist()]
+
+        return {
+            "tick": int(self.tick[env]),
+            "width": self.width,
+            "height": self.height,
+            "grid": [[TILE_NAMES[code] for code in row] for row in self.grid[env].tolist()],
+            "players": {
+                pid: {
+                    "x": int(self.px[env, pid]),
+                    "y": int(self.py[env, pid]),
+                    "alive": bool(self.alive[env, pid])
+                } for pid in range(self.num_players)
+            },
+            "bombs": [
+                {
+                    "owner_id": int(self.bomb_owner[env, slot]),
+                    "x": int(self.bomb_x[env, slot]),
+                    "y": int(self.bomb_y[env, slot]),
+                    "timer": int(self.bomb_timer[env, slot]),
+                    "radius": int(self.bomb_radius[env, slot])
+                } for slot in bombs
+            ],
+            "fire": [{"x": x, "y": y, "ttl": ttl} for x, y, ttl in fire]
+        }
+
+    def import_state(self, env, state: dict):
+        if (state["width"], state["height"]) != (self.width, self.height):
+            raise ValueError("State board size does not match VecGame")
+        if len(state["bombs"]) > self.bomb_capacity:
+            raise ValueError("Too many bombs for VecGame bomb capacity")
+
+        self.tick[env] = state["tick"]
+        self.grid[env] = [[Tile[name].value for name in row] for row in state["grid"]]
+
+        for pid_str, pdata in state["players"].items():
+            pid = int(pid_str)
+            self.px[env, pid] = pdata["x"]
+            self.py[env, pid] = pdata["y"]
+            self.alive[env, pid] = pdata["alive"]
+
+        # The grid already holds the BOMB and FIRE tiles, as in Game.import_state
+        self.bomb_live[env] = False
+        self.bomb_at[env] = -1
+        for slot, bd in enumerate(state["bombs"]):
+            self.bomb_live[env, slot] = True
+            self.bomb_x[env, slot] = bd["x"]
+            self.bomb_y[env, slot] = bd["y"]
+            self.bomb_owner[env, slot] = bd["owner_id"]
+            self.bomb_timer[env, slot] = bd["timer"]
+            self.bomb_radius[env, slot] = bd["radius"]
+            self.bomb_seq[env, slot] = self._next_seq
+            self._next_seq += 1
+            self.bomb_at[env, bd["y"], bd["x"]] = slot
+
+        self.fire_old[env] = False
+        self.fire_new[env] = False
+        for fd in state["fire"]:
+            if fd["ttl"] > 2:
+                raise ValueError("VecGame keeps fire for at most two ticks")
+            layer = self.fire_old if fd["ttl"] == 1 else self.fire_new
+            layer[env, fd["y"], fd["x"]] = True
@@ -4,8 +4,8 @@ from GameTools import *
 game = Game(width=7, height=5, num_players=2)
 
 # Override spawn positions for clarity
-game.players[0].x, game.players[0].y = 1, 1
-game.players[1].x, game.players[1].y = 5, 3
+game.place_player(0, 1, 1)
+game.place_player(1, 5, 3)
 
 # Clear the grid manually for predictable output
 for y in range(game.height):
@@ -0,0 +1,27 @@
+"""
+The differential checks of benchmarks.differential as a pytest suite: every
+optimized engine path against the reference Game, and Game against the frozen
+original engine, on random action sequences.
+
+    python -m pytest
+"""
+import pytest
+
+from benchmarks import differential
+
+
+TRIALS = 6
+TICKS = 150
+
+
+@pytest.mark.parametrize("check", sorted(differential.CHECKS))
+def test_differential(check):
+    failures = differential.run([check], TRIALS, TICKS, seed=0)
+    assert not failures, failures[0]
+
+
+def test_action_log_round_trip():
+    # Packed logs of shuffled, duplicated and extended rows decode to the same
+    # rows and simulate_replay gives the same frames, on more cases than above
+    failures = differential.run(["action_log"], 30, 200, seed=1)
+    assert not failures, failures[0]